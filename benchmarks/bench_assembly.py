@@ -0,0 +1,108 @@
+"""
+Assembly benchmark: GLB conversion time, peak memory and output size of a synthetic
+structure, of its biological assembly with `--copies` copies (REMARK 350 BIOMT, built as
+instanced copies) and of the same assembly written out as copied atoms.
+
+    python -m benchmarks.bench_assembly --atoms 2000 --copies 60
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from pdbvis.ReadPDB import PDBReader
+from pdbvis.WriteGLB import GLBConverter
+from benchmarks.synthetic import syntheticLines, CHAIN_IDS
+
+
+def rotations(copies, seed=0):
+    """
+    `copies` random 4x4 rotations about the origin, the first one is the identity
+    """
+    rng = np.random.default_rng(seed)
+    transforms = np.tile(np.eye(4), (copies, 1, 1))
+    for transform in transforms[1:]:
+        q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+        q *= np.sign(np.diag(r))
+        transform[:3, :3] = q * np.linalg.det(q)
+    return transforms
+
+
+def biomtLines(transforms):
+    lines = ["REMARK 350 BIOMOLECULE: 1", "REMARK 350 APPLY THE FOLLOWING TO CHAINS: A"]
+    for serial, transform in enumerate(transforms, 1):
+        for row in range(3):
+            lines.append(f"REMARK 350   BIOMT{row + 1} {serial:3d}" + "".join(f"{v:10.6f}" for v in transform[row, :3])
+                         + f"{transform[row, 3]:15.5f}")
+    return lines
+
+
+def copiedLines(path, transforms):
+    """
+    ATOM lines of every copy of the structure at `path`, one chain per copy
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        table = PDBReader(path, sidecar=False).table
+    elements = table.element.decode()
+    lines, serial = [], 1
+    for k, transform in enumerate(transforms):
+        coords = table.coords @ transform[:3, :3].T + transform[:3, 3]
+        for i, (x, y, z) in enumerate(coords):
+            lines.append(f"ATOM  {serial % 100000:5d} {table.name[i].decode():^4s} ALA {CHAIN_IDS[k % len(CHAIN_IDS)]}"
+                         f"{table.resSeq[i] % 10000:4d}    {x:8.3f}{y:8.3f}{z:8.3f}{1.0:6.2f}{20.0:6.2f}"
+                         f"          {elements[i]:>2s}  ")
+            serial += 1
+    return lines
+
+
+def convert(path, output, **kwargs):
+    """
+    Return (seconds, peak traced bytes, output bytes) of a GLB conversion
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        GLBConverter(path, output, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, os.path.getsize(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atoms", type=int, default=2000)
+    parser.add_argument("--copies", type=int, default=60)
+    parser.add_argument("--lod", type=int, default=2, help="sphere subdivisions, fixed so every case has the same detail")
+    parser.add_argument("--mode", default="spheres")
+    parser.add_argument("--quantized", action="store_true")
+    args = parser.parse_args()
+    transforms = rotations(args.copies)
+    # a single chain, so copying it gives each copy its own chain ID
+    atoms = list(syntheticLines(args.atoms, residuesPerChain=args.atoms))
+    options = {"subdivisions": args.lod, "mode": args.mode, "quantized": args.quantized}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "structure.pdb")
+        with open(path, "w") as f:
+            f.write("\n".join(biomtLines(transforms) + atoms) + "\nEND\n")
+        copied = os.path.join(folder, "copied.pdb")
+        with open(copied, "w") as f:
+            f.write("\n".join(copiedLines(path, transforms)) + "\nEND\n")
+        output = os.path.join(folder, "model.glb")
+        cases = {
+            "asymmetric unit": convert(path, output, **options),
+            f"assembly x{args.copies}": convert(path, output, assembly="1", **options),
+            f"copied atoms x{args.copies}": convert(copied, output, **options),
+        }
+    print(f"{args.atoms} atoms, {args.copies} copies, {args.mode} mode, lod {args.lod}")
+    for name, (seconds, peak, size) in cases.items():
+        print(f"{name:>20}: {seconds:7.3f} s, peak {peak / 2**20:8.1f} MiB, output {size / 2**20:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
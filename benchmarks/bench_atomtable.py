@@ -0,0 +1,82 @@
+"""
+Compare parse time and memory of the columnar `AtomTable` against the former list of
+dictionaries built by `PDBReader.getAtoms`.
+
+    python -m benchmarks.bench_atomtable --atoms 500000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from pdbvis.ReadPDB import PDBReader
+from .synthetic import writeSyntheticPDB
+
+
+def legacyParse(path):
+    """
+    Previous `PDBReader` parsing, kept here as baseline
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    text = text.split('\n')
+    atoms = []
+    for s in text:
+        if s[0:5].replace(" ", "") == "ATOM":
+            atom = {"atom": s[0:5], "serial": s[6:10], "name": s[12:15], "altLoc": s[16],
+                "resName": s[17:19], "chainID": s[21], "resSeq": s[22:25],
+                "iCode": s[26], "x": s[30:37], "y": s[38:45], "z": s[46:53],
+                "occupancy": s[54:59], "tempFactor": s[60:65], "element": s[66:78],
+                "charge": s[79:80]}
+            for info in atom.keys():
+                atom[info] = atom[info].strip()
+            try:
+                atom["serial"] = int(atom["serial"]) if atom["serial"] != "" else None
+                atom["x"] = float(atom["x"]); atom["y"] = float(atom["y"])
+                atom["z"] = float(atom["z"])
+            except ValueError:
+                continue
+            try:
+                atom["occupancy"] = float(atom["occupancy"])
+                atom["tempFactor"] = float(atom["tempFactor"])
+                atom["resSeq"] = int(atom["resSeq"])
+            except ValueError:
+                pass
+            atoms.append(atom)
+    return atoms, text
+
+
+def measure(func, *args):
+    """
+    Return (seconds, peak bytes, retained bytes) of calling `func`. Memory is traced in a
+    second call so tracing doesn't slow down the timed one.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = func(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = writeSyntheticPDB(os.path.join(tmp, "synthetic.pdb"), args.atoms)
+        size = os.path.getsize(path) / 2**20
+        print(f"{args.atoms} atoms, {size:.1f} MiB")
+        for label, func in [("dict list (legacy)", legacyParse), ("AtomTable", PDBReader)]:
+            elapsed, peak, retained = measure(func, path)
+            print(f"{label:>20}: {elapsed:7.3f} s  peak {peak / 2**20:8.1f} MiB  retained {retained / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
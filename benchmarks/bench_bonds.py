@@ -0,0 +1,63 @@
+"""
+Bond perception benchmark: cell-list search against all pairs distances (small sizes
+only) and ball-and-stick geometry building, on synthetic structures.
+
+    python -m benchmarks.bench_bonds --atoms 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from pdbvis.ReadPDB import PDBReader
+from pdbvis.Bonds import BOND_TOLERANCE, MIN_BOND_LENGTH, covalentRadii, perceiveBonds
+from pdbvis.BuildMesh import buildBallAndStickParts
+from pdbvis.ElementTable import loadElementTable
+from benchmarks.synthetic import writeSyntheticPDB
+
+BRUTE_FORCE_LIMIT = 20000 # all pairs distances take N² memory
+
+
+def bruteForceBonds(coords, radii, tolerance=BOND_TOLERANCE):
+    """
+    O(N²) baseline comparing every pair of atoms
+    """
+    distance = np.linalg.norm(coords[:, None] - coords[None], axis=2)
+    bonded = (distance <= radii[:, None] + radii[None] + tolerance) & (distance >= MIN_BOND_LENGTH)
+    return np.argwhere(np.triu(bonded, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    elements = loadElementTable().atoms
+    with tempfile.TemporaryDirectory() as folder:
+        for nAtoms in args.atoms:
+            path = os.path.join(folder, f"synthetic_{nAtoms}.pdb")
+            writeSyntheticPDB(path, nAtoms)
+            table = PDBReader(path, sidecar=False).table
+            radii = covalentRadii(table, elements)
+
+            start = time.perf_counter()
+            bonds = perceiveBonds(table.coords, radii)
+            grid = time.perf_counter() - start
+            line = f"{nAtoms:>8} atoms {len(bonds):>8} bonds  grid {grid:8.3f} s"
+
+            if nAtoms <= BRUTE_FORCE_LIMIT:
+                start = time.perf_counter()
+                expected = bruteForceBonds(table.coords, radii)
+                line += f"  all pairs {time.perf_counter() - start:8.3f} s"
+                if not np.array_equal(bonds[np.lexsort(bonds.T[::-1])], expected):
+                    line += "  MISMATCH"
+
+            start = time.perf_counter()
+            parts = buildBallAndStickParts(table, bonds, elements, subdivisions=2)
+            triangles = sum(len(part.indices) for part in parts)
+            line += f"  geometry {time.perf_counter() - start:8.3f} s ({triangles} triangles)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
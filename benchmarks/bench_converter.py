@@ -0,0 +1,49 @@
+"""
+Time `PDBConverter` building atoms one `bpy.ops` call at a time against the batched
+per-element meshes and the native `GLBConverter`. Must run inside blender's python, e.g.
+
+    blender -b --python-expr "import sys; sys.argv[1:] = ['--atoms', '2000']; \
+        import runpy; runpy.run_module('benchmarks.bench_converter', run_name='__main__')"
+
+Without blender only the numpy geometry generation and GLB export are timed.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pdbvis.ReadPDB import PDBReader, PDBConverter, bpy
+from pdbvis.BuildMesh import sphereBatch
+from pdbvis.WriteGLB import GLBConverter
+from .synthetic import writeSyntheticPDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=2000)
+    parser.add_argument("--subdivisions", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = writeSyntheticPDB(os.path.join(tmp, "synthetic.pdb"), args.atoms)
+        table = PDBReader(source, sidecar=False).table
+        start = time.perf_counter()
+        for code in range(len(table.element.categories)):
+            sphereBatch(table.coords[table.element.codes == code], 1.0, args.subdivisions)
+        print(f"numpy geometry: {time.perf_counter() - start:8.3f} s")
+        start = time.perf_counter()
+        GLBConverter(input=source, output=os.path.join(tmp, "native.glb"), subdivisions=args.subdivisions)
+        print(f"{'native glb':>14}: {time.perf_counter() - start:8.3f} s")
+        if bpy is None:
+            print("blender not available, skipping conversion timings")
+            return
+
+        for label, batched in [("per atom", False), ("batched", True)]:
+            start = time.perf_counter()
+            PDBConverter(input=source, output=os.path.join(tmp, f"{'batched' if batched else 'atoms'}.fbx"),
+                         batched=batched, subdivisions=args.subdivisions)
+            print(f"{label:>14}: {time.perf_counter() - start:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
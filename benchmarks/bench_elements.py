@@ -0,0 +1,75 @@
+"""
+Converter startup micro-benchmark: element properties loaded by `BlenderPDBInit` with the
+former regex parser, parsing the dat file, loading the pickled table and reusing the
+process wide table.
+
+    python -m benchmarks.bench_elements --repeat 200
+"""
+import argparse
+import os
+import re
+import timeit
+
+from pdbvis.ReadPDB import BlenderPDBInit
+from pdbvis.ElementTable import DEFAULT_PATH, parseElements, loadCached, cachePath
+
+
+def legacyReadElements(path):
+    """
+    Former `BlenderPDBInit.readElementsProperties`, kept here as baseline
+    """
+    data = [("Number", r"\d+"), ("Name", r"\w+"), ("Short name", r"\w+"),
+            ("Color", ",".join([r"\d+[.]\d+"] * 4)), ("Diffuse intensity", r'\d+[.]\d+'),
+            ("Specular intensity", r'\d+[.]\d+'), ("Specular hard", r'\d+'), ("Traceable", r'\d+'),
+            ("Shadow receive", r'\d+'), ("Shadow cast", r"\d+"), ("Radius used", r"\d+[.]\d+"),
+            ("Radius covalent", r"\d+[.]\d+"), ("Radius atomic", r"\d+[.]\d+"),
+            ("Charge state", r"(-)?\d+([.]\d+)?"), ("Radius ionic", r"\d+[.]\d+")]
+    toCamelCase = lambda name: "".join([word.capitalize() for word in name.replace(',', '').split(" ")])
+
+    def getMatches(fields, s):
+        patterns = [r"\s*:\s*".join([d[0], "(?P<" + toCamelCase(d[0]) + ">" + d[1] + ")"]) for d in fields]
+        pattern = r'{}.*'.format(r"[\s\S]*" + r"\s*".join(patterns))
+        return [m.groupdict() for m in re.compile(pattern).finditer(s)]
+
+    with open(path) as f:
+        info = [item.replace('\n', '') for item in f.read().split('Atom')]
+    atoms = {}
+    for s in info:
+        if s.replace(' ', '') == "":
+            continue
+        matches = getMatches(data, s)
+        if len(matches) == 0:
+            matches = getMatches(data[:-2], s)
+            matches[0]["ChargeState"] = None
+            matches[0]["RadiusIonic"] = None
+        atoms[matches[0]["ShortName"]] = matches[0]
+    return atoms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    stat = os.stat(DEFAULT_PATH)
+
+    def pickled():
+        loadCached.cache_clear()
+        return loadCached(DEFAULT_PATH, stat.st_mtime_ns, stat.st_size)
+
+    with open(DEFAULT_PATH) as f:
+        text = f.read()
+    pickled() # make sure the pickle exists
+    cases = [
+        ("legacy regex parse", lambda: legacyReadElements(DEFAULT_PATH)),
+        ("dat file parse", lambda: parseElements(text)),
+        ("pickle load", pickled),
+        ("BlenderPDBInit()", lambda: BlenderPDBInit()),
+    ]
+    print(f"pickle: {cachePath(DEFAULT_PATH)}")
+    for label, func in cases:
+        seconds = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{label:>20}: {seconds * 1e3:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
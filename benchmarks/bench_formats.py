@@ -0,0 +1,38 @@
+"""
+Parse time of the same synthetic structure written as PDB, mmCIF and BinaryCIF, read through
+the parser registry. Every format must give the same atoms.
+
+    python -m benchmarks.bench_formats --atoms 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from pdbvis.Parsers import openStructure
+from benchmarks.synthetic import writeSyntheticPDB, writeSyntheticCIF, writeSyntheticBinaryCIF
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        for nAtoms in args.atoms:
+            pdbPath = writeSyntheticPDB(os.path.join(folder, f"synthetic_{nAtoms}.pdb"), nAtoms)
+            reference = openStructure(pdbPath).frame(0)
+            paths = [pdbPath, writeSyntheticCIF(os.path.join(folder, f"synthetic_{nAtoms}.cif"), reference),
+                     writeSyntheticBinaryCIF(os.path.join(folder, f"synthetic_{nAtoms}.bcif"), reference)]
+            for path in paths:
+                start = time.perf_counter()
+                table = openStructure(path).frame(0)
+                seconds = time.perf_counter() - start
+                same = (np.allclose(table.coords, reference.coords, atol=1e-3)
+                        and table.element.decode().tolist() == reference.element.decode().tolist())
+                print(f"{nAtoms:>8} atoms {os.path.splitext(path)[1]:>6} {os.path.getsize(path) / 2**20:7.1f} MiB"
+                      f"  {seconds:8.3f} s{'' if same else '  MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Parallel parse benchmark: time to read the atoms of a large PDB file with 1, 2, 4...
+processes parsing byte ranges (see `ParallelParse`), speedup against the calling process
+alone. Pools are started before timing, as a server keeps them between requests. Every
+result is checked against the sequential one.
+
+    python -m benchmarks.bench_parse --atoms 5000000
+    python -m benchmarks.bench_parse --atoms 5000000 --processes 1,2,4,8,16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pdbvis.AtomTable import AtomTable
+from pdbvis.ParallelParse import parsePool
+from pdbvis.ReadPDB import Trajectory
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def sameTable(a, b):
+    """
+    Return if tables `a` and `b` have the same atoms in the same order
+    """
+    for field in AtomTable.numeric + AtomTable.strings:
+        x, y = getattr(a, field), getattr(b, field)
+        if x.shape != y.shape or not ((x == y) | ((x != x) & (y != y))).all(): # NaN fields are equal
+            return False
+    return all((getattr(a, field).decode() == getattr(b, field).decode()).all() for field in AtomTable.categorical)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atoms", type=int, default=5000000)
+    parser.add_argument("--processes", default=None, help="comma separated process counts, powers of 2 up to the cores by default")
+    parser.add_argument("--chunk-size", type=int, default=1 << 22, help="bytes of each range")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    cores = os.cpu_count()
+    counts = ([int(count) for count in args.processes.split(",")] if args.processes
+              else [1 << k for k in range(cores.bit_length()) if 1 << k <= cores] + ([cores] if cores & (cores - 1) else []))
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "structure.pdb"), args.atoms)
+        size = os.path.getsize(path)
+        print(f"{args.atoms} atoms, {size / 2**20:.1f} MiB, {cores} cores")
+        expected, baseline = None, None
+        for processes in counts:
+            if processes > 1:
+                list(parsePool(processes).map(abs, range(processes))) # start the pool processes
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                table = Trajectory(path, args.chunk_size, processes=processes).readTopology()
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            if expected is None:
+                expected, baseline = table, best
+            elif not sameTable(table, expected):
+                raise SystemExit(f"{processes} processes parsed different atoms")
+            print(f"{processes:>4} processes: {best:7.3f} s, {size / 2**20 / best:7.1f} MiB/s, speedup {baseline / best:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
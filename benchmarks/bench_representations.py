@@ -0,0 +1,38 @@
+"""
+Representation benchmark: build time and triangle count of every mode for the same
+structure, coarse-grained modes against the all-atom ones.
+
+    python -m benchmarks.bench_representations --atoms 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pdbvis.BuildMesh import MODES
+from pdbvis.ReadPDB import PDBReader
+from pdbvis.ElementTable import loadElementTable
+from pdbvis.Representations import buildModelParts
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=100000)
+    parser.add_argument("--subdivisions", type=int, default=None, help="level of detail, automatic by default")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "structure.pdb"), args.atoms)
+        reader = PDBReader(path, readBonds=True, sidecar=False)
+    properties = loadElementTable().atoms
+    print(f"{args.atoms} atoms")
+    for mode in MODES:
+        start = time.perf_counter()
+        parts = buildModelParts(mode, reader.table, reader.bonds, properties, args.subdivisions)
+        seconds = time.perf_counter() - start
+        triangles = sum(len(part.indices) for part in parts)
+        print(f"{mode:>10}: {seconds:8.3f} s {triangles:12d} triangles {len(parts):4d} parts")
+
+
+if __name__ == "__main__":
+    main()
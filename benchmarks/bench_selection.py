@@ -0,0 +1,72 @@
+"""
+Selection benchmark: time to select atoms by chain, residue range, element and radius
+around a residue in a large structure, against comparing decoded strings and distances to
+every atom.
+
+    python -m benchmarks.bench_selection --atoms 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pdbvis.ReadPDB import PDBReader
+from pdbvis.Selection import Selection
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def naiveMask(table, selection):
+    """
+    Same selection comparing strings and measuring the distance to every atom
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if selection.chains:
+        mask &= np.isin(table.chainID.decode(), selection.chains)
+    if selection.elements:
+        mask &= np.isin(table.element.decode(), selection.elements)
+    if selection.resSeq:
+        mask &= np.any([(table.resSeq >= first) & (table.resSeq <= last) for first, last in selection.resSeq], axis=0)
+    if selection.within is not None:
+        centers = selection.centers(table)
+        distance = np.full(len(table), np.inf, dtype=np.float32)
+        for center in centers:
+            distance = np.minimum(distance, np.linalg.norm(table.coords - center, axis=1))
+        mask &= distance <= selection.within
+    return mask
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "structure.pdb"), args.atoms)
+        table = PDBReader(path, sidecar=False).table
+    queries = {
+        "chain": {"chain": table.chainID.categories[0]},
+        "residues": {"resseq": "10-50,72"},
+        "element": {"element": "N,O"},
+        "pocket": {"within": "8", "residue": str(table.resSeq[len(table) // 2])},
+        "chain pocket": {"chain": table.chainID.categories[0], "element": "C", "within": "12", "point": ",".join(map(str, table.coords[0]))},
+    }
+    print(f"{len(table)} atoms")
+    for name, query in queries.items():
+        selection = Selection.fromQuery(query)
+        times = []
+        for select in (selection.mask, lambda t: naiveMask(t, selection)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                mask = select(table)
+                best = min(best, time.perf_counter() - start)
+            times.append((best, mask))
+        (fast, mask), (slow, expected) = times
+        assert (mask == expected).all(), name
+        print(f"{name:>14}: {fast * 1000:8.2f} ms, naive {slow * 1000:8.2f} ms, {mask.sum():8d} atoms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Parsed sidecar benchmark: time to get the atoms (and bonds) of a PDB file parsing its text
+against loading them from the memory mapped sidecar written by the first load (see
+`ParsedCache`), as every conversion of a model at another level of detail or mode does.
+
+    python -m benchmarks.bench_sidecar --atoms 1000000
+    python -m benchmarks.bench_sidecar --atoms 1000000 --bonds
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from pdbvis.ReadPDB import PDBReader
+from benchmarks.bench_parse import sameTable
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def timedRead(path, repeat, **kwargs):
+    """
+    Return (best seconds, reader) of reading `path` `repeat` times
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            reader = PDBReader(path, **kwargs)
+        times.append(time.perf_counter() - start)
+    return min(times), reader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atoms", type=int, default=1000000)
+    parser.add_argument("--bonds", action="store_true", help="find bonds too, stored in the sidecar")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "structure.pdb"), args.atoms)
+        size = os.path.getsize(path)
+        parsed, expected = timedRead(path, args.repeat, readBonds=args.bonds, sidecar=False)
+        first, _ = timedRead(path, 1, readBonds=args.bonds, sidecar=True) # parses and writes the sidecar
+        loaded, reader = timedRead(path, args.repeat, readBonds=args.bonds, sidecar=True)
+        if not sameTable(reader.table, expected.table):
+            raise SystemExit("sidecar atoms differ from the parsed ones")
+        stored = sum(entry.stat().st_size for entry in os.scandir(path + ".parsed"))
+    print(f"{args.atoms} atoms, {size / 2**20:.1f} MiB, sidecar {stored / 2**20:.1f} MiB")
+    print(f"{'parse':>16}: {parsed:7.3f} s")
+    print(f"{'first load':>16}: {first:7.3f} s (parse and write the sidecar)")
+    print(f"{'sidecar':>16}: {loaded:7.3f} s, speedup {parsed / loaded:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
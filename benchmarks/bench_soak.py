@@ -0,0 +1,90 @@
+"""
+Soak benchmark: convert hundreds of models to FBX in a row in one process sharing a
+`BlenderSession`, reporting resident memory, blender datablocks left and latency as jobs
+go. Both should stay flat. `--legacy` only removes objects between jobs, as conversions
+did before sessions, to compare.
+
+    python -m benchmarks.bench_soak --jobs 300
+    python -m benchmarks.bench_soak --jobs 300 --legacy
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pdbvis.BuildMesh import MODES
+from pdbvis.BlenderSession import BlenderSession, bpy
+from pdbvis.Metrics import residentMemory
+from pdbvis.ReadPDB import PDBConverter
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def window(values, fraction=0.1):
+    """
+    Mean of the first and last `fraction` of `values`
+    """
+    size = max(int(len(values) * fraction), 1)
+    return float(np.mean(values[:size])), float(np.mean(values[-size:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=300)
+    parser.add_argument("--structures", type=int, default=6, help="different synthetic structures converted in turn")
+    parser.add_argument("--atoms", type=int, default=1000, help="atoms of the smallest structure")
+    parser.add_argument("--modes", default="spheres,ballstick,beads,trace", help=f"modes converted in turn ({', '.join(MODES)})")
+    parser.add_argument("--max-growth", type=int, default=None, help="session memory watermark in bytes, 0 disables it")
+    parser.add_argument("--legacy", action="store_true", help="remove objects only, never purge nor recycle")
+    parser.add_argument("--every", type=int, default=25, help="jobs between progress lines")
+    parser.add_argument("--output", help="JSON file with every job measure")
+    args = parser.parse_args()
+    if bpy is None:
+        raise SystemExit("Blender python module (bpy) is needed")
+    modes = [mode for mode in args.modes.split(",") if mode]
+    session = BlenderSession(0 if args.legacy else args.max_growth, purge=not args.legacy)
+
+    jobs = []
+    with tempfile.TemporaryDirectory() as folder:
+        sources = [writeSyntheticPDB(os.path.join(folder, f"synthetic_{k}.pdb"), args.atoms * (1 + k % 3), seed=k)
+                   for k in range(args.structures)]
+        output = os.path.join(folder, "model.fbx")
+        print(f"{'job':>6} {'seconds':>8} {'RSS MiB':>9} {'meshes':>7} {'materials':>9} {'actions':>8} {'recycles':>8}")
+        for job in range(args.jobs):
+            source, mode = sources[job % len(sources)], modes[job % len(modes)]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                PDBConverter(input=source, output=output, mode=mode, session=session)
+            seconds = time.perf_counter() - start
+            jobs.append({"job": job, "mode": mode, "seconds": seconds, "rss": residentMemory(),
+                         "meshes": len(bpy.data.meshes), "materials": len(bpy.data.materials),
+                         "actions": len(bpy.data.actions), "recycles": session.recycles})
+            if job % args.every == 0 or job == args.jobs - 1:
+                last = jobs[-1]
+                print(f"{job:6d} {seconds:8.3f} {last['rss'] / 2**20:9.1f} {last['meshes']:7d} {last['materials']:9d} "
+                      f"{last['actions']:8d} {last['recycles']:8d}", flush=True)
+
+    # jobs cycle through structures and modes, compare whole cycles
+    cycle = len(sources) * len(modes) // np.gcd(len(sources), len(modes))
+    seconds = np.array([job["seconds"] for job in jobs])
+    rss = np.array([job["rss"] for job in jobs]) / 2**20
+    if len(jobs) >= 2 * cycle:
+        seconds = seconds[:len(seconds) // cycle * cycle].reshape(-1, cycle).mean(axis=1)
+        rss = rss[cycle - 1::cycle]
+    firstSeconds, lastSeconds = window(seconds)
+    firstRSS, lastRSS = window(rss)
+    half = len(rss) // 2
+    slope = np.polyfit(np.arange(half, len(rss)), rss[half:], 1)[0] * len(rss) / len(jobs) * 100 if len(rss) - half > 1 else 0.0
+    print(f"latency {firstSeconds:.3f} s -> {lastSeconds:.3f} s per job, RSS {firstRSS:.1f} -> {lastRSS:.1f} MiB, "
+          f"second half slope {slope:+.2f} MiB per 100 jobs, {session.recycles} recycles")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"legacy": args.legacy, "jobs": jobs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
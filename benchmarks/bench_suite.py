@@ -0,0 +1,242 @@
+"""
+Benchmark suite over synthetic structures (1k to 1M atoms by default) and any structure
+file found in `benchmarks/fixtures`. Times `PDBReader` parsing (and its peak memory),
+`BlenderPDBInit` loading, mesh build of every mode and end-to-end `getModel` latency
+through the Django test client, with the RCSB download replaced by a copy of the fixture.
+Results are written as JSON so runs on different commits can be compared:
+
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json --compare before.json
+
+Synthetic files are generated with a fixed seed, pass `--fixture-dir` to keep them
+between runs instead of writing them again.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+import numpy as np
+
+from pdbvis.BuildMesh import MODES
+from pdbvis.ReadPDB import PDBReader, BlenderPDBInit
+from pdbvis.ElementTable import loadCached
+from pdbvis.Parsers import isStructureFile
+from pdbvis.Representations import buildModelParts
+from benchmarks.synthetic import writeSyntheticPDB
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures") # real structures, benchmarked when present
+# ball-and-stick bonds aren't bound by the triangle budget, larger models don't fit in memory
+MODE_MAX_ATOMS = {"ballstick": 200000}
+REGRESSION = 1.2 # slowdown ratio reported as regression by `--compare`
+NOISE = 0.005 # s, slowdowns smaller than this aren't regressions whatever the ratio
+
+
+def timed(func, repeat=1):
+    """
+    Return (best seconds over `repeat` calls, result of the last call)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def tracedPeak(func):
+    """
+    Peak bytes allocated by python and numpy while calling `func`, in a separate call so
+    tracing doesn't slow down the timed ones
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def quiet(func):
+    """
+    `func` with its prints (progress messages of readers and converters) silenced
+    """
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return call
+
+
+def fixtures(sizes, folder):
+    """
+    Yield (name, path) of synthetic structures of `sizes` atoms written into `folder` and of
+    the structure files in `FIXTURES`
+    """
+    for size in sizes:
+        path = os.path.join(folder, f"synthetic_{size}.pdb")
+        if not os.path.exists(path):
+            writeSyntheticPDB(path, size)
+        yield f"synthetic_{size}", path
+    if os.path.isdir(FIXTURES):
+        for name in sorted(os.listdir(FIXTURES)):
+            if isStructureFile(name):
+                yield name, os.path.join(FIXTURES, name)
+
+
+def benchParse(path, repeat, memory=True):
+    seconds, reader = timed(quiet(lambda: PDBReader(path, sidecar=False)), repeat)
+    result = {"case": "parse", "seconds": seconds, "atoms": len(reader.table), "bytes": os.path.getsize(path)}
+    if memory:
+        result["peakBytes"] = tracedPeak(quiet(lambda: PDBReader(path, sidecar=False)))
+    seconds, reader = timed(quiet(lambda: PDBReader(path, readBonds=True, sidecar=False)), repeat)
+    return [result, {"case": "parse+bonds", "seconds": seconds, "bonds": len(reader.bonds)}], reader
+
+
+def benchElements(repeat):
+    def cold():
+        loadCached.cache_clear()
+        return BlenderPDBInit()
+    return [{"case": "elements cold", "seconds": timed(cold, repeat)[0]},
+            {"case": "elements warm", "seconds": timed(BlenderPDBInit, repeat)[0]}]
+
+
+def benchModes(reader, modes, repeat):
+    properties = BlenderPDBInit().atoms
+    results = []
+    for mode in modes:
+        seconds, parts = timed(lambda: buildModelParts(mode, reader.table, reader.bonds, properties), repeat)
+        results.append({"case": f"build {mode}", "seconds": seconds, "triangles": int(sum(len(part.indices) for part in parts))})
+        del parts
+    return results
+
+
+def benchRequests(path, modes, repeat):
+    """
+    `getModel` latency of a cold request (download, conversion and send) and a cached one
+    for every mode, the downloader copies `path` instead of fetching it
+    """
+    from django.test import Client
+    from django.test.utils import override_settings
+    from pdbvis import ModelCache
+
+    extension = os.path.splitext(path)[1].lstrip(".")
+    def download(ID, outPath, **kwargs):
+        shutil.copy(path, os.path.join(outPath, ID + ModelCache.EXTENSIONS[extension]))
+        return extension
+
+    results = []
+    client = Client()
+    for mode in modes:
+        cold, warm = float("inf"), float("inf")
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as root, override_settings(PDBVIS_CACHE_ROOT=root), \
+                    mock.patch.object(ModelCache, "downloadModelFromDB", download):
+                ModelCache.defaultCache.cache_clear()
+                url = f"/pdbvis/download/BNCH?format=glb&mode={mode}"
+                seconds, response = timed(quiet(lambda: client.get(url)))
+                if response.status_code != 200:
+                    raise RuntimeError(f"getModel failed with {response.status_code}: {response.content[:200]}")
+                cold = min(cold, seconds)
+                timing = response["Server-Timing"]
+                warm = min(warm, timed(quiet(lambda: b"".join(client.get(url).streaming_content)))[0])
+                ModelCache.defaultCache.cache_clear()
+        results.append({"case": f"request {mode}", "seconds": cold, "serverTiming": timing})
+        results.append({"case": f"request {mode} cached", "seconds": warm})
+    return results
+
+
+def setupDjango():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cristvirt.settings")
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    setup_test_environment()
+
+
+def environment():
+    """
+    Commit and versions the results were taken with
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "processor": platform.processor(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baselinePath, threshold=REGRESSION):
+    """
+    Print time ratio of every case against the baseline results, return the regressions
+    """
+    with open(baselinePath) as f:
+        baseline = {(r["fixture"], r["case"]): r["seconds"] for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get((result["fixture"], result["case"]))
+        if not before:
+            continue
+        ratio = result["seconds"] / before
+        flag = ""
+        if ratio > threshold and result["seconds"] - before > NOISE:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        print(f"{result['fixture']:>20} {result['case']:>24}: {before:9.4f} s -> {result['seconds']:9.4f} s  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="synthetic atom counts, comma separated")
+    parser.add_argument("--modes", default=",".join(MODES), help="modes built and requested, comma separated")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one is kept")
+    parser.add_argument("--fixture-dir", help="folder keeping synthetic files between runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip traced memory peaks")
+    parser.add_argument("--no-requests", action="store_true", help="skip Django getModel requests")
+    parser.add_argument("--output", help="JSON results file")
+    parser.add_argument("--compare", help="JSON results of a previous run, exit with 1 on regressions")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    modes = [mode for mode in args.modes.split(",") if mode]
+    if not args.no_requests:
+        setupDjango()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.fixture_dir or tmp
+        os.makedirs(folder, exist_ok=True)
+        def report(name, cases):
+            for case in cases:
+                results.append({"fixture": name, **case})
+                print(f"{name:>20} {case['case']:>24}: {case['seconds']:9.4f} s", flush=True)
+
+        report("-", benchElements(args.repeat))
+        for name, path in fixtures(sizes, folder):
+            cases, reader = benchParse(path, args.repeat, memory=not args.no_memory)
+            fitting = [mode for mode in modes if len(reader.table) <= MODE_MAX_ATOMS.get(mode, float("inf"))]
+            cases += benchModes(reader, fitting, args.repeat)
+            del reader
+            if not args.no_requests:
+                cases += benchRequests(path, fitting, args.repeat)
+            report(name, cases)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        if compare(results, args.compare):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Tiles benchmark: time and bytes before a client can show something, the whole model
+against the tile manifest and the overview, then the cost of each tile refining it.
+
+    python -m benchmarks.bench_tiles --atoms 500000
+    python -m benchmarks.bench_tiles --atoms 500000 --split chains --quantized
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pdbvis.Selection import Selection
+from pdbvis.Tiles import OVERVIEW, SPLITS, TILE_ATOMS, TileConverter
+from pdbvis.WriteGLB import GLBConverter
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def timed(build, output):
+    """
+    Return (seconds, bytes) of `build(output)`
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        build(output)
+    return time.perf_counter() - start, os.path.getsize(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atoms", type=int, default=500000)
+    parser.add_argument("--split", default="octree", choices=SPLITS)
+    parser.add_argument("--tile-atoms", type=int, default=TILE_ATOMS)
+    parser.add_argument("--quantized", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "structure.pdb"), args.atoms, residuesPerChain=5000)
+        output = os.path.join(folder, "model.glb")
+        whole = timed(lambda out: GLBConverter(path, out, quantized=args.quantized), output)
+        manifestPath = os.path.join(folder, "tiles.json")
+        manifest = timed(lambda out: TileConverter(path, out, split=args.split, tileAtoms=args.tile_atoms), manifestPath)
+        with open(manifestPath) as f:
+            tiles = json.load(f)
+        overview = timed(lambda out: GLBConverter(path, out, OVERVIEW["lod"], OVERVIEW["mode"], quantized=args.quantized),
+                         output)
+        costs = np.array([timed(lambda out: GLBConverter(path, out, tiles["lod"], quantized=args.quantized,
+                                                         selection=Selection(**tile["selection"])), output)
+                          for tile in tiles["tiles"]])
+    print(f"{args.atoms} atoms, {len(tiles['tiles'])} {args.split} tiles at lod {tiles['lod']}")
+    print(f"{'whole model':>16}: {whole[0]:7.2f} s, {whole[1] / 2**20:8.2f} MiB")
+    print(f"{'manifest':>16}: {manifest[0]:7.2f} s, {manifest[1] / 2**10:8.2f} KiB")
+    print(f"{'first content':>16}: {manifest[0] + overview[0]:7.2f} s, {(manifest[1] + overview[1]) / 2**20:8.2f} MiB (manifest and overview)")
+    print(f"{'tile':>16}: {costs[:, 0].mean():7.2f} s, {costs[:, 1].mean() / 2**20:8.2f} MiB mean, "
+          f"{costs[:, 1].sum() / 2**20:.2f} MiB every tile")
+
+
+if __name__ == "__main__":
+    main()
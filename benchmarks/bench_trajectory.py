@@ -0,0 +1,44 @@
+"""
+Multi-model benchmark: frame index scan, reading one frame by its byte offsets, loading
+every frame into an (F, N, 3) array and parsing the whole file as a flat atom list (former
+behaviour merging every model).
+
+    python -m benchmarks.bench_trajectory --atoms 10000 --models 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pdbvis.AtomTable import AtomTable
+from pdbvis.ReadPDB import Trajectory, indexFrames, iterAtoms
+from benchmarks.synthetic import writeSyntheticPDB
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=10000, help="atoms per model")
+    parser.add_argument("--models", type=int, default=100)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticPDB(os.path.join(folder, "trajectory.pdb"), args.atoms, models=args.models)
+        print(f"{args.models} models x {args.atoms} atoms, {os.path.getsize(path) / 2**20:.1f} MiB")
+        cases = [
+            ("index frames", lambda: indexFrames(path)),
+            ("last frame", lambda: Trajectory(path).frame(-1)),
+            ("all frames (F, N, 3)", lambda: Trajectory(path).loadCoords()),
+            ("flat atom list", lambda: AtomTable.concatenate(iterAtoms(path))),
+        ]
+        for label, func in cases:
+            seconds, _ = timed(func)
+            print(f"{label:>22}: {seconds:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import numpy as np
+
+# Backbone and side chain atoms used to fill synthetic residues
+RESIDUE_ATOMS = [(" N  ", "N"), (" CA ", "C"), (" C  ", "C"), (" O  ", "O"), (" CB ", "C"), (" SG ", "S")]
+RESIDUE_NAMES = ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+                 "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL"]
+CHAIN_IDS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+ATOM_DENSITY = 0.01 # atoms per Å³, about the density of a folded protein
+
+
+def encodeHybrid36(value, width):
+    """
+    Encode numbers that don't fit in `width` decimal digits as PDB hybrid-36
+    """
+    if value < 10**width:
+        return str(value).rjust(width)
+    value -= 10**width
+    digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    value += int("A" + "0" * (width - 1), 36)
+    text = ""
+    while value:
+        value, d = divmod(value, 36)
+        text = digits[d] + text
+    return text
+
+
+def syntheticLines(nAtoms, seed=0, residuesPerChain=500, models=1):
+    """
+    Yield ATOM lines of a synthetic protein-like structure with `nAtoms` atoms (per model)
+    """
+    rng = np.random.default_rng(seed)
+    # atoms lay on a noisy random walk so neighbours are ~1.5 Å apart as in real proteins
+    steps = rng.normal(0, 0.9, size=(nAtoms, 3))
+    coords = np.cumsum(steps, axis=0)
+    # reflected back into a box at protein density, so large structures are as packed as
+    # real ones and coordinates fit in the fixed width PDB columns
+    box = (nAtoms / ATOM_DENSITY) ** (1 / 3)
+    coords = box - np.abs(np.mod(coords, 2 * box) - box)
+    for model in range(models):
+        if models > 1:
+            yield f"MODEL     {model + 1:4d}"
+            coords = coords + rng.normal(0, 0.2, size=coords.shape)
+        for i in range(nAtoms):
+            residue, atom = divmod(i, len(RESIDUE_ATOMS))
+            chain, resSeq = divmod(residue, residuesPerChain)
+            name, element = RESIDUE_ATOMS[atom]
+            x, y, z = coords[i]
+            yield (f"ATOM  {encodeHybrid36(i + 1, 5)} {name} {RESIDUE_NAMES[residue % 20]} "
+                   f"{CHAIN_IDS[chain % len(CHAIN_IDS)]}{resSeq + 1:4d}    "
+                   f"{x:8.3f}{y:8.3f}{z:8.3f}{1.0:6.2f}{20.0:6.2f}          {element:>2s}  ")
+        if models > 1:
+            yield "ENDMDL"
+
+
+def writeSyntheticPDB(path, nAtoms, seed=0, **kwargs):
+    """
+    Write a synthetic PDB file with `nAtoms` atoms into `path`
+    """
+    with open(path, "w") as f:
+        f.write("HEADER    SYNTHETIC STRUCTURE\n")
+        for line in syntheticLines(nAtoms, seed, **kwargs):
+            f.write(line + "\n")
+        f.write("END\n")
+    return path
+
+
+def atomSiteColumns(table):
+    """
+    `_atom_site` columns (name, values) of an `AtomTable`, strings as python str
+    """
+    text = lambda values: [v.decode("ascii") or "." for v in values]
+    return [
+        ("group_PDB", ["HETATM" if h else "ATOM" for h in table.hetero]),
+        ("id", table.serial.astype(np.int32)),
+        ("type_symbol", list(table.element.decode())),
+        ("label_atom_id", text(table.name)),
+        ("label_comp_id", list(table.resName.decode())),
+        ("auth_asym_id", list(table.chainID.decode())),
+        ("auth_seq_id", table.resSeq.astype(np.int32)),
+        ("Cartn_x", table.coords[:, 0]), ("Cartn_y", table.coords[:, 1]), ("Cartn_z", table.coords[:, 2]),
+        ("occupancy", table.occupancy), ("B_iso_or_equiv", table.tempFactor),
+        ("pdbx_PDB_model_num", np.ones(len(table), dtype=np.int32)),
+    ]
+
+
+def writeSyntheticCIF(path, table):
+    """
+    Write atoms of `table` as the `_atom_site` loop of an mmCIF file
+    """
+    columns = atomSiteColumns(table)
+    formatted = [[f"{v:.3f}" for v in values] if isinstance(values, np.ndarray) and values.dtype.kind == "f"
+                 else [str(v) for v in values] for _, values in columns]
+    with open(path, "w") as f:
+        f.write("data_SYNTHETIC\n#\nloop_\n")
+        for name, _ in columns:
+            f.write(f"_atom_site.{name}\n")
+        for row in zip(*formatted):
+            f.write(" ".join(row) + "\n")
+        f.write("#\n")
+    return path
+
+
+def writeSyntheticBinaryCIF(path, table):
+    """
+    Write atoms of `table` as BinaryCIF, numbers as plain byte arrays and strings as string arrays
+    """
+    import msgpack
+    byteArray = lambda values, type: {"data": values.tobytes(), "encoding": [{"kind": "ByteArray", "type": type}]}
+
+    def encode(values):
+        if isinstance(values, np.ndarray):
+            return byteArray(values.astype("<f4"), 32) if values.dtype.kind == "f" else byteArray(values.astype("<i4"), 3)
+        uniques, indices = np.unique(np.array(values), return_inverse=True)
+        offsets = np.concatenate(([0], np.cumsum([len(u) for u in uniques]))).astype("<i4")
+        return {"data": indices.astype("<i4").tobytes(), "encoding": [{
+            "kind": "StringArray", "dataEncoding": [{"kind": "ByteArray", "type": 3}], "stringData": "".join(uniques),
+            "offsetEncoding": [{"kind": "ByteArray", "type": 3}], "offsets": offsets.tobytes()}]}
+
+    columns = [{"name": name, "data": encode(values), "mask": None} for name, values in atomSiteColumns(table)]
+    content = {"version": "0.3.0", "encoder": "PDBVis synthetic", "dataBlocks": [{"header": "SYNTHETIC", "categories": [
+        {"name": "_atom_site", "rowCount": len(table), "columns": columns}]}]}
+    with open(path, "wb") as f:
+        f.write(msgpack.packb(content, use_bin_type=True))
+    return path
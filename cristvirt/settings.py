@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -124,3 +125,53 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Converted models cache
+# Directory with downloaded PDB files and converted models, and its size limit in bytes
+
+PDBVIS_CACHE_ROOT = Path(os.environ.get('PDBVIS_CACHE_ROOT', BASE_DIR / 'models'))
+
+PDBVIS_CACHE_MAX_BYTES = int(os.environ.get('PDBVIS_CACHE_MAX_BYTES', 10 * 1024**3))
+
+# Server PDB and mmCIF files are downloaded from, as '<PDBVIS_RCSB_URL>/<id>.pdb'
+
+PDBVIS_RCSB_URL = os.environ.get('PDBVIS_RCSB_URL', 'https://files.rcsb.org/download/')
+
+# Server BinaryCIF files are downloaded from, as '<PDBVIS_BCIF_URL>/<id>.bcif'
+
+PDBVIS_BCIF_URL = os.environ.get('PDBVIS_BCIF_URL', 'https://models.rcsb.org/')
+
+# Structure formats tried in order when downloading a model, large entries are only
+# distributed as mmCIF (cif) or BinaryCIF (bcif, needs msgpack)
+
+PDBVIS_SOURCE_FORMATS = os.environ.get('PDBVIS_SOURCE_FORMATS', 'pdb,cif').split(',')
+
+# Store gzip (and brotli, when its module is installed) copies of converted models so
+# they're sent compressed without compressing them on every request
+
+PDBVIS_PRECOMPRESS = os.environ.get('PDBVIS_PRECOMPRESS', '1') not in ('0', 'false', 'False')
+
+# Folder where cProfile dumps of requests asking for one (`?profile=1`) are written,
+# profiling is disabled when it isn't set
+
+PDBVIS_PROFILE_DIR = os.environ.get('PDBVIS_PROFILE_DIR') or None
+
+# Blender session of a process is reset to factory settings once its resident memory
+# grows this many bytes over its start, 0 never resets it
+
+PDBVIS_BLENDER_MAX_GROWTH = int(os.environ.get('PDBVIS_BLENDER_MAX_GROWTH', 1024**3))
+
+# Octree tiles of progressive downloads hold this many atoms at most
+
+PDBVIS_TILE_ATOMS = int(os.environ.get('PDBVIS_TILE_ATOMS', 20000))
+
+# Processes parsing large PDB files in parallel, by byte ranges, 1 parses them in the
+# calling process
+
+PDBVIS_PARSE_PROCESSES = int(os.environ.get('PDBVIS_PARSE_PROCESSES', 1))
+
+# Keep the atoms parsed from each structure file as memory mapped arrays next to it
+# (`<file>.parsed`), so conversions at other levels of detail or modes don't parse it again
+
+PDBVIS_PARSED_SIDECARS = os.environ.get('PDBVIS_PARSED_SIDECARS', '1') not in ('0', 'false', 'False')
@@ -0,0 +1,94 @@
+import re
+import numpy as np
+
+CRYSTAL = "crystal" # name of the crystal symmetry expansion (REMARK 290 SMTRY operators)
+ASSEMBLY_NAME = re.compile(r"^[\w-]{1,16}$")
+
+
+class AssemblyError(ValueError):
+    pass
+
+
+class Assembly():
+    """
+    Copies of the asymmetric unit chains making a biological assembly (REMARK 350 BIOMT) or
+    the crystal unit cell (REMARK 290 SMTRY). Each one of `groups` is (chain IDs, `None` for
+    every chain, and the (K, 4, 4) transforms placing their K copies).
+    """
+    def __init__(self, name, groups):
+        self.name = name
+        self.groups = groups
+
+
+    def copies(self):
+        """
+        Number of chain group copies in the assembly
+        """
+        return sum(len(transforms) for chains, transforms in self.groups)
+
+
+    def atomGroups(self, table):
+        """
+        Return (indices of the `table` atoms, transforms) of every group with atoms in `table`
+        """
+        groups = []
+        for chains, transforms in self.groups:
+            if chains is None:
+                indices = np.arange(len(table))
+            else:
+                indices = np.flatnonzero(np.isin(table.chainID.codes, [table.chainID.codeOf(chain) for chain in chains]))
+            if len(indices):
+                groups.append((indices, transforms))
+        if not groups:
+            raise AssemblyError(f"Assembly {self.name} has no atoms")
+        return groups
+
+
+def parseAssemblies(lines):
+    """
+    Read assemblies from the REMARK 350 (biomolecules) and REMARK 290 (crystal symmetry)
+    `lines` of a PDB file. Return {name: `Assembly`}, biomolecules are named by their number.
+    """
+    found = {} # name: [[chain IDs or None, {operator serial: 4x4 matrix}]]
+    name = None
+    for line in lines:
+        record, text = line[:10], line[10:].strip()
+        if record == "REMARK 290":
+            if text.startswith("SMTRY"):
+                groups = found.setdefault(CRYSTAL, [[None, {}]])
+                addOperatorRow(groups[-1][1], text)
+            continue
+        if text.startswith("BIOMOLECULE:"):
+            name = text.split(":", 1)[1].strip()
+            found[name] = []
+        elif name is None:
+            continue
+        elif text.startswith("APPLY THE FOLLOWING TO CHAINS:"):
+            found[name].append([splitChains(text), {}])
+        elif text.startswith("AND CHAINS:") and found[name]:
+            found[name][-1][0] += splitChains(text)
+        elif text.startswith("BIOMT"):
+            if not found[name]:
+                found[name].append([None, {}]) # operators without chain list apply to every chain
+            addOperatorRow(found[name][-1][1], text)
+    assemblies = {}
+    for name, groups in found.items():
+        groups = [(chains, np.stack([operators[serial] for serial in sorted(operators)]))
+                  for chains, operators in groups if operators]
+        if groups:
+            assemblies[name] = Assembly(name, groups)
+    return assemblies
+
+
+def splitChains(text):
+    return [chain.strip() for chain in text.split(":", 1)[1].split(",") if chain.strip()]
+
+
+def addOperatorRow(operators, text):
+    """
+    Add row n of a BIOMTn or SMTRYn record (rotation row and translation) to its operator
+    """
+    values = text.split()
+    row, serial = int(values[0][-1]) - 1, int(values[1])
+    matrix = operators.setdefault(serial, np.eye(4))
+    matrix[row] = [float(value) for value in values[2:6]]
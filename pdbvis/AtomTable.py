@@ -0,0 +1,348 @@
+from collections.abc import Sequence
+import numpy as np
+
+# Fixed-width columns of an ATOM record (0-based, end exclusive), as in the PDB format spec
+COLUMNS = {
+    "serial": (6, 11), "name": (12, 16), "altLoc": (16, 17), "resName": (17, 20),
+    "chainID": (21, 22), "resSeq": (22, 26), "iCode": (26, 27), "x": (30, 38),
+    "y": (38, 46), "z": (46, 54), "occupancy": (54, 60), "tempFactor": (60, 66),
+    "element": (76, 78), "charge": (78, 80),
+}
+ATOM_RECORDS = (b"ATOM", b"HETATM") # records with atom coordinates, HETATM for ligands, ions and water
+LINE_WIDTH = 80
+RECORD_BLOCK = 1 << 15 # records gathered at once by `recordMatrix`
+MISSING_INT = np.iinfo(np.int32).min # int32 fields without value, negative numbers are valid
+
+
+class Categorical():
+    """
+    Column of repeated strings stored as integer codes into a small list of categories
+    """
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = list(categories)
+
+
+    @classmethod
+    def fromValues(cls, values, transform=None):
+        """
+        Build a categorical column from a byte string array, `transform` is applied to each category
+        """
+        uniques, codes = np.unique(values, return_inverse=True)
+        categories = [u.decode("ascii", "replace").strip() for u in uniques]
+        if transform:
+            categories = [transform(c) for c in categories]
+        # transform may merge categories (e.g. 'FE' and 'Fe'), keep them unique
+        merged = list(dict.fromkeys(categories))
+        if len(merged) != len(categories):
+            remap = np.array([merged.index(c) for c in categories], dtype=np.int32)
+            codes = remap[codes]
+            categories = merged
+        return cls(codes.astype(np.uint16 if len(categories) < 2**16 else np.uint32), categories)
+
+
+    def __len__(self):
+        return len(self.codes)
+
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+
+    def take(self, index):
+        return Categorical(self.codes[index], self.categories)
+
+
+    def decode(self):
+        """
+        Return the full column as a numpy array of strings
+        """
+        return np.array(self.categories, dtype=object)[self.codes] if len(self.categories) else np.empty(0, dtype=object)
+
+
+    def codeOf(self, value):
+        """
+        Return the code of `value` or -1 if it's not a category of this column
+        """
+        return self.categories.index(value) if value in self.categories else -1
+
+
+    @staticmethod
+    def concatenate(columns):
+        """
+        Merge several categorical columns remapping their codes into one category list
+        """
+        categories = list(dict.fromkeys(c for col in columns for c in col.categories))
+        lookup = {c: i for i, c in enumerate(categories)}
+        codes = [np.array([lookup[c] for c in col.categories], dtype=np.uint32)[col.codes] if len(col.categories) else col.codes
+                 for col in columns]
+        codes = np.concatenate(codes) if codes else np.empty(0, np.uint32)
+        return Categorical(codes.astype(np.uint16 if len(categories) < 2**16 else np.uint32), categories)
+
+
+class AtomTable():
+    """
+    Columnar representation of the atoms in a structure. Coordinates are an (N, 3) float32
+    array, numeric fields are numpy arrays and repeated strings (element, residue name and
+    chain) are `Categorical` columns.
+    """
+    numeric = ("coords", "serial", "resSeq", "occupancy", "tempFactor", "hetero")
+    categorical = ("element", "resName", "chainID")
+    strings = ("name", "altLoc", "iCode", "charge")
+
+    def __init__(self, coords, serial, resSeq, occupancy, tempFactor, element, resName, chainID,
+                 name, altLoc, iCode, charge, hetero=None):
+        self.coords = coords # (N, 3) float32
+        self.serial = serial # int32, MISSING_INT when missing
+        self.resSeq = resSeq # int32, MISSING_INT when missing
+        self.occupancy = occupancy # float32, NaN when missing
+        self.tempFactor = tempFactor # float32, NaN when missing
+        self.element = element # Categorical
+        self.resName = resName # Categorical
+        self.chainID = chainID # Categorical
+        self.name = name # bytes arrays
+        self.altLoc = altLoc
+        self.iCode = iCode
+        self.charge = charge
+        # bool, HETATM (non-polymer) atoms
+        self.hetero = hetero if hetero is not None else np.zeros(len(coords), dtype=bool)
+
+
+    def __len__(self):
+        return len(self.coords)
+
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the table columns
+        """
+        total = 0
+        for field in self.numeric + self.strings:
+            total += getattr(self, field).nbytes
+        for field in self.categorical:
+            total += getattr(self, field).codes.nbytes
+        return total
+
+
+    @classmethod
+    def empty(cls):
+        return cls.fromRecords(np.empty((0, LINE_WIDTH), dtype=np.uint8))
+
+
+    @classmethod
+    def fromBytes(cls, data, records=ATOM_RECORDS):
+        """
+        Parse every line in `data` (bytes of a PDB file) starting with one of `records`
+        """
+        return cls.fromRecords(recordMatrix(data, records))
+
+
+    @classmethod
+    def fromRecords(cls, raw, parsedCoords=None):
+        """
+        Build table from an (N, 80) uint8 matrix with one fixed-width record per row,
+        `parsedCoords` are its `parseCoords` when already known
+        """
+        fields = {key: columnBytes(raw, *span) for key, span in COLUMNS.items()}
+        # atoms without a valid position are skipped
+        coords, valid = parsedCoords if parsedCoords is not None else parseCoords(raw)
+        if not valid.all():
+            raw = raw[valid]
+            coords = coords[valid]
+            fields = {key: value[valid] for key, value in fields.items()}
+
+        return cls(
+            coords=coords,
+            serial=parseNumeric(fields["serial"], np.int32, MISSING_INT, hybrid36=True)[0],
+            resSeq=parseNumeric(fields["resSeq"], np.int32, MISSING_INT, hybrid36=True)[0],
+            occupancy=parseNumeric(fields["occupancy"], np.float32, np.nan)[0],
+            tempFactor=parseNumeric(fields["tempFactor"], np.float32, np.nan)[0],
+            element=Categorical.fromValues(fields["element"], transform=str.capitalize),
+            resName=Categorical.fromValues(fields["resName"]),
+            chainID=Categorical.fromValues(fields["chainID"]),
+            name=np.char.strip(fields["name"]),
+            altLoc=np.char.strip(fields["altLoc"]),
+            iCode=np.char.strip(fields["iCode"]),
+            charge=np.char.strip(fields["charge"]),
+            hetero=raw[:, 0] == ord("H"),
+        )
+
+
+    def withCoords(self, coords):
+        """
+        Return a table sharing every column but the coordinates, e.g. another trajectory frame
+        """
+        if len(coords) != len(self):
+            raise ValueError(f"Expected {len(self)} coordinates, got {len(coords)}")
+        kwargs = {field: getattr(self, field) for field in self.numeric + self.categorical + self.strings}
+        kwargs["coords"] = coords
+        return AtomTable(**kwargs)
+
+
+    def take(self, index):
+        """
+        Return a new table with the rows selected by `index` (mask or indices)
+        """
+        kwargs = {field: getattr(self, field)[index] for field in self.numeric + self.strings}
+        kwargs.update({field: getattr(self, field).take(index) for field in self.categorical})
+        return AtomTable(**kwargs)
+
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Join several tables keeping their order
+        """
+        tables = list(tables)
+        if not tables:
+            return cls.empty()
+        kwargs = {field: np.concatenate([getattr(t, field) for t in tables]) for field in cls.numeric + cls.strings}
+        kwargs.update({field: Categorical.concatenate([getattr(t, field) for t in tables]) for field in cls.categorical})
+        return cls(**kwargs)
+
+
+    def record(self, i):
+        """
+        Return atom `i` as a dictionary with the same keys `PDBReader` used to build
+        """
+        decode = lambda value: value.decode("ascii", "replace")
+        missing = lambda value: None if np.isnan(value) else round(float(value), 2)
+        return {
+            "atom": "HETATM" if self.hetero[i] else "ATOM",
+            "serial": int(self.serial[i]) if self.serial[i] != MISSING_INT else None,
+            "name": decode(self.name[i]), "altLoc": decode(self.altLoc[i]),
+            "resName": self.resName[i], "chainID": self.chainID[i],
+            "resSeq": int(self.resSeq[i]) if self.resSeq[i] != MISSING_INT else None,
+            "iCode": decode(self.iCode[i]), "x": round(float(self.coords[i, 0]), 3),
+            "y": round(float(self.coords[i, 1]), 3), "z": round(float(self.coords[i, 2]), 3),
+            "occupancy": missing(self.occupancy[i]), "tempFactor": missing(self.tempFactor[i]),
+            "element": self.element[i], "charge": decode(self.charge[i]),
+        }
+
+
+class AtomDictView(Sequence):
+    """
+    Read-only list-like view of an `AtomTable` creating one dictionary per atom on access
+    """
+    def __init__(self, table):
+        self.table = table
+
+
+    def __len__(self):
+        return len(self.table)
+
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.table.record(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("atom index out of range")
+        return self.table.record(i)
+
+
+def parseCoords(raw):
+    """
+    Return (N, 3) float32 coordinates of an (N, 80) record matrix and mask of valid rows
+    """
+    coords = np.empty((len(raw), 3), dtype=np.float32)
+    valid = np.ones(len(raw), dtype=bool)
+    for i, axis in enumerate("xyz"):
+        coords[:, i], ok = parseNumeric(columnBytes(raw, *COLUMNS[axis]), np.float32, np.nan)
+        valid &= ok
+    return coords, valid
+
+
+def recordMatrix(data, records=ATOM_RECORDS, withStarts=False):
+    """
+    Return an (N, 80) uint8 matrix with the lines of `data` starting with any of `records`,
+    short lines are padded with spaces. `withStarts` returns the offsets of the lines in
+    `data` too.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buf)]))
+    keep = np.zeros(len(starts), dtype=bool)
+    for record in records:
+        width = len(record)
+        head = starts[ends - starts >= width]
+        match = np.ones(len(head), dtype=bool)
+        for j, char in enumerate(record):
+            match &= buf[head + j] == char
+        keep[np.searchsorted(starts, head[match])] = True
+    starts, ends = starts[keep], ends[keep]
+
+    # gather records in blocks so the index matrix stays small on huge files
+    raw = np.full((len(starts), LINE_WIDTH), ord(" "), dtype=np.uint8)
+    offsets = np.arange(LINE_WIDTH)
+    for block in range(0, len(starts), RECORD_BLOCK):
+        blockEnds = ends[block:block + RECORD_BLOCK, None]
+        index = starts[block:block + RECORD_BLOCK, None] + offsets
+        if (blockEnds - index[:, :1] >= LINE_WIDTH).all():
+            raw[block:block + RECORD_BLOCK] = buf[index]
+        else:
+            inside = index < blockEnds
+            np.copyto(raw[block:block + RECORD_BLOCK], buf[np.minimum(index, len(buf) - 1)], where=inside)
+    raw[raw == ord("\r")] = ord(" ")
+    return (raw, starts) if withStarts else raw
+
+
+def columnBytes(raw, start, end):
+    """
+    Slice fixed-width columns `start:end` of the record matrix as a bytes array
+    """
+    return np.ascontiguousarray(raw[:, start:end]).view(f"S{end - start}").reshape(len(raw))
+
+
+def parseNumeric(column, dtype, fill, hybrid36=False):
+    """
+    Convert a bytes column into numbers, return values and a mask of successfully parsed ones.
+    Missing or invalid values are set to `fill`.
+    """
+    values = np.full(len(column), fill, dtype=dtype)
+    ok = np.char.strip(column) != b""
+    pending = ok.copy()
+    if hybrid36:
+        encoded = hybrid36Rows(column) & ok
+        if encoded.any():
+            values[encoded] = decodeHybrid36(column[encoded])
+            pending &= ~encoded
+    try:
+        values[pending] = column[pending].astype(dtype)
+    except ValueError:
+        # slow path, only for columns with some invalid value
+        convert = float if np.issubdtype(dtype, np.floating) else int
+        for i in np.flatnonzero(pending):
+            try:
+                values[i] = convert(column[i].decode("ascii", "replace").strip())
+            except ValueError:
+                ok[i] = False
+    return values, ok
+
+
+def hybrid36Rows(column):
+    """
+    Mask of values in a bytes column written as hybrid-36 (full width, starting with a letter)
+    """
+    chars = column.view(np.uint8).reshape(len(column), column.itemsize)
+    alnum = (((chars >= ord("0")) & (chars <= ord("9"))) | ((chars >= ord("A")) & (chars <= ord("Z")))
+             | ((chars >= ord("a")) & (chars <= ord("z"))))
+    first = chars[:, 0]
+    return alnum.all(axis=1) & (((first >= ord("A")) & (first <= ord("Z"))) | ((first >= ord("a")) & (first <= ord("z"))))
+
+
+def decodeHybrid36(column):
+    """
+    Decode hybrid-36 numbers used for serials and residue numbers above the decimal limit
+    """
+    width = column.itemsize
+    chars = column.view(np.uint8).reshape(len(column), width).astype(np.int64)
+    upper = chars[:, 0] <= ord("Z")
+    digits = np.where(chars <= ord("9"), chars - ord("0"), np.where(chars <= ord("Z"), chars - ord("A") + 10, chars - ord("a") + 10))
+    value = digits @ (36 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+    # 'A000..' starts right after the largest decimal number of the field, 'a000..' after 'ZZZ..'
+    offset = np.where(upper, 10**width, 10**width + 26 * 36**(width - 1))
+    return value - 10 * 36**(width - 1) + offset
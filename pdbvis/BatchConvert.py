@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import shutil
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .ModelCache import defaultCache, prepareModel, freshModel
+from .GetPDB import EXTENSIONS, prefetchModels
+from .Workers import initWorker
+from .BlenderSession import BLENDER_PATHS
+
+JOURNAL = "convert_models.jsonl" # conversions finished by batch runs, in the cache root
+
+
+def taskKey(modelID, params):
+    return json.dumps({"modelID": modelID, **params}, sort_keys=True)
+
+
+def folderModels(folder, cache):
+    """
+    Return IDs of the structure files in `folder` (named `<ID>.pdb`, `.cif` or `.bcif`),
+    copying into the cache the ones it doesn't have yet
+    """
+    IDs = []
+    for name in sorted(os.listdir(folder)):
+        modelID, extension = os.path.splitext(name)
+        format = next((f for f, e in EXTENSIONS.items() if e == extension.lower()), None)
+        if format is None:
+            continue
+        if not cache.sourcePath(modelID):
+            shutil.copy(os.path.join(folder, name), cache.sourcePath(modelID, format))
+        IDs.append(modelID)
+    return IDs
+
+
+def convertTask(modelID, params):
+    """
+    Download (if needed) and convert one model in a pool process. Return (path, seconds).
+    """
+    start = time.perf_counter()
+    path = prepareModel(modelID, params)
+    return path, time.perf_counter() - start
+
+
+class BatchConverter():
+    """
+    Convert many models with several parameter sets in a pool of processes. Every finished
+    conversion is appended to a journal so an interrupted run can be started again: models
+    already cached (and not stale) are skipped and known failures too, unless `retryFailed`.
+    Explicit (modelID, params) `tasks` are converted instead of every ID with every set.
+    """
+    def __init__(self, IDs, paramSets, processes=None, concurrency=8, retryFailed=False, cache=None, log=print, tasks=None):
+        self.tasks = tasks
+        if tasks is not None:
+            IDs = [modelID for modelID, params in tasks]
+        self.IDs = list(dict.fromkeys(IDs)) # unique, in order
+        self.paramSets = paramSets
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency # simultaneous downloads
+        self.retryFailed = retryFailed
+        self.cache = cache or defaultCache()
+        self.log = log
+        self.journalPath = os.path.join(self.cache.root, JOURNAL)
+        self.results = {"done": 0, "cached": 0, "failed": [], "missing": []}
+        self.bytes = 0 # size of models converted in this run
+        self.seconds = 0.0 # conversion time summed over processes
+
+
+    def readJournal(self):
+        """
+        Return keys of conversions that failed in previous runs
+        """
+        failed = set()
+        if os.path.exists(self.journalPath):
+            with open(self.journalPath) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # line cut by an interruption
+                    key = taskKey(entry["modelID"], entry["params"])
+                    if entry["status"] == "failed":
+                        failed.add(key)
+                    else:
+                        failed.discard(key)
+        return failed
+
+
+    def record(self, modelID, params, status, **details):
+        with open(self.journalPath, "a") as f:
+            f.write(json.dumps({"modelID": modelID, "params": params, "status": status, "time": time.time(), **details}) + "\n")
+
+
+    def download(self):
+        """
+        Download structure files missing from the cache, concurrently. Return IDs available.
+        """
+        missing = [ID for ID in self.IDs if not self.cache.sourcePath(ID)]
+        if missing:
+            self.log(f"Downloading {len(missing)} structures...")
+            results = prefetchModels(missing, os.path.join(self.cache.root, "pdb"), self.concurrency,
+                                     baseURL=settings.PDBVIS_RCSB_URL, formats=settings.PDBVIS_SOURCE_FORMATS,
+                                     bcifURL=settings.PDBVIS_BCIF_URL)
+            for ID, result in results.items():
+                if not isinstance(result, str):
+                    error = "not found" if result is None else repr(result)
+                    self.results["missing"].append((ID, error))
+                    self.log(f"  {ID}: {error}")
+        return [ID for ID in self.IDs if self.cache.sourcePath(ID)]
+
+
+    def pending(self, IDs):
+        """
+        Return (modelID, params) conversions still to run
+        """
+        failed = set() if self.retryFailed else self.readJournal()
+        available = set(IDs)
+        requested = self.tasks if self.tasks is not None else [(modelID, params) for modelID in IDs for params in self.paramSets]
+        tasks = []
+        for modelID, params in requested:
+            if modelID not in available:
+                continue
+            if freshModel(modelID, params, self.cache):
+                self.results["cached"] += 1
+            elif taskKey(modelID, params) in failed:
+                self.results["failed"].append((modelID, params, "failed in a previous run"))
+            else:
+                tasks.append((modelID, params))
+        return tasks
+
+
+    def run(self):
+        """
+        Download and convert everything, return the results by status
+        """
+        start = time.perf_counter()
+        tasks = self.pending(self.download())
+        self.log(f"{len(tasks)} conversions to run, {self.results['cached']} already cached, "
+                 f"{len(self.results['failed'])} skipped after failing before")
+        while tasks:
+            tasks = self.runPool(tasks)
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+
+    def runPool(self, tasks):
+        """
+        Run `tasks` in a new process pool, return the ones left when the pool broke (a
+        conversion process died, the task it ran is marked failed)
+        """
+        context = multiprocessing.get_context("spawn") # clean processes, one blender or exporter each
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=context, initializer=initWorker,
+                                 initargs=(BLENDER_PATHS,)) as pool:
+            queue = list(reversed(tasks))
+            running = {}
+            while queue or running:
+                while queue and len(running) < self.processes:
+                    task = queue.pop()
+                    running[pool.submit(convertTask, *task)] = task
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    modelID, params = running.pop(future)
+                    try:
+                        path, seconds = future.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        self.fail(modelID, params, f"Conversion process died: {e!r}")
+                        continue
+                    except Exception:
+                        self.fail(modelID, params, traceback.format_exc())
+                        continue
+                    if path is None:
+                        self.fail(modelID, params, "not found")
+                        continue
+                    size = os.path.getsize(path)
+                    self.results["done"] += 1
+                    self.bytes += size
+                    self.seconds += seconds
+                    self.record(modelID, params, "done", seconds=seconds, bytes=size)
+                    self.log(f"  {modelID} {params}: {seconds:.2f} s, {size / 2**20:.1f} MiB")
+                if broken:
+                    # every running task failed with the pool, the ones never started go to a new one
+                    return [running[future] for future in running] + list(reversed(queue))
+        return []
+
+
+    def fail(self, modelID, params, error):
+        self.results["failed"].append((modelID, params, error))
+        self.record(modelID, params, "failed", error=error)
+        self.log(f"  {modelID} {params}: FAILED {error.strip().splitlines()[-1]}")
+
+
+    def summary(self):
+        """
+        Throughput and failures of the run as text
+        """
+        done, elapsed = self.results["done"], max(self.elapsed, 1e-9)
+        lines = [f"{done} models converted in {elapsed:.1f} s: {done / elapsed:.2f} models/s, "
+                 f"{self.bytes / 2**20 / elapsed:.1f} MiB/s written, {self.seconds / max(done, 1):.2f} s per model "
+                 f"on {self.processes} processes",
+                 f"{self.results['cached']} already cached, {len(self.results['missing'])} not downloaded, "
+                 f"{len(self.results['failed'])} failed"]
+        for ID, error in self.results["missing"]:
+            lines.append(f"  missing {ID}: {error}")
+        for modelID, params, error in self.results["failed"]:
+            lines.append(f"  failed {modelID} {params}: {error.strip().splitlines()[-1]}")
+        return "\n".join(lines)
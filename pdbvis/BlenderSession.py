@@ -0,0 +1,93 @@
+import sys
+from functools import lru_cache
+
+from django.conf import settings
+
+from .Metrics import residentMemory
+
+_path = list(sys.path)
+try:
+    import bpy
+except ImportError:
+    bpy = None # only needed by `PDBConverter`, reading PDB files works without blender
+# script folders blender adds to sys.path, spawned processes inherit them and would find
+# blender's `bpy` scripts package before the module itself
+BLENDER_PATHS = [path for path in sys.path if path not in _path]
+# scene frame range of blender's factory settings, animated conversions change it
+FRAME_RANGE = (1, 250)
+MAX_GROWTH = 1 << 30 # bytes, default watermark outside django (see `PDBVIS_BLENDER_MAX_GROWTH`)
+
+
+class BlenderSession():
+    """
+    Blender state reused by the FBX conversions of a process. `reset` clears the scene
+    between jobs: objects are removed and the data they leave without users (meshes, shape
+    keys, animation actions) is purged, materials are kept for the next jobs. When resident
+    memory grows over `maxGrowth` bytes since the session started, blender is reset to its
+    factory settings dropping every datablock (the session is recycled). With `purge` off
+    only objects are removed, as conversions did before sessions.
+    """
+    def __init__(self, maxGrowth=None, purge=True):
+        if bpy is None:
+            raise ImportError("Blender python module (bpy) is needed to convert models")
+        if maxGrowth is None:
+            # converters also run outside django, in scripts and benchmarks
+            maxGrowth = settings.PDBVIS_BLENDER_MAX_GROWTH if settings.configured else MAX_GROWTH
+        self.maxGrowth = maxGrowth
+        self.purge = purge
+        self.jobs = 0 # conversions since the session started or was recycled
+        self.recycles = 0
+        self.baseline = residentMemory() # bytes when the session started
+
+
+    def reset(self):
+        """
+        Empty the scene for a new conversion
+        """
+        for obj in list(bpy.data.objects):
+            bpy.data.objects.remove(obj)
+        if self.purge:
+            bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+        scene = bpy.context.scene
+        scene.frame_start, scene.frame_end = FRAME_RANGE
+
+
+    def material(self, name, color):
+        """
+        Material `name` with diffuse `color`, created once and kept by `reset`
+        """
+        mat = bpy.data.materials.get(name)
+        if not mat:
+            mat = bpy.data.materials.new(name=name)
+            mat.use_fake_user = self.purge # not an orphan when its objects are removed
+        mat.diffuse_color = color
+        return mat
+
+
+    def finish(self):
+        """
+        End of a conversion, recycle the session if memory grew past its watermark
+        """
+        self.jobs += 1
+        if self.maxGrowth and residentMemory() - self.baseline > self.maxGrowth:
+            self.recycle()
+
+
+    def recycle(self):
+        """
+        Reset blender to factory settings with an empty scene, freeing every datablock
+        """
+        print(f"Recycling blender session after {self.jobs} conversions...")
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+        self.recycles += 1
+        self.jobs = 0
+        # memory the allocator doesn't give back isn't counted against the next session
+        self.baseline = residentMemory()
+
+
+@lru_cache(maxsize=None)
+def defaultSession():
+    """
+    Process wide blender session configured in settings
+    """
+    return BlenderSession()
@@ -0,0 +1,161 @@
+import itertools
+import numpy as np
+
+from .AtomTable import columnBytes, parseNumeric
+
+BOND_TOLERANCE = 0.45 # Å added to the sum of covalent radii
+MIN_BOND_LENGTH = 0.4 # Å, closer atoms are overlapping alternate locations, not bonded
+DEFAULT_COVALENT_RADIUS = 0.77 # Å, used for elements without covalent radius
+# Neighbour cell offsets visiting each pair of cells once, the cell itself included
+HALF_OFFSETS = [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset >= (0, 0, 0)]
+
+
+class SpatialGrid():
+    """
+    Cell list of 3D points with cubic cells of `cellSize`, neighbours closer than the cell
+    size are found looking only at adjacent cells so searches are O(N)
+    """
+    def __init__(self, coords, cellSize):
+        self.coords = np.asarray(coords, dtype=np.float32)
+        self.cellSize = float(cellSize)
+        self.origin = self.coords.min(axis=0) if len(self.coords) else np.zeros(3, dtype=np.float32)
+        self.cells = ((self.coords - self.origin) // self.cellSize).astype(np.int64)
+        self.shape = self.cells.max(axis=0) + 1 if len(self.coords) else np.ones(3, dtype=np.int64)
+        keys = self.cellKeys(self.cells)
+        self.order = np.argsort(keys, kind="stable")
+        self.sortedKeys = keys[self.order]
+
+
+    def cellKeys(self, cells):
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+
+    def candidates(self, cells, owners):
+        """
+        Return (owner, point index) for every point inside `cells`, `owners` labels each cell
+        """
+        inside = ((cells >= 0) & (cells < self.shape)).all(axis=1)
+        cells, owners = cells[inside], owners[inside]
+        keys = self.cellKeys(cells)
+        start = np.searchsorted(self.sortedKeys, keys, "left")
+        counts = np.searchsorted(self.sortedKeys, keys, "right") - start
+        total = counts.sum()
+        # concatenation of ranges start[k]:start[k] + counts[k]
+        shift = np.repeat(start - (np.cumsum(counts) - counts), counts)
+        return np.repeat(owners, counts), self.order[np.arange(total) + shift]
+
+
+    def pairsWithin(self, cutoff):
+        """
+        Return (M, 2) array with every pair of points (i < j) closer than `cutoff`
+        """
+        if cutoff > self.cellSize:
+            raise ValueError("Cutoff can't be larger than grid cell size")
+        owners = np.arange(len(self.coords))
+        pairs = []
+        for offset in HALF_OFFSETS:
+            i, j = self.candidates(self.cells + offset, owners)
+            if offset == (0, 0, 0):
+                keep = i < j
+                i, j = i[keep], j[keep]
+            diff = self.coords[i] - self.coords[j]
+            close = np.einsum("ij,ij->i", diff, diff) <= cutoff * cutoff
+            pair = np.column_stack([i[close], j[close]])
+            pairs.append(np.sort(pair, axis=1))
+        return np.concatenate(pairs).astype(np.int64) if pairs else np.empty((0, 2), dtype=np.int64)
+
+
+    def within(self, points, radius):
+        """
+        Return mask of grid points closer than `radius` to any of `points`
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        mask = np.zeros(len(self.coords), dtype=bool)
+        reach = int(np.ceil(radius / self.cellSize))
+        centers = ((points - self.origin) // self.cellSize).astype(np.int64)
+        owners = np.arange(len(points))
+        for offset in itertools.product(range(-reach, reach + 1), repeat=3):
+            p, j = self.candidates(centers + offset, owners)
+            diff = self.coords[j] - points[p]
+            mask[j[np.einsum("ij,ij->i", diff, diff) <= radius * radius]] = True
+        return mask
+
+
+def covalentRadii(table, elements):
+    """
+    Covalent radius of each atom in `table` from `ElementTable` `elements`
+    """
+    radii = np.array([elements[e]["RadiusCovalent"] if e in elements and elements[e]["RadiusCovalent"] else DEFAULT_COVALENT_RADIUS
+                      for e in table.element.categories], dtype=np.float32)
+    return radii[table.element.codes] if len(radii) else np.empty(0, dtype=np.float32)
+
+
+def perceiveBonds(coords, radii, tolerance=BOND_TOLERANCE):
+    """
+    Bonds between atoms closer than the sum of their covalent `radii` plus `tolerance`
+    """
+    if len(coords) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    cutoff = 2 * float(radii.max()) + tolerance
+    pairs = SpatialGrid(coords, cutoff).pairsWithin(cutoff)
+    i, j = pairs.T
+    distance = np.linalg.norm(coords[i] - coords[j], axis=1)
+    bonded = (distance <= radii[i] + radii[j] + tolerance) & (distance >= MIN_BOND_LENGTH)
+    return pairs[bonded]
+
+
+def conectBonds(rows, serial):
+    """
+    Bonds of CONECT records, `rows` is their (M, 80) record matrix and `serial` the atoms
+    serial numbers. Bonds with atoms not in `serial` are dropped.
+    """
+    origin = parseNumeric(columnBytes(rows, 6, 11), np.int64, -1, hybrid36=True)[0]
+    pairs = []
+    for start in (11, 16, 21, 26):
+        target = parseNumeric(columnBytes(rows, start, start + 5), np.int64, -1, hybrid36=True)[0]
+        listed = (target >= 0) & (origin >= 0)
+        pairs.append(np.column_stack([origin[listed], target[listed]]))
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    if not len(pairs) or not len(serial):
+        return np.empty((0, 2), dtype=np.int64)
+    # serial numbers into atom indices
+    sorter = np.argsort(serial, kind="stable")
+    position = np.searchsorted(serial[sorter], pairs).clip(0, len(serial) - 1)
+    index = sorter[position]
+    found = (serial[index] == pairs).all(axis=1)
+    return uniqueBonds(index[found])
+
+
+def takeBonds(bonds, indices, nAtoms):
+    """
+    Bonds between atoms `indices` of a table of `nAtoms`, renumbered as in `table.take(indices)`
+    """
+    remap = np.full(nAtoms, -1, dtype=np.int64)
+    remap[indices] = np.arange(len(indices))
+    pairs = remap[np.asarray(bonds, dtype=np.int64).reshape(-1, 2)]
+    return pairs[(pairs >= 0).all(axis=1)]
+
+
+def uniqueBonds(pairs):
+    """
+    Sort each bond (i < j), remove repeated ones and self bonds
+    """
+    if not len(pairs):
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.asarray(pairs, dtype=np.int64), axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    # unique over a single integer key is much faster than over rows
+    size = int(pairs.max()) + 1 if len(pairs) else 1
+    keys = np.sort(pairs[:, 0] * size + pairs[:, 1])
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return np.column_stack([keys // size, keys % size])
+
+
+def findBonds(table, elements, conectRows=None, tolerance=BOND_TOLERANCE):
+    """
+    Bonds of `table` atoms from CONECT records (if given) plus distance based perception
+    """
+    bonds = perceiveBonds(table.coords, covalentRadii(table, elements), tolerance)
+    if conectRows is not None and len(conectRows):
+        bonds = uniqueBonds(np.concatenate([bonds, conectBonds(conectRows, table.serial)]))
+    return bonds
@@ -0,0 +1,225 @@
+from functools import lru_cache
+import numpy as np
+
+MIN_SUBDIVISIONS = 1
+MAX_SUBDIVISIONS = 6
+TRIANGLE_BUDGET = 2000000 # triangles aimed by `autoSubdivisions` for the whole model
+# space-filling, ball-and-stick and coarse-grained models (see `Representations`)
+MODES = ("spheres", "ballstick", "trace", "beads", "surface")
+BALL_SCALE = 0.5 # ball-and-stick spheres radius relative to the element radius
+BOND_RADIUS = 0.15 # Å
+
+
+@lru_cache(maxsize=None)
+def icoSphere(subdivisions):
+    """
+    Return (vertices, faces) of a unit icosphere, `subdivisions` counts as in blender's
+    `primitive_ico_sphere_add` (1 is the plain icosahedron). Arrays are read-only and shared.
+    """
+    if subdivisions < 1:
+        raise ValueError("Sphere subdivisions must be at least 1")
+    # icosahedron with a vertex on each pole, as blender builds it
+    z = 1 / np.sqrt(5)
+    r = 2 / np.sqrt(5)
+    angles = np.arange(5) * 2 * np.pi / 5
+    verts = np.vstack([
+        [0, 0, 1],
+        np.column_stack([r * np.cos(angles), r * np.sin(angles), np.full(5, z)]),
+        np.column_stack([r * np.cos(angles + np.pi / 5), r * np.sin(angles + np.pi / 5), np.full(5, -z)]),
+        [0, 0, -1],
+    ])
+    upper = np.arange(1, 6)
+    lower = np.arange(6, 11)
+    nextUpper = np.roll(upper, -1)
+    nextLower = np.roll(lower, -1)
+    faces = np.vstack([
+        np.column_stack([np.zeros(5, int), upper, nextUpper]),
+        np.column_stack([upper, lower, nextUpper]),
+        np.column_stack([nextUpper, lower, nextLower]),
+        np.column_stack([np.full(5, 11), nextLower, lower]),
+    ])
+    for _ in range(subdivisions - 1):
+        verts, faces = subdivide(verts, faces)
+    verts = verts.astype(np.float32)
+    faces = faces.astype(np.uint32)
+    verts.flags.writeable = False
+    faces.flags.writeable = False
+    return verts, faces
+
+
+def subdivide(verts, faces):
+    """
+    Split every triangle in four, new vertices are edge midpoints projected on the unit sphere
+    """
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique, inverse = np.unique(edges, axis=0, return_inverse=True)
+    mids = verts[unique].mean(axis=1)
+    mids /= np.linalg.norm(mids, axis=1)[:, None]
+    ab, bc, ca = (len(verts) + inverse.reshape(-1, 3)).T
+    a, b, c = faces.T
+    faces = np.vstack([
+        np.column_stack([a, ab, ca]),
+        np.column_stack([ab, b, bc]),
+        np.column_stack([ca, bc, c]),
+        np.column_stack([ab, bc, ca]),
+    ])
+    return np.vstack([verts, mids]), faces
+
+
+def sphereBatch(centers, radius, subdivisions):
+    """
+    Merge one sphere of `radius` (a value or one per sphere) per row of `centers` into a
+    single vertex and face buffer
+    """
+    templateVerts, templateFaces = icoSphere(subdivisions)
+    centers = np.asarray(centers, dtype=np.float32)
+    radius = np.asarray(radius, dtype=np.float32).reshape(-1, 1, 1)
+    verts = (centers[:, None, :] + templateVerts * radius).reshape(-1, 3)
+    offsets = np.arange(len(centers), dtype=np.uint32)[:, None, None] * np.uint32(len(templateVerts))
+    faces = (templateFaces + offsets).reshape(-1, 3)
+    return verts, faces
+
+
+def cylinderBatch(starts, ends, radius, segments):
+    """
+    Merge one open cylinder of `radius` per segment `starts[k]` to `ends[k]` into a single
+    vertex and face buffer. Return (vertices, faces, normals).
+    """
+    starts = np.asarray(starts, dtype=np.float32)
+    ends = np.asarray(ends, dtype=np.float32)
+    axis = ends - starts
+    length = np.linalg.norm(axis, axis=1)
+    length[length == 0] = 1
+    axis /= length[:, None]
+    # orthonormal basis (u, v) around each axis, helper vector must not be parallel to it
+    helper = np.zeros_like(axis)
+    parallel = np.abs(axis[:, 0]) > 0.9
+    helper[~parallel, 0] = 1
+    helper[parallel, 1] = 1
+    u = np.cross(axis, helper)
+    u /= np.linalg.norm(u, axis=1)[:, None]
+    v = np.cross(axis, u)
+    angles = np.arange(segments) * 2 * np.pi / segments
+    ring = (np.cos(angles)[None, :, None] * u[:, None, :] + np.sin(angles)[None, :, None] * v[:, None, :]).astype(np.float32)
+    verts = np.concatenate([starts[:, None, :] + ring * np.float32(radius),
+                            ends[:, None, :] + ring * np.float32(radius)], axis=1).reshape(-1, 3)
+    normals = np.concatenate([ring, ring], axis=1).reshape(-1, 3)
+    # two triangles per side quad, bottom ring is 0..segments-1 and top ring follows it
+    k = np.arange(segments, dtype=np.uint32)
+    k1 = (k + 1) % segments
+    template = np.vstack([np.column_stack([k, k1, k1 + segments]),
+                          np.column_stack([k, k1 + segments, k + segments])])
+    offsets = np.arange(len(starts), dtype=np.uint32)[:, None, None] * np.uint32(2 * segments)
+    faces = (template + offsets).reshape(-1, 3)
+    return verts, faces, normals
+
+
+def autoSubdivisions(nAtoms, budget=TRIANGLE_BUDGET):
+    """
+    Return the highest sphere subdivision keeping `nAtoms` spheres under `budget` triangles
+    """
+    subdivisions = MAX_SUBDIVISIONS
+    # an icosphere has 20 * 4^(subdivisions - 1) triangles
+    while subdivisions > MIN_SUBDIVISIONS and nAtoms * 20 * 4 ** (subdivisions - 1) > budget:
+        subdivisions -= 1
+    return subdivisions
+
+
+class MeshPart():
+    """
+    Triangle mesh with a single material, exported as one object. Instanced parts hold a
+    single template mesh copied at every row of `instances`. Parts with `transforms` are
+    exported once and shown at each transform (assembly copies).
+    """
+    def __init__(self, name, material, color, positions, indices, normals=None, instances=None, transforms=None):
+        self.name = name
+        self.material = material # material name, shared by parts with the same one
+        self.color = color # RGBA
+        self.positions = positions # (V, 3) float32
+        self.indices = indices # (F, 3) uint32
+        self.normals = normals # (V, 3) float32 or None
+        self.instances = instances # (N, 4) float32 translation and scale of each copy, or None
+        self.transforms = transforms # (K, 4, 4) placements of the whole part, or None
+
+
+def sphereInstances(name, material, color, centers, radius, subdivisions):
+    """
+    Instanced `MeshPart` of spheres: the unit sphere template placed at `centers` and scaled
+    by `radius` (scalar or one per sphere)
+    """
+    verts, faces = icoSphere(subdivisions)
+    instances = np.empty((len(centers), 4), dtype=np.float32)
+    instances[:, :3] = centers
+    instances[:, 3] = radius
+    # unit sphere normals are its vertices
+    return MeshPart(name, material, color, verts, faces, verts, instances)
+
+
+def buildAtomParts(table, properties, subdivisions, normals=True, radiusScale=1.0, instanced=False):
+    """
+    Return one `MeshPart` per element in `table` with a sphere for each of its atoms,
+    `properties` are the element properties read by `BlenderPDBInit`. Sphere radius is the
+    element radius times `radiusScale`. `instanced` parts share one sphere template.
+    """
+    parts = []
+    for code, element in enumerate(table.element.categories):
+        coords = table.coords[table.element.codes == code]
+        if not len(coords):
+            continue
+        info = properties[element]
+        if instanced:
+            parts.append(sphereInstances(f"Element_{element}", element, info["Color"], coords,
+                                         info["RadiusUsed"] * radiusScale, subdivisions))
+            continue
+        verts, faces = sphereBatch(coords, info["RadiusUsed"] * radiusScale, subdivisions)
+        # sphere normals are the unit template vertices
+        partNormals = np.tile(icoSphere(subdivisions)[0], (len(coords), 1)) if normals else None
+        parts.append(MeshPart(f"Element_{element}", element, info["Color"], verts, faces, partNormals))
+    return parts
+
+
+def buildBondParts(table, bonds, properties, subdivisions, normals=True):
+    """
+    Return one `MeshPart` per element with the halves of `bonds` starting at its atoms, so
+    each bond gets the colors of both atoms
+    """
+    if not len(bonds):
+        return []
+    i, j = np.asarray(bonds).T
+    middle = (table.coords[i] + table.coords[j]) / 2
+    starts = np.concatenate([table.coords[i], table.coords[j]])
+    codes = np.concatenate([table.element.codes[i], table.element.codes[j]])
+    middle = np.concatenate([middle, middle])
+    segments = 4 + 2 * subdivisions # cylinder sides grow with sphere level of detail
+    parts = []
+    for code, element in enumerate(table.element.categories):
+        half = codes == code
+        if not half.any():
+            continue
+        verts, faces, partNormals = cylinderBatch(starts[half], middle[half], BOND_RADIUS, segments)
+        parts.append(MeshPart(f"Bonds_{element}", element, properties[element]["Color"], verts, faces,
+                              partNormals if normals else None))
+    return parts
+
+
+def buildBallAndStickParts(table, bonds, properties, subdivisions, normals=True, instanced=False):
+    """
+    Return mesh parts of a ball-and-stick model: smaller atom spheres joined by cylinders
+    """
+    return (buildAtomParts(table, properties, subdivisions, normals, radiusScale=BALL_SCALE, instanced=instanced)
+            + buildBondParts(table, bonds, properties, subdivisions, normals))
+
+
+def vertexNormals(positions, indices):
+    """
+    Smooth normals of an arbitrary mesh, average of the normals of faces around each vertex
+    """
+    tri = positions[indices]
+    faceNormals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    normals = np.empty(positions.shape, dtype=np.float32)
+    for axis in range(3):
+        weights = np.repeat(faceNormals[:, axis], 3)
+        normals[:, axis] = np.bincount(indices.ravel(), weights, minlength=len(positions))
+    length = np.linalg.norm(normals, axis=1)
+    length[length == 0] = 1
+    return normals / length[:, None]
@@ -0,0 +1,139 @@
+import os
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+
+from .ModelCache import prepareModel, modelParams
+from .BlenderSession import BLENDER_PATHS
+from .Workers import initWorker
+
+
+def jobModel():
+    """
+    `ConversionJob` model, looked up on use since pool processes import this module before
+    setting django up
+    """
+    return apps.get_model("pdbvis", "ConversionJob")
+
+
+def jobKey(modelID, format="fbx", lod=None, mode="spheres"):
+    """
+    Key identifying the conversion of `modelID` with given parameters
+    """
+    return f"{modelID}:{format}:{lod or 'auto'}:{mode}"
+
+
+def submitJob(modelID, format="fbx", lod=None, mode="spheres"):
+    """
+    Queue a conversion, if the same one is already queued or running return that job instead.
+    Return (job, created).
+    """
+    ConversionJob = jobModel()
+    key = jobKey(modelID, format, lod, mode)
+    for _ in range(2):
+        job = ConversionJob.objects.filter(key=key, status__in=ConversionJob.IN_FLIGHT).first()
+        if job:
+            return job, False
+        try:
+            with transaction.atomic():
+                return ConversionJob.objects.create(key=key, modelID=modelID, format=format, lod=lod, mode=mode), True
+        except IntegrityError:
+            # other request queued it in the meantime
+            continue
+    raise RuntimeError(f"Job {key} couldn't be queued")
+
+
+def claimJob():
+    """
+    Mark oldest queued job as running and return it, `None` if queue is empty
+    """
+    ConversionJob = jobModel()
+    for jobID in ConversionJob.objects.filter(status=ConversionJob.QUEUED).order_by("created").values_list("id", flat=True)[:10]:
+        # conditional update, only one worker can claim each job
+        if ConversionJob.objects.filter(id=jobID, status=ConversionJob.QUEUED).update(status=ConversionJob.RUNNING):
+            return ConversionJob.objects.get(id=jobID)
+    return None
+
+
+def runJob(jobID):
+    """
+    Download and convert the model of job `jobID`, store the result in the job status
+    """
+    ConversionJob = jobModel()
+    job = ConversionJob.objects.get(id=jobID)
+    try:
+        if prepareModel(job.modelID, modelParams(job.format, job.lod, job.mode)) is None:
+            job.status = ConversionJob.FAILED
+            job.error = f"Molecule with ID {job.modelID} not found."
+        else:
+            job.status = ConversionJob.DONE
+    except Exception:
+        job.status = ConversionJob.FAILED
+        job.error = traceback.format_exc()
+    job.save()
+    return job.status
+
+
+class JobWorker():
+    """
+    Run queued conversions in a pool of processes
+    """
+    def __init__(self, processes=None, pollInterval=1.0):
+        self.processes = processes or os.cpu_count() or 1
+        self.pollInterval = pollInterval # seconds between queue checks when idle
+        self.running = {} # future: job ID
+
+
+    def requeueStale(self):
+        """
+        Put back in the queue jobs left running by a stopped worker
+        """
+        ConversionJob = jobModel()
+        return ConversionJob.objects.filter(status=ConversionJob.RUNNING).update(status=ConversionJob.QUEUED)
+
+
+    def run(self, once=False):
+        """
+        Claim and run jobs until interrupted, with `once` stop when the queue is empty
+        """
+        while not self.runPool(once):
+            pass # pool broke (a conversion process died), start a new one
+
+
+    def runPool(self, once=False):
+        """
+        Run jobs in a new process pool, return `False` if the pool broke
+        """
+        ConversionJob = jobModel()
+        # spawned processes start clean, blender state or DB connections aren't inherited
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                 initializer=initWorker, initargs=(BLENDER_PATHS,)) as pool:
+            while True:
+                claimed = False
+                while len(self.running) < self.processes:
+                    job = claimJob()
+                    if not job:
+                        break
+                    claimed = True
+                    self.running[pool.submit(runJob, job.id)] = job.id
+                broken = False
+                for future in [f for f in self.running if f.done()]:
+                    jobID = self.running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        ConversionJob.objects.filter(id=jobID, status=ConversionJob.RUNNING).update(
+                            status=ConversionJob.FAILED, error=f"Conversion process failed: {e!r}")
+                        broken |= isinstance(e, BrokenProcessPool)
+                if broken:
+                    return False
+                if once and not claimed and not self.running:
+                    return True
+                if not claimed:
+                    time.sleep(self.pollInterval)
@@ -0,0 +1,137 @@
+import os
+import pickle
+import hashlib
+from types import MappingProxyType
+from functools import lru_cache
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "Atom_info.dat")
+CACHE_VERSION = 1 # increase when the parsed structure changes
+# Properties of each element as written in the dat file, in order
+FIELDS = ["Number", "Name", "Short name", "Color", "Diffuse intensity", "Specular intensity",
+          "Specular hard", "Traceable", "Shadow receive", "Shadow cast", "Radius used",
+          "Radius covalent", "Radius atomic", "Charge state", "Radius ionic"]
+STRINGS = ["Name", "Short name"]
+INTEGERS = ["Number", "Charge state"]
+
+
+class ElementTable():
+    """
+    Immutable element properties. `atoms` maps each symbol (e.g. 'Na') to a read-only
+    dictionary of properties, numpy arrays indexed by atomic number hold the properties
+    used to build geometry.
+    """
+    def __init__(self, elements):
+        self.atoms = MappingProxyType({symbol: MappingProxyType(info) for symbol, info in elements.items()})
+        self.numbers = MappingProxyType({symbol: info["Number"] for symbol, info in elements.items()})
+        size = max(self.numbers.values(), default=0) + 1
+        self.radiusUsed = self.byNumber("RadiusUsed", size)
+        self.radiusCovalent = self.byNumber("RadiusCovalent", size)
+        self.colors = np.zeros((size, 4), dtype=np.float32)
+        for info in elements.values():
+            self.colors[info["Number"]] = info["Color"]
+        self.colors.flags.writeable = False
+
+
+    def byNumber(self, key, size):
+        """
+        Read-only array with property `key` at the atomic number of each element, NaN if missing
+        """
+        values = np.full(size, np.nan, dtype=np.float32)
+        for info in self.atoms.values():
+            if info[key] is not None:
+                values[info["Number"]] = info[key]
+        values.flags.writeable = False
+        return values
+
+
+    def __getitem__(self, symbol):
+        return self.atoms[symbol]
+
+
+    def __contains__(self, symbol):
+        return symbol in self.atoms
+
+
+def parseElements(text):
+    """
+    Parse dat file contents into a dictionary of properties per element symbol
+    """
+    toCamelCase = lambda name: "".join(word.capitalize() for word in name.split(" "))
+    elements = {}
+    for block in text.split("Atom\n"):
+        values = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition(":")
+            key = key.strip()
+            # only the first charge state (and its ionic radius) is kept
+            if sep and key in FIELDS and key not in values:
+                values[key] = value.strip()
+        if "Short name" not in values:
+            continue
+        info = {}
+        for field in FIELDS:
+            value = values.get(field)
+            if field in STRINGS:
+                info[toCamelCase(field)] = value
+            elif field == "Color":
+                info["Color"] = tuple(toNumeric(v) for v in value.split(","))
+            else:
+                value = toNumeric(value)
+                info[toCamelCase(field)] = int(value) if field in INTEGERS and value is not None else value
+        # ionic radius only makes sense with its charge state
+        if info["ChargeState"] is None or info["RadiusIonic"] is None:
+            info["ChargeState"] = info["RadiusIonic"] = None
+        elements[info.pop("ShortName")] = info
+    return elements
+
+
+def toNumeric(value):
+    """
+    Convert string into float value if possible, otherwise return None
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def cachePath(path):
+    return os.path.join(os.path.dirname(path), "__pycache__", os.path.basename(path) + ".pickle")
+
+
+@lru_cache(maxsize=8)
+def loadCached(path, mtime, size):
+    """
+    Load table of dat file `path`, memoized per file version (modification time and size).
+    Parsed elements are pickled next to it and reused while the dat file hash matches.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    pickled = cachePath(path)
+    try:
+        with open(pickled, "rb") as f:
+            version, cachedDigest, elements = pickle.load(f)
+        if version == CACHE_VERSION and cachedDigest == digest:
+            return ElementTable(elements)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    elements = parseElements(data.decode("utf-8"))
+    try:
+        os.makedirs(os.path.dirname(pickled), exist_ok=True)
+        tmp = f"{pickled}.{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump((CACHE_VERSION, digest, elements), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, pickled)
+    except OSError:
+        pass # read-only install, parse again next time
+    return ElementTable(elements)
+
+
+def loadElementTable(path=DEFAULT_PATH):
+    """
+    Return the process wide `ElementTable` for dat file `path`, reloaded if the file changes
+    """
+    stat = os.stat(path)
+    return loadCached(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
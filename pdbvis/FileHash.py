@@ -0,0 +1,29 @@
+import os
+import hashlib
+from functools import lru_cache
+
+
+def fileHash(path, blockSize=1 << 20):
+    """
+    Return (sha256 hex digest, size) of file at `path`
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+@lru_cache(maxsize=1024)
+def versionHash(path, mtime, size):
+    return fileHash(path)[0]
+
+
+def currentHash(path):
+    """
+    Content hash of file `path`, memoized per file version (modification time and size)
+    """
+    stat = os.stat(path)
+    return versionHash(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
@@ -1,14 +1,143 @@
 import requests
 import os
+import time
+import asyncio
+import tempfile
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def downloadModelFromDB(ID, outPath, baseURL='https://files.rcsb.org/download/'):
-    #print('Requesting {my_id} file. Please wait.\n'.format(my_id=ID))
-    reqURL = os.path.join(baseURL, ID.lower() + '.pdb')
-    response = requests.get(reqURL)
-    if not response.ok:
-        #print('ID {my_id} file not founded. Try with other ID.\n'.format(my_id=ID))
-        return False
-    #print('ID:{my_id} file was downloaded. Writing file.\n'.format(my_id=ID))
-    with open(os.path.join(outPath, ID + ".pdb"), "w+") as f:
-        f.write(response.text)
-    return True
+RCSB_URL = 'https://files.rcsb.org/download/'
+BCIF_URL = 'https://models.rcsb.org/'
+# Downloadable structure formats and their file extension
+EXTENSIONS = {"pdb": ".pdb", "cif": ".cif", "bcif": ".bcif"}
+DEFAULT_FORMATS = ("pdb", "cif") # large entries have no PDB file, only mmCIF
+
+
+class DownloadError(Exception):
+    """
+    Model couldn't be downloaded, the database didn't answer or kept failing after the retries
+    """
+    pass
+
+
+class PDBDownloader():
+    """
+    Download PDB files reusing pooled keep-alive connections. Files are streamed into a
+    `.part` file of each download, resumed with a range request after a dropped connection,
+    and renamed once complete. PDB and mmCIF files come from `baseURL`, BinaryCIF from `bcifURL`.
+    """
+    def __init__(self, baseURL=RCSB_URL, timeout=(5, 60), retries=3, backoff=0.5, poolSize=16, chunkSize=1 << 16,
+                 bcifURL=BCIF_URL):
+        self.baseURL = baseURL
+        self.bcifURL = bcifURL
+        self.timeout = timeout # (connect, read) seconds
+        self.retries = retries
+        self.backoff = backoff # seconds, doubled on each retry
+        self.chunkSize = chunkSize
+        self.session = requests.Session()
+        # connection errors and server errors before the body is read are retried by urllib3
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET", "HEAD"]))
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+
+    def url(self, ID, format="pdb"):
+        base = self.bcifURL if format == "bcif" else self.baseURL
+        return f"{base.rstrip('/')}/{ID.lower()}{EXTENSIONS[format]}"
+
+
+    def download(self, ID, outPath, format="pdb"):
+        """
+        Download model `ID` as `format` into `outPath/ID.<format>`. Return `False` if it isn't
+        in the database (in that format), raise `DownloadError` if it couldn't be downloaded.
+        """
+        target = os.path.join(outPath, ID + EXTENSIONS[format])
+        # own partial file, concurrent downloads of the same model don't write into each other
+        fd, part = tempfile.mkstemp(dir=outPath, prefix=f".{ID}{EXTENSIONS[format]}.", suffix=".part")
+        os.close(fd)
+        try:
+            for attempt in range(self.retries + 1):
+                offset = os.path.getsize(part)
+                # resumed ranges are asked uncompressed so offsets match the bytes already written
+                headers = {"Range": f"bytes={offset}-", "Accept-Encoding": "identity"} if offset else {}
+                try:
+                    with self.session.get(self.url(ID, format), headers=headers, stream=True, timeout=self.timeout) as response:
+                        if response.status_code == 416 and offset:
+                            # nothing left to download
+                            break
+                        if not response.ok:
+                            return False
+                        with open(part, "ab" if response.status_code == 206 else "wb") as f:
+                            for chunk in response.iter_content(self.chunkSize):
+                                f.write(chunk)
+                    break
+                except requests.exceptions.RetryError as e:
+                    # server errors kept coming after the retries of urllib3
+                    raise DownloadError(f"{ID}{EXTENSIONS[format]}: {e}") from e
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    if attempt == self.retries:
+                        raise DownloadError(f"{ID}{EXTENSIONS[format]}: {e}") from e
+                    time.sleep(self.backoff * 2 ** attempt)
+            os.replace(part, target)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+        return True
+
+
+    def fetch(self, ID, outPath, formats=DEFAULT_FORMATS):
+        """
+        Download model `ID` in the first of `formats` the database has it. Return that format
+        or `None` if the model isn't available in any of them.
+        """
+        for format in formats:
+            if self.download(ID, outPath, format):
+                return format
+        return None
+
+
+    async def prefetch(self, IDs, outPath, concurrency=8, formats=DEFAULT_FORMATS):
+        """
+        Download models in `IDs` which aren't in `outPath` yet, at most `concurrency` at once.
+        Return dictionary with the result of each ID: the format downloaded (or already there),
+        `None` (not found) or the error.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def fetch(ID):
+            async with semaphore:
+                for format in formats:
+                    if os.path.exists(os.path.join(outPath, ID + EXTENSIONS[format])):
+                        return ID, format
+                try:
+                    return ID, await loop.run_in_executor(None, self.fetch, ID, outPath, formats)
+                except Exception as e:
+                    return ID, e
+
+        return dict(await asyncio.gather(*(fetch(ID) for ID in IDs)))
+
+
+@lru_cache(maxsize=None)
+def getDownloader(baseURL=RCSB_URL, bcifURL=BCIF_URL):
+    """
+    Shared downloader for `baseURL`, so connections are reused between calls
+    """
+    return PDBDownloader(baseURL, bcifURL=bcifURL)
+
+
+def downloadModelFromDB(ID, outPath, baseURL=RCSB_URL, formats=DEFAULT_FORMATS, bcifURL=BCIF_URL):
+    """
+    Download model `ID` in the first available of `formats`, return its format or `None`
+    """
+    return getDownloader(baseURL, bcifURL).fetch(ID, outPath, formats)
+
+
+def prefetchModels(IDs, outPath, concurrency=8, baseURL=RCSB_URL, formats=DEFAULT_FORMATS, bcifURL=BCIF_URL):
+    """
+    Download several models concurrently, see `PDBDownloader.prefetch`
+    """
+    return asyncio.run(getDownloader(baseURL, bcifURL).prefetch(IDs, outPath, concurrency, formats))
@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+# Stages of the download → parse → build → export pipeline, in order. Precompressed variants
+# of cached models are written (`compress`) and responses sent (`send`, see `timedChunks`)
+# after the view returns, they're only in the process metrics, not in `Server-Timing`.
+STAGES = ("download", "parse", "bonds", "elements", "mesh", "export", "compress", "send")
+# upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class StageMetrics():
+    """
+    Totals of a stage over the process lifetime
+    """
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS) # cumulative, as Prometheus histograms
+        self.atoms = 0
+        self.bytes = 0
+        self.triangles = 0
+
+
+class Metrics():
+    """
+    Process wide stage timings and request counts, shared by every thread
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {name: StageMetrics() for name in STAGES}
+        self.requests = {} # (view, status): count
+        self.peakMemory = 0 # bytes, highest peak seen at the end of a stage
+
+
+    def record(self, name, seconds, details, failed=False):
+        """
+        Add a run of stage `name` that took `seconds`, counts (atoms, bytes, triangles) are
+        taken from `details`
+        """
+        with self.lock:
+            stage = self.stages.setdefault(name, StageMetrics())
+            stage.count += 1
+            stage.errors += failed
+            stage.seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stage.buckets[i] += 1
+            stage.atoms += details.get("atoms", 0)
+            stage.bytes += details.get("bytes", 0)
+            stage.triangles += details.get("triangles", 0)
+            self.peakMemory = max(self.peakMemory, details.get("peakMemory", 0))
+
+
+    def countRequest(self, view, status):
+        with self.lock:
+            self.requests[view, status] = self.requests.get((view, status), 0) + 1
+
+
+    def prometheus(self):
+        """
+        Return metrics in Prometheus text exposition format
+        """
+        lines = []
+        def family(name, kind, help):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            # pipeline order, then stages added by name
+            order = lambda item: (STAGES.index(item[0]), "") if item[0] in STAGES else (len(STAGES), item[0])
+            stages = sorted(self.stages.items(), key=order)
+            family("pdbvis_stage_seconds", "histogram", "Duration of pipeline stages.")
+            for name, stage in stages:
+                for bound, count in zip(BUCKETS, stage.buckets):
+                    lines.append(f'pdbvis_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'pdbvis_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage.count}')
+                lines.append(f'pdbvis_stage_seconds_sum{{stage="{name}"}} {stage.seconds:.6f}')
+                lines.append(f'pdbvis_stage_seconds_count{{stage="{name}"}} {stage.count}')
+            for metric, attribute, help in (("pdbvis_stage_errors_total", "errors", "Pipeline stages that raised."),
+                                            ("pdbvis_stage_atoms_total", "atoms", "Atoms handled by pipeline stages."),
+                                            ("pdbvis_stage_bytes_total", "bytes", "Bytes read or written by pipeline stages."),
+                                            ("pdbvis_stage_triangles_total", "triangles", "Triangles built by pipeline stages.")):
+                family(metric, "counter", help)
+                for name, stage in stages:
+                    lines.append(f'{metric}{{stage="{name}"}} {getattr(stage, attribute)}')
+            family("pdbvis_requests_total", "counter", "Requests handled by view and status code.")
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'pdbvis_requests_total{{view="{view}",status="{status}"}} {count}')
+            family("pdbvis_peak_memory_bytes", "gauge", "Peak resident memory of the process.")
+            lines.append(f"pdbvis_peak_memory_bytes {max(self.peakMemory, peakMemory())}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Trace():
+    """
+    Stages timed while handling one request, in the order they ran
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = [] # (name, seconds, details)
+
+
+    def add(self, name, seconds, details):
+        self.stages.append((name, seconds, details))
+
+
+    def serverTiming(self):
+        """
+        Return value of the `Server-Timing` header: every stage and the total so far in ms
+        """
+        entries = []
+        for name, seconds, details in self.stages:
+            description = ", ".join(f"{details[key]} {key}" for key in ("atoms", "triangles", "bytes") if details.get(key))
+            entries.append(f'{name};dur={seconds * 1000:.1f}' + (f';desc="{description}"' if description else ""))
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# trace of the request being handled, stages outside a request only go to `METRICS`
+currentTrace = contextvars.ContextVar("pdbvisTrace", default=None)
+
+
+@contextmanager
+def traced():
+    """
+    Collect stages run inside the block into a new `Trace`
+    """
+    trace = Trace()
+    token = currentTrace.set(trace)
+    try:
+        yield trace
+    finally:
+        currentTrace.reset(token)
+
+
+def peakMemory():
+    """
+    Peak resident memory of the process in bytes, 0 where it can't be read
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # bytes on macOS, kB elsewhere
+
+
+def residentMemory():
+    """
+    Current resident memory of the process in bytes, read from /proc on Linux, the peak
+    elsewhere
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peakMemory()
+
+
+@contextmanager
+def stage(name, **details):
+    """
+    Time the block as pipeline stage `name`. Yield a dictionary where the block sets its
+    counts (`atoms`, `bytes`, `triangles`) once known. When `tracemalloc` is tracing, the
+    Python memory peak of the stage is recorded too.
+    """
+    if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    failed = True
+    start = time.perf_counter()
+    try:
+        yield details
+        failed = False
+    finally:
+        seconds = time.perf_counter() - start
+        details["peakMemory"] = peakMemory()
+        if tracemalloc.is_tracing():
+            details["tracedPeak"] = tracemalloc.get_traced_memory()[1]
+        METRICS.record(name, seconds, details, failed)
+        trace = currentTrace.get()
+        if trace is not None:
+            trace.add(name, seconds, details)
+
+
+def timedChunks(chunks, name="send"):
+    """
+    Yield the response body `chunks` timing them as stage `name` while the server sends them,
+    which happens once the view has returned. The stage fails if the client goes away.
+    """
+    with stage(name) as info:
+        info["bytes"] = 0
+        for chunk in chunks:
+            info["bytes"] += len(chunk)
+            yield chunk
+
+
+# profiler of the request being handled, see `profiled`
+currentProfile = contextvars.ContextVar("pdbvisProfile", default=None)
+
+
+@contextmanager
+def profiled(path=None, here=True):
+    """
+    Run the block under cProfile and dump its stats into `path` (read them with `pstats`),
+    the block runs unprofiled when `path` is `None`. Calls wrapped by `profiledCall` in other
+    threads are profiled too, with `here` false only them (async views, their event loop
+    thread runs other requests).
+    """
+    if path is None:
+        yield None
+        return
+    profile = cProfile.Profile()
+    token = currentProfile.set(profile)
+    if here:
+        profile.enable()
+    try:
+        yield profile
+    finally:
+        if here:
+            profile.disable()
+        currentProfile.reset(token)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile.dump_stats(path)
+
+
+def profiledCall(func):
+    """
+    Wrap `func` to run under the profiler of the current request (see `profiled`) in the
+    thread calling it, for work async views send to `sync_to_async` threads
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = currentProfile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
@@ -0,0 +1,407 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import fcntl # not available on Windows
+except ImportError:
+    fcntl = None
+
+from .ReadPDB import PDBConverter
+from .WriteGLB import GLBConverter
+from .Tiles import TileConverter
+from .GetPDB import EXTENSIONS, downloadModelFromDB
+from .ElementTable import DEFAULT_PATH as DEFAULT_ELEMENTS_PATH
+from .Metrics import stage
+from .Selection import Selection
+from .Streaming import VARIANT_EXTENSIONS, variantPath, writeVariants
+from .FileHash import fileHash, currentHash
+
+# Output formats and the converter creating them, GLB files are written without blender
+CONVERTERS = {"fbx": PDBConverter, "glb": GLBConverter}
+TILE_MANIFEST = "tiles" # format of tile manifests, cached as the models they list
+BUILDERS = {**CONVERTERS, TILE_MANIFEST: TileConverter}
+FILE_EXTENSIONS = {TILE_MANIFEST: "json"} # cached files not named by their format
+
+
+class ModelCache():
+    """
+    Converted models stored by content hash under `root`, indexed in a SQLite database by
+    model ID and conversion parameters. Least recently used models are removed once the
+    cache grows over `maxBytes`. Downloaded structure files (PDB, mmCIF or BinaryCIF) are
+    kept in `root/pdb`. With `precompress`, gzip and brotli variants of every model are
+    written next to it after the request building it (see `addVariants`) and count in its
+    size. Every entry keeps the build manifest of its model (see `buildManifest`) to tell
+    when it's stale.
+    """
+    def __init__(self, root=None, maxBytes=None, precompress=None):
+        self.root = str(root or settings.PDBVIS_CACHE_ROOT)
+        self.maxBytes = maxBytes if maxBytes is not None else settings.PDBVIS_CACHE_MAX_BYTES
+        self.precompress = precompress if precompress is not None else settings.PDBVIS_PRECOMPRESS
+        for folder in ("pdb", "artifacts", "tmp", "locks"):
+            os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        with self.connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY, modelID TEXT, params TEXT, contentHash TEXT,
+                extension TEXT, size INTEGER, created REAL, lastAccess REAL, manifest TEXT)""")
+            if "manifest" not in [column[1] for column in db.execute("PRAGMA table_info(artifacts)")]:
+                # index created before manifests, its models are stale
+                db.execute("ALTER TABLE artifacts ADD COLUMN manifest TEXT")
+            db.execute("CREATE INDEX IF NOT EXISTS artifactsAccess ON artifacts (lastAccess)")
+            db.execute("CREATE INDEX IF NOT EXISTS artifactsContent ON artifacts (contentHash)")
+
+
+    @contextmanager
+    def connect(self):
+        """
+        Open index database, changes are committed when leaving the block
+        """
+        db = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+    @staticmethod
+    def key(modelID, params):
+        """
+        Index key of `modelID` converted with `params`
+        """
+        return hashlib.sha256(json.dumps({"modelID": modelID, **params}, sort_keys=True).encode()).hexdigest()
+
+
+    def sourcePath(self, modelID, format=None):
+        """
+        Path of the structure file of `modelID` in `format`. Without format return the
+        downloaded file in any format or `None` if there's none.
+        """
+        if format:
+            return os.path.join(self.root, "pdb", modelID + EXTENSIONS[format])
+        for format in EXTENSIONS:
+            path = self.sourcePath(modelID, format)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+    def artifactPath(self, contentHash, extension):
+        return os.path.join(self.root, "artifacts", contentHash[:2], f"{contentHash}.{extension}")
+
+
+    def variants(self, path):
+        """
+        Precompressed variants of cached file `path` by encoding
+        """
+        variants = {encoding: variantPath(path, encoding) for encoding in VARIANT_EXTENSIONS}
+        return {encoding: variant for encoding, variant in variants.items() if os.path.exists(variant)}
+
+
+    @contextmanager
+    def building(self, modelID, params):
+        """
+        Hold the build lock of `modelID` converted with `params` during the block, other
+        threads and processes using this cache wait for it. Lock files are left in place,
+        removing one while another process waits on it would let a second build start.
+        """
+        key = self.key(modelID, params)
+        if fcntl is None:
+            with processLock(key):
+                yield
+            return
+        with open(os.path.join(self.root, "locks", f"{key}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX) # released when the file is closed, or the process dies
+            yield
+
+
+    def get(self, modelID, params, manifest=None):
+        """
+        Return path of `modelID` converted with `params` or `None` if it isn't cached. With a
+        `manifest`, models built with a different one are stale and give `None` too.
+        """
+        key = self.key(modelID, params)
+        with self.connect() as db:
+            row = db.execute("SELECT contentHash, extension, manifest FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            if manifest is not None and row[2] != json.dumps(manifest, sort_keys=True):
+                return None # kept until the rebuilt model replaces it
+            path = self.artifactPath(*row[:2])
+            if not os.path.exists(path):
+                # file removed by hand, forget it
+                db.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE artifacts SET lastAccess = ? WHERE key = ?", (time.time(), key))
+        return path
+
+
+    def put(self, modelID, params, build, extension, manifest=None):
+        """
+        Call `build(path)` to write the model into a temporary file, then move it into the
+        cache. The file is renamed once complete so it's never served half written. A model
+        already cached with `params` (a stale one) is replaced.
+        """
+        key = self.key(modelID, params)
+        fd, tmp = tempfile.mkstemp(prefix="build_", suffix=f".{extension}", dir=os.path.join(self.root, "tmp"))
+        os.close(fd)
+        try:
+            build(tmp)
+            contentHash, size = fileHash(tmp)
+            path = self.artifactPath(contentHash, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        now = time.time()
+        with self.connect() as db:
+            previous = db.execute("SELECT contentHash, extension FROM artifacts WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, modelID, json.dumps(params, sort_keys=True), contentHash, extension, size, now, now,
+                        json.dumps(manifest, sort_keys=True) if manifest is not None else None))
+            if previous:
+                self.removeUnused(db, *previous)
+        self.evict(keep=key)
+        if self.precompress:
+            # slow at the high levels used, the model is sent compressed on the fly meanwhile
+            compressionPool().submit(self.addVariants, key, path, contentHash)
+        return path
+
+
+    def addVariants(self, key, path, contentHash):
+        """
+        Write the precompressed variants of cached model `path` (content `contentHash` of
+        entry `key`) and count them in the entry size
+        """
+        try:
+            with stage("compress") as info:
+                info["bytes"] = sum(os.path.getsize(variant) for variant in writeVariants(path).values())
+        except OSError:
+            return # model removed meanwhile
+        with self.connect() as db:
+            db.execute("UPDATE artifacts SET size = size + ? WHERE key = ? AND contentHash = ?",
+                       (info["bytes"], key, contentHash))
+        if not os.path.exists(path):
+            # removed while they were written, nothing would remove them
+            for encoding in VARIANT_EXTENSIONS:
+                try:
+                    os.remove(variantPath(path, encoding))
+                except FileNotFoundError:
+                    pass
+            return
+        self.evict(keep=key)
+
+
+    def size(self):
+        """
+        Bytes used by cached models, files shared by several entries count once
+        """
+        with self.connect() as db:
+            return db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT contentHash, size FROM artifacts)").fetchone()[0]
+
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used models until cache size is under budget, return removed keys
+        """
+        removed = []
+        total = self.size()
+        if total <= self.maxBytes:
+            return removed
+        with self.connect() as db:
+            rows = db.execute("SELECT key, contentHash, extension, size FROM artifacts WHERE key != ? ORDER BY lastAccess",
+                              (keep or "",)).fetchall()
+            for key, contentHash, extension, size in rows:
+                if total <= self.maxBytes:
+                    break
+                db.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                removed.append(key)
+                if self.removeUnused(db, contentHash, extension):
+                    total -= size
+        return removed
+
+
+    def removeUnused(self, db, contentHash, extension):
+        """
+        Remove model file `contentHash` and its variants unless another entry uses it (other
+        parameters can give the same output). Return if it was removed.
+        """
+        if db.execute("SELECT 1 FROM artifacts WHERE contentHash = ?", (contentHash,)).fetchone():
+            return False
+        path = self.artifactPath(contentHash, extension)
+        for file in [path] + [variantPath(path, encoding) for encoding in VARIANT_EXTENSIONS]:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+        return True
+
+
+    def stale(self):
+        """
+        Return (modelID, params) of cached models whose build manifest doesn't match their
+        structure file, element table and converter any more. Models without structure file
+        can't be checked and are left out.
+        """
+        with self.connect() as db:
+            rows = db.execute("SELECT modelID, params, manifest FROM artifacts ORDER BY modelID").fetchall()
+        result = []
+        for modelID, params, manifest in rows:
+            params = json.loads(params)
+            source = self.sourcePath(modelID)
+            if source and manifest != json.dumps(buildManifest(source, params), sort_keys=True):
+                result.append((modelID, params))
+        return result
+
+
+def buildManifest(source, params):
+    """
+    Everything a model converted from structure file `source` with `params` depends on:
+    hashes of the source and of the element table, converter version and options. A cached
+    model with another manifest is stale.
+    """
+    converter = BUILDERS[params["format"]]
+    return {"input": currentHash(source), "elements": currentHash(DEFAULT_ELEMENTS_PATH),
+            "converter": f"{converter.__name__} {converter.VERSION}", "options": params}
+
+
+@lru_cache(maxsize=None)
+def processLock(key):
+    """
+    Build lock of cache entry `key` where files can't be locked, shared by the threads of
+    this process only
+    """
+    return threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def compressionPool():
+    """
+    Process wide thread writing precompressed variants, one at a time so they don't compete
+    with conversions for the cores
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdbvis-compress")
+
+
+@lru_cache(maxsize=None)
+def defaultCache():
+    """
+    Process wide cache configured in settings
+    """
+    return ModelCache()
+
+
+def modelFileName(modelID, lod=None, mode="spheres", selection=None, assembly=None):
+    """
+    Return file name (without extension) of the model converted with `lod` subdivisions,
+    automatic level of detail and default mode keep the plain model ID. Selections add a
+    short hash of their parameters.
+    """
+    name = modelID if mode == "spheres" else f"{modelID}_{mode}"
+    if assembly is not None:
+        name += f"_assembly{assembly}"
+    if selection is not None:
+        name += "_sel" + hashlib.sha256(json.dumps(selection.params(), sort_keys=True).encode()).hexdigest()[:8]
+    return name if lod is None else f"{name}_lod{lod}"
+
+
+def modelParams(format="fbx", lod=None, mode="spheres", quantized=False, selection=None, assembly=None):
+    """
+    Conversion parameters identifying a converted model in the cache. Options with their
+    default value are left out so models cached before they existed are still found.
+    """
+    params = {"format": format, "lod": lod}
+    if mode != "spheres":
+        params["mode"] = mode
+    if quantized:
+        params["quantized"] = True
+    if selection is not None:
+        params["selection"] = selection.params()
+    if assembly is not None:
+        params["assembly"] = assembly
+    return params
+
+
+def tileParams(lod=None, mode="spheres", split="octree", tileAtoms=None):
+    """
+    Parameters identifying the tile manifest of a model in the cache, tiles themselves are
+    cached as models of their atom selection
+    """
+    return {"format": TILE_MANIFEST, "lod": lod, "mode": mode, "split": split,
+            "tileAtoms": tileAtoms or settings.PDBVIS_TILE_ATOMS}
+
+
+def freshModel(modelID, params, cache=None):
+    """
+    Return path of `modelID` cached with `params` unless it's missing or stale
+    """
+    cache = cache or defaultCache()
+    source = cache.sourcePath(modelID)
+    # without structure file there's nothing to compare, it would be downloaded again
+    return cache.get(modelID, params, buildManifest(source, params) if source else None)
+
+
+def prepareModel(modelID, params, cache=None):
+    """
+    Download and convert model if it isn't cached yet or its cached conversion is stale.
+    Return path of the converted file or `None` if the model doesn't exist in RCSB database.
+    """
+    cache = cache or defaultCache()
+    path = freshModel(modelID, params, cache)
+    if path:
+        return path
+    with cache.building(modelID, params):
+        # concurrent requests for the same model wait for the first one and use its build
+        return freshModel(modelID, params, cache) or buildModel(modelID, params, cache)
+
+
+def downloadSource(modelID, cache):
+    """
+    Path of the structure file of `modelID`, downloaded from DB in the first format it's
+    distributed in if it isn't in `cache` yet. `None` if the model doesn't exist.
+    """
+    source = cache.sourcePath(modelID)
+    if source:
+        return source
+    # builds of the same model with other parameters download it once
+    with cache.building(modelID, {"source": True}):
+        source = cache.sourcePath(modelID)
+        if source:
+            return source
+        with stage("download") as info:
+            sourceFormat = downloadModelFromDB(modelID, os.path.join(cache.root, "pdb"), baseURL=settings.PDBVIS_RCSB_URL,
+                                               formats=settings.PDBVIS_SOURCE_FORMATS, bcifURL=settings.PDBVIS_BCIF_URL)
+            if sourceFormat:
+                info["bytes"] = os.path.getsize(cache.sourcePath(modelID, sourceFormat))
+        return cache.sourcePath(modelID, sourceFormat) if sourceFormat else None
+
+
+def buildModel(modelID, params, cache):
+    """
+    Download (if needed) and convert model into `cache`, see `prepareModel`
+    """
+    source = downloadSource(modelID, cache)
+    if not source:
+        return None
+    # convert from PDB, mmCIF or BinaryCIF into FBX, GLB or a tile manifest, quantization is a GLB only option
+    options = {"quantized": True} if params.get("quantized") else {}
+    if "selection" in params:
+        options["selection"] = Selection(**params["selection"])
+    for option in ("assembly", "split", "tileAtoms"):
+        if option in params:
+            options[option] = params[option]
+    build = lambda output: BUILDERS[params["format"]](input=source, output=output, subdivisions=params["lod"],
+                                                      mode=params.get("mode", "spheres"), **options)
+    return cache.put(modelID, params, build, FILE_EXTENSIONS.get(params["format"], params["format"]),
+                     buildManifest(source, params))
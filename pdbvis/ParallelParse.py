@@ -0,0 +1,116 @@
+import os
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+import numpy as np
+
+# imported by the pool processes, so it must not import blender (see `Workers`)
+from .AtomTable import ATOM_RECORDS, AtomTable, recordMatrix, parseCoords
+
+# smaller byte ranges are parsed in the calling process, starting the pool would cost more
+PARALLEL_MIN_BYTES = 32 << 20
+
+
+class ChunkError():
+    """
+    Records of the chunk `start`-`end` (bytes of the file) skipped because they couldn't be
+    parsed: `skipped` of them, the first one at byte `offset` with `text`. `line` is its line
+    number, counted only when the error is reported (see `ReadPDB.lineNumber`).
+    """
+    def __init__(self, start, end, skipped, offset, text):
+        self.start = start
+        self.end = end
+        self.skipped = skipped
+        self.offset = offset
+        self.text = text
+        self.line = None
+
+
+    def __str__(self):
+        where = f"line {self.line}" if self.line is not None else f"byte {self.offset}"
+        return (f"bytes {self.start}-{self.end}: {self.skipped} records without valid coordinates skipped, "
+                f"first at {where}: {self.text!r}")
+
+
+def parseChunk(chunk, records=ATOM_RECORDS, offset=0):
+    """
+    Parse the `records` lines of `chunk`, bytes of a PDB file at `offset`. Return (`AtomTable`,
+    `ChunkError` of the records skipped or `None`).
+    """
+    raw, starts = recordMatrix(chunk, records, withStarts=True)
+    coords, valid = parseCoords(raw)
+    table = AtomTable.fromRecords(raw, (coords, valid))
+    if valid.all():
+        return table, None
+    invalid = np.flatnonzero(~valid)
+    first = int(starts[invalid[0]])
+    lineEnd = chunk.find(b"\n", first)
+    text = bytes(chunk[first:lineEnd if lineEnd != -1 else len(chunk)]).decode("ascii", "replace").rstrip()
+    return table, ChunkError(offset, offset + len(chunk), len(invalid), offset + first, text)
+
+
+def splitRanges(path, start, end, size):
+    """
+    Split bytes `start`-`end` of file `path` into ranges of about `size` bytes ending at a line
+    boundary. Return (R, 2) start and end of each range.
+    """
+    ranges = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = min(end, len(mm))
+        while start < end:
+            stop = min(start + size, end)
+            if stop < end:
+                cut = mm.rfind(b"\n", start, stop)
+                # a line longer than the range, extend up to its end
+                stop = cut + 1 if cut != -1 else (mm.find(b"\n", stop, end) + 1 or end)
+            ranges.append((start, stop))
+            start = stop
+    return np.array(ranges, dtype=np.int64).reshape(-1, 2)
+
+
+def parseRange(path, start, end, records=ATOM_RECORDS):
+    """
+    Parse bytes `start`-`end` of file `path` in a pool process, reading them through a
+    memory map. Return (`AtomTable`, `ChunkError` or `None`).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        chunk = mm[start:end]
+    return parseChunk(chunk, records, int(start))
+
+
+@lru_cache(maxsize=None)
+def parsePool(processes):
+    """
+    Process wide pool of `processes` parsing byte ranges, started on first use
+    """
+    # spawned processes start clean, blender state isn't inherited
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context)
+
+
+def parseParallel(path, records=ATOM_RECORDS, start=0, end=None, processes=None, chunkSize=1 << 22, errors=None):
+    """
+    Parse atoms of plain (uncompressed) PDB file `path` between bytes `start` and `end`,
+    split into ranges of about `chunkSize` parsed by a pool of `processes`. Return the
+    `AtomTable` of every range in file order, so serial numbers and atom order are kept.
+    `ChunkError`s of the ranges are appended to `errors`.
+    """
+    end = os.path.getsize(path) if end is None else end
+    ranges = splitRanges(path, start, end, chunkSize)
+    pool = parsePool(processes or os.cpu_count())
+    try:
+        results = list(pool.map(parseRange, [path] * len(ranges), ranges[:, 0], ranges[:, 1], [records] * len(ranges)))
+    except BrokenProcessPool:
+        parsePool.cache_clear() # a process died, the next parse starts a new pool
+        raise
+    tables = []
+    for table, error in results:
+        if error is not None and errors is not None:
+            errors.append(error)
+        if len(table):
+            tables.append(table)
+    return tables
+
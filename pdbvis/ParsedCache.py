@@ -0,0 +1,167 @@
+import os
+import json
+import tempfile
+import numpy as np
+
+from .AtomTable import AtomTable, Categorical
+from .Assemblies import Assembly
+from .Parsers import PARSERS, structureFormat
+from .FileHash import currentHash
+
+SIDECAR_EXTENSION = ".parsed" # folder next to the structure file
+SIDECAR_VERSION = 2 # layout of the sidecar files, increase when it changes
+
+
+def parserVersion(source):
+    """
+    Parser of structure file `source` and its version, parsed atoms depend on them
+    """
+    parser = PARSERS[structureFormat(source)]
+    return f"{parser.__name__} {parser.VERSION}"
+
+
+class ParsedSidecar():
+    """
+    Atoms parsed from structure file `source` stored next to it, in `<source>.parsed`: one
+    `.npy` file per column, memory mapped when loaded so nothing is parsed nor copied, and
+    `meta.json` with the categories, the records skipped, the assemblies and what the arrays
+    were built from. CONECT records are kept too, so nothing else is read from the source.
+    Arrays are stale once the source contents or its parser version change. Bonds are added
+    once found, they depend on the element table too.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.folder = source + SIDECAR_EXTENSION
+
+
+    def build(self):
+        """
+        Everything the parsed atoms depend on, a sidecar built from something else is stale
+        """
+        return {"version": SIDECAR_VERSION, "parser": parserVersion(self.source), "source": currentHash(self.source)}
+
+
+    def load(self):
+        """
+        Return (`AtomTable` of memory mapped read-only columns, messages of the records
+        skipped), `None` if there's no sidecar or it's stale
+        """
+        meta = self.readMeta()
+        if meta is None or meta.get("build") != self.build():
+            return None
+        try:
+            columns = {field: self.array(field) for field in AtomTable.numeric + AtomTable.strings}
+            columns.update({field: Categorical(self.array(field), meta["categories"][field]) for field in AtomTable.categorical})
+        except (OSError, ValueError, KeyError):
+            return None # incomplete sidecar, parsed again
+        return AtomTable(**columns), meta["errors"]
+
+
+    def save(self, table, errors=(), assemblies=None, conect=None):
+        """
+        Store the columns of `table` (atoms of the first model), the `errors` reported parsing
+        them, the file `assemblies` by name and its `conect` record matrix (`None` for formats
+        without CONECT records). Return if it was written, sources in read-only folders keep
+        no sidecar.
+        """
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            for field in AtomTable.numeric + AtomTable.strings:
+                self.write(field, getattr(table, field))
+            for field in AtomTable.categorical:
+                self.write(field, getattr(table, field).codes)
+            if conect is not None:
+                self.write("conect", conect)
+            # metadata goes last, loads don't find a sidecar until its arrays are complete
+            self.writeMeta({"build": self.build(), "atoms": len(table), "errors": [str(error) for error in errors],
+                            "categories": {field: getattr(table, field).categories for field in AtomTable.categorical},
+                            "assemblies": {name: [[chains, transforms.tolist()] for chains, transforms in assembly.groups]
+                                           for name, assembly in (assemblies or {}).items()},
+                            "conect": conect is not None})
+        except OSError:
+            return False
+        return True
+
+
+    def assemblies(self):
+        """
+        Assemblies of the source by name (see `Assemblies.Assembly`), stored with the atoms
+        """
+        meta = self.readMeta() or {}
+        return {name: Assembly(name, [(chains, np.array(transforms)) for chains, transforms in groups])
+                for name, groups in meta.get("assemblies", {}).items()}
+
+
+    def conectRows(self):
+        """
+        Record matrix of the source CONECT records stored with the atoms, `None` if it has none
+        """
+        meta = self.readMeta() or {}
+        return self.array("conect") if meta.get("conect") else None
+
+
+    def bonds(self, elements):
+        """
+        Bonds of the stored atoms found with element table `elements` (its content hash),
+        memory mapped, `None` if they weren't stored or used another table
+        """
+        meta = self.readMeta()
+        if meta is None or meta.get("build") != self.build() or meta.get("bonds") != elements:
+            return None
+        try:
+            return self.array("bonds")
+        except (OSError, ValueError):
+            return None
+
+
+    def saveBonds(self, bonds, elements):
+        """
+        Add `bonds` of the stored atoms found with element table `elements` (content hash)
+        """
+        meta = self.readMeta()
+        if meta is None or meta.get("build") != self.build():
+            return False
+        try:
+            self.write("bonds", np.asarray(bonds, dtype=np.int64))
+            self.writeMeta({**meta, "bonds": elements})
+        except OSError:
+            return False
+        return True
+
+
+    def array(self, name):
+        return np.load(os.path.join(self.folder, f"{name}.npy"), mmap_mode="r")
+
+
+    def write(self, name, array):
+        """
+        Write array `name`, renamed into place once complete so a mapped file is never
+        changed under its readers
+        """
+        fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=self.folder)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, os.path.join(self.folder, f"{name}.npy"))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+    def readMeta(self):
+        try:
+            with open(os.path.join(self.folder, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def writeMeta(self, meta):
+        fd, tmp = tempfile.mkstemp(prefix=".meta.", suffix=".tmp", dir=self.folder)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(self.folder, "meta.json"))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
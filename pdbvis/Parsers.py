@@ -0,0 +1,49 @@
+import os
+
+# Structure parsers by format. Each one is a class opening a file path and giving its models
+# (frames) with the interface of `ReadPDB.Trajectory`: `len`, `readTopology`, `frame`,
+# `readCoords`, `loadCoords`, `conectRows`, `assemblies` and the `errors` of the records
+# skipped, atoms are always an `AtomTable`.
+PARSERS = {}
+EXTENSIONS = {} # file extension: format
+
+
+def registerParser(format, extensions):
+    """
+    Class decorator adding the parser of `format` files, recognised by any of `extensions`
+    (also when gzip compressed)
+    """
+    def register(cls):
+        PARSERS[format] = cls
+        for extension in extensions:
+            EXTENSIONS[extension] = format
+        return cls
+    return register
+
+
+def structureFormat(name):
+    """
+    Return format of file `name` from its extension, `None` if there's no parser for it
+    """
+    name = name.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return EXTENSIONS.get(os.path.splitext(name)[1])
+
+
+def isStructureFile(name):
+    return structureFormat(name) is not None
+
+
+def openStructure(path, **kwargs):
+    """
+    Open structure file `path` with the parser registered for its format
+    """
+    format = structureFormat(path)
+    if format is None:
+        raise ValueError(f"{os.path.basename(path)} isn't a supported structure file ({', '.join(PARSERS)})")
+    return PARSERS[format](path, **kwargs)
+
+
+# built-in parsers register themselves on import, after the registry above exists
+from . import ReadPDB, ReadCIF
@@ -0,0 +1,366 @@
+import re
+import gzip
+import numpy as np
+try:
+    import msgpack
+except ImportError:
+    msgpack = None # only needed to read BinaryCIF files
+
+from .AtomTable import ATOM_RECORDS, MISSING_INT, AtomTable, Categorical, parseNumeric
+from .Parsers import registerParser
+
+ATOM_SITE = "_atom_site"
+# `AtomTable` fields and the `_atom_site` columns holding them, first one present is used
+FIELDS = {
+    "serial": ("id",), "name": ("auth_atom_id", "label_atom_id"), "altLoc": ("label_alt_id",),
+    "resName": ("auth_comp_id", "label_comp_id"), "chainID": ("auth_asym_id", "label_asym_id"),
+    "resSeq": ("auth_seq_id", "label_seq_id"), "iCode": ("pdbx_PDB_ins_code",), "x": ("Cartn_x",),
+    "y": ("Cartn_y",), "z": ("Cartn_z",), "occupancy": ("occupancy",), "tempFactor": ("B_iso_or_equiv",),
+    "element": ("type_symbol",), "charge": ("pdbx_formal_charge",), "group": ("group_PDB",),
+    "model": ("pdbx_PDB_model_num",),
+}
+MISSING = (b".", b"?") # inapplicable and unknown values
+WHITESPACE = np.zeros(256, dtype=bool)
+WHITESPACE[[ord(" "), ord("\t"), ord("\n"), ord("\r")]] = True
+QUOTES = (ord("'"), ord('"'))
+# quoted values may contain spaces, a quote only closes them when followed by whitespace
+TOKEN = re.compile(rb"""'.*?'(?=\s|$)|".*?"(?=\s|$)|\S+""")
+# BinaryCIF `ByteArray` data types
+BYTE_TYPES = {1: "<i1", 2: "<i2", 3: "<i4", 4: "<u1", 5: "<u2", 6: "<u4", 32: "<f4", 33: "<f8"}
+
+
+class ColumnTrajectory():
+    """
+    Models of a structure parsed at once (mmCIF, BinaryCIF), rows are assigned to models by
+    their `pdbx_PDB_model_num`. Same interface as `ReadPDB.Trajectory`, every frame shares
+    the atoms (topology) of the first model.
+    """
+    VERSION = 2 # part of parsed sidecars (see `ParsedCache`), increase when the atoms read change
+
+    def __init__(self, table, models):
+        numbers, first = np.unique(models, return_index=True)
+        self.numbers = numbers[np.argsort(first)] # model numbers in file order
+        self.rows = [np.flatnonzero(models == number) for number in self.numbers] or [np.arange(len(table))]
+        self.hasModels = len(self.rows) > 1
+        self.table = table # atoms of every model
+        self.topology = table.take(self.rows[0]) if self.hasModels else table
+        self.coords = None # (F, N, 3) float32 coordinates of every frame, see `loadCoords`
+        self.errors = [] # rows are validated by the column parsers, nothing is skipped per chunk
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def readTopology(self):
+        return self.topology
+
+
+    def frame(self, index):
+        """
+        Return `AtomTable` of frame `index` (negative counts from the end)
+        """
+        index = range(len(self))[index] # raise IndexError when out of range
+        if index == 0:
+            return self.topology
+        return self.topology.withCoords(self.readCoords([index])[0])
+
+
+    def loadCoords(self):
+        """
+        Stack coordinates of every frame into `self.coords` (F, N, 3) and return them
+        """
+        if self.coords is None:
+            self.coords = self.readCoords(range(len(self)))
+        return self.coords
+
+
+    def readCoords(self, frames):
+        """
+        Return (len(frames), N, 3) coordinates of `frames`
+        """
+        coords = np.empty((len(frames), len(self.topology), 3), dtype=np.float32)
+        for k, frame in enumerate(frames):
+            rows = self.rows[frame]
+            if len(rows) != len(self.topology):
+                raise ValueError(f"Frame {frame} has {len(rows)} atoms but the first one has {len(self.topology)}")
+            coords[k] = self.table.coords[rows]
+        return coords
+
+
+    def conectRows(self):
+        """
+        CIF files have no CONECT records, bonds are perceived from distances
+        """
+        return None
+
+
+    def assemblies(self):
+        """
+        Assemblies of `_pdbx_struct_assembly_gen` aren't read yet
+        """
+        return {}
+
+
+@registerParser("cif", (".cif", ".mmcif"))
+class CIFTrajectory(ColumnTrajectory):
+    """
+    Atoms of the `_atom_site` loop of an mmCIF file (plain or gzip compressed)
+    """
+    def __init__(self, path, records=ATOM_RECORDS):
+        self.path = path
+        columns, rows = readAtomSite(readBytes(path))
+        super().__init__(*tableFromColumns(columns, rows, records))
+
+
+@registerParser("bcif", (".bcif",))
+class BinaryCIFTrajectory(ColumnTrajectory):
+    """
+    Atoms of the `_atom_site` category of a BinaryCIF file (MessagePack encoded columns)
+    """
+    def __init__(self, path, records=ATOM_RECORDS):
+        self.path = path
+        columns, rows = readBinaryAtomSite(readBytes(path))
+        super().__init__(*tableFromColumns(columns, rows, records))
+
+
+def readBytes(path):
+    """
+    Return contents of `path`, decompressed if it's a `.gz` file
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.read()
+
+
+def readAtomSite(data, category=ATOM_SITE):
+    """
+    Tokenize the `category` loop of mmCIF `data`. Return ({column name: (bytes array, missing
+    mask)}, row count) with only the columns used by `tableFromColumns`.
+    """
+    prefix = b"\n" + category.encode() + b"."
+    position = data.find(prefix) + 1
+    if position == 0:
+        raise ValueError(f"No {category} category found")
+    names, values = [], []
+    while data.startswith(prefix[1:], position):
+        end = data.find(b"\n", position)
+        end = len(data) if end == -1 else end
+        item = data[position:end].split(None, 1)
+        names.append(item[0][len(prefix) - 1:].decode())
+        values.append(item[1].strip() if len(item) > 1 else b"")
+        position = end + 1
+    used = usedColumns(names)
+
+    if not data[:data.find(prefix)].rstrip().endswith(b"loop_"):
+        # single row written as name value pairs
+        unquote = lambda value: value[1:-1] if len(value) > 1 and value[0] in QUOTES and value[-1] == value[0] else value
+        return {name: columnValues(np.array([unquote(value)], dtype="S")) for name, value in zip(names, values)
+                if name in used}, 1
+
+    # loop values run until the next comment, loop, item or data block
+    ends = [data.find(pattern, position - 1) for pattern in (b"\n#", b"\nloop_", b"\n_", b"\ndata_")]
+    end = min([e for e in ends if e != -1], default=len(data))
+    body = data[position:end]
+    if b"\n;" in body or body.startswith(b";"):
+        raise ValueError(f"Multi-line values in {category} aren't supported")
+    buf = np.frombuffer(body, dtype=np.uint8)
+    starts, ends = tokenSpans(buf)
+    if len(starts) % len(names):
+        raise ValueError(f"{category} has {len(starts)} values, not a multiple of its {len(names)} columns")
+    columns = {}
+    for k, name in enumerate(names):
+        if name in used:
+            columns[name] = columnValues(gatherTokens(buf, starts[k::len(names)], ends[k::len(names)]))
+    return columns, len(starts) // len(names)
+
+
+def usedColumns(names):
+    """
+    Columns of `names` read into the `AtomTable`, the first present one of each field
+    """
+    return {next(name for name in columns if name in names) for columns in FIELDS.values()
+            if any(name in names for name in columns)}
+
+
+def tokenSpans(buf):
+    """
+    Return (starts, ends) of the whitespace separated values of `buf` (uint8 array), quotes
+    around values are left out
+    """
+    space = WHITESPACE[buf]
+    edges = np.diff(np.concatenate(([True], space, [True])).view(np.int8))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    first = buf[starts]
+    quoted = (first == QUOTES[0]) | (first == QUOTES[1])
+    if quoted.any():
+        closed = (buf[ends - 1] == first) & (ends - starts > 1)
+        if (quoted & ~closed).any():
+            # some quoted value has whitespace inside, use the slower regular expression
+            spans = np.array([m.span() for m in TOKEN.finditer(buf.tobytes())], dtype=np.int64).reshape(-1, 2)
+            starts, ends = spans[:, 0], spans[:, 1]
+            first = buf[starts]
+            quoted = ((first == QUOTES[0]) | (first == QUOTES[1])) & (ends - starts > 1)
+        starts = starts + quoted
+        ends = ends - quoted
+    return starts, ends
+
+
+def gatherTokens(buf, starts, ends):
+    """
+    Return bytes array with the values of `buf` between `starts` and `ends`
+    """
+    lengths = ends - starts
+    width = max(int(lengths.max()), 1) if len(starts) else 1
+    out = np.zeros((len(starts), width), dtype=np.uint8)
+    # one gather per character position, values are short so it's a few passes
+    for j in range(width):
+        out[:, j] = np.where(lengths > j, buf[np.minimum(starts + j, len(buf) - 1)], 0)
+    return out.view(f"S{width}").reshape(len(starts))
+
+
+def columnValues(values):
+    """
+    Pair text `values` with the mask of missing ('.' or '?') ones
+    """
+    return values, (values == MISSING[0]) | (values == MISSING[1])
+
+
+def readBinaryAtomSite(data, category=ATOM_SITE):
+    """
+    Decode the `category` columns of BinaryCIF `data`. Return ({column name: (values array,
+    missing mask)}, row count) with only the columns used by `tableFromColumns`.
+    """
+    if msgpack is None:
+        raise ImportError("MessagePack python module (msgpack) is needed to read BinaryCIF files")
+    content = msgpack.unpackb(data, raw=False)
+    for block in content["dataBlocks"]:
+        for cat in block["categories"]:
+            if cat["name"].lstrip("_") != category.lstrip("_"):
+                continue
+            used = usedColumns([column["name"] for column in cat["columns"]])
+            columns = {}
+            for column in cat["columns"]:
+                if column["name"] not in used:
+                    continue
+                values = decodeData(column["data"])
+                # mask values: 0 present, 1 inapplicable ('.'), 2 unknown ('?')
+                missing = decodeData(column["mask"]) != 0 if column.get("mask") else np.zeros(len(values), dtype=bool)
+                columns[column["name"]] = (values, missing)
+            return columns, cat["rowCount"]
+    raise ValueError(f"No {category} category found")
+
+
+def decodeData(encoded):
+    """
+    Decode BinaryCIF `{"data", "encoding"}`, encodings were applied in order so they're
+    undone in reverse
+    """
+    data = encoded["data"]
+    for encoding in reversed(encoded["encoding"]):
+        data = DECODERS[encoding["kind"]](data, encoding)
+    return data
+
+
+def decodeIntegerPacking(data, encoding):
+    """
+    Values larger than the packed type are split into several items at the type limit,
+    add every run of limit items to the item ending it
+    """
+    data = np.asarray(data)
+    upper = (1 << (8 * encoding["byteCount"] - (0 if encoding["isUnsigned"] else 1))) - 1
+    limit = data == upper
+    if not encoding["isUnsigned"]:
+        limit |= data == -upper - 1
+    data = data.astype(np.int32)
+    if not limit.any():
+        return data
+    ends = np.flatnonzero(~limit)
+    return np.add.reduceat(data, np.concatenate(([0], ends[:-1] + 1)))
+
+
+def decodeStringArray(data, encoding):
+    """
+    Strings are indices into a list of unique strings concatenated in `stringData`, -1 is missing
+    """
+    offsets = decodeData({"data": encoding["offsets"], "encoding": encoding["offsetEncoding"]})
+    indices = decodeData({"data": data, "encoding": encoding["dataEncoding"]})
+    text = encoding["stringData"]
+    strings = [text[offsets[i]:offsets[i + 1]].encode("utf-8") for i in range(len(offsets) - 1)]
+    # last entry is used by the missing (-1) indices
+    return np.array(strings + [b""], dtype="S")[indices]
+
+
+DECODERS = {
+    "ByteArray": lambda data, e: np.frombuffer(data, dtype=BYTE_TYPES[e["type"]]),
+    "FixedPoint": lambda data, e: (np.asarray(data) / e["factor"]).astype(BYTE_TYPES[e["srcType"]]),
+    "IntervalQuantization": lambda data, e: (e["min"] + (e["max"] - e["min"]) / (e["numSteps"] - 1)
+                                             * np.asarray(data)).astype(BYTE_TYPES[e["srcType"]]),
+    "RunLength": lambda data, e: np.repeat(data[0::2], data[1::2]).astype(BYTE_TYPES[e["srcType"]]),
+    "Delta": lambda data, e: (np.cumsum(data, dtype=np.int64) + e["origin"]).astype(BYTE_TYPES[e["srcType"]]),
+    "IntegerPacking": decodeIntegerPacking,
+    "StringArray": decodeStringArray,
+}
+
+
+def tableFromColumns(columns, rows, records=ATOM_RECORDS):
+    """
+    Build an `AtomTable` from `_atom_site` columns ({name: (values, missing mask)}), only rows
+    whose `group_PDB` is in `records`. Return (table, model number of each row).
+    """
+    def column(field):
+        for name in FIELDS[field]:
+            if name in columns:
+                return columns[name]
+        return np.full(rows, b"", dtype="S1"), np.ones(rows, dtype=bool)
+
+    def numbers(field, dtype, fill):
+        values, missing = column(field)
+        if values.dtype.kind in "SU":
+            return parseNumeric(np.where(missing, b"", np.char.encode(values) if values.dtype.kind == "U" else values), dtype, fill)
+        values = values.astype(dtype)
+        values[missing] = fill
+        return values, ~missing
+
+    def strings(field):
+        values, missing = column(field)
+        values = values.astype("S") if values.dtype.kind != "U" else np.char.encode(values)
+        return np.where(missing, b"", values)
+
+    group = strings("group")
+    coords = np.empty((rows, 3), dtype=np.float32)
+    # atoms without a valid position are skipped, as well as other records
+    keep = np.isin(group, records) | (group == b"")
+    for i, axis in enumerate("xyz"):
+        coords[:, i], ok = numbers(axis, np.float32, np.nan)
+        keep &= ok
+    charge, _ = numbers("charge", np.int32, 0)
+    models, _ = numbers("model", np.int32, 1)
+    take = lambda values: values[keep]
+
+    table = AtomTable(
+        coords=take(coords),
+        serial=take(numbers("serial", np.int32, MISSING_INT)[0]),
+        resSeq=take(numbers("resSeq", np.int32, MISSING_INT)[0]),
+        occupancy=take(numbers("occupancy", np.float32, np.nan)[0]),
+        tempFactor=take(numbers("tempFactor", np.float32, np.nan)[0]),
+        element=Categorical.fromValues(take(strings("element")), transform=str.capitalize),
+        resName=Categorical.fromValues(take(strings("resName"))),
+        chainID=Categorical.fromValues(take(strings("chainID"))),
+        name=take(strings("name")),
+        altLoc=take(strings("altLoc")),
+        iCode=take(strings("iCode")),
+        charge=pdbCharges(take(charge)),
+        hetero=take(group == b"HETATM"),
+    )
+    return table, take(models)
+
+
+def pdbCharges(charges):
+    """
+    Integer formal charges into PDB charge strings ('2+', '1-', empty when neutral)
+    """
+    uniques, inverse = np.unique(charges, return_inverse=True)
+    text = [f"{abs(c)}{'+' if c > 0 else '-'}".encode() if c else b"" for c in uniques.tolist()]
+    return np.array(text + [b""], dtype="S")[inverse.reshape(-1)] if len(charges) else np.empty(0, dtype="S2")
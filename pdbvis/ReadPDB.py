@@ -1,75 +1,427 @@
 import re
 import sys, os
-import bpy
+import gzip
+import mmap
+import numpy as np
+from django.conf import settings
+
+from .BlenderSession import bpy, defaultSession
+from .AtomTable import ATOM_RECORDS, AtomTable, AtomDictView, recordMatrix, parseCoords
+from .BuildMesh import MODES, autoSubdivisions
+from .Representations import buildModelParts, buildAssemblyParts
+from .Bonds import findBonds, takeBonds
+from .ElementTable import loadElementTable, DEFAULT_PATH as DEFAULT_ELEMENTS_PATH
+from .Parsers import registerParser, isStructureFile, openStructure
+from .Metrics import stage
+from .Assemblies import AssemblyError, parseAssemblies
+from .ParallelParse import PARALLEL_MIN_BYTES, parseChunk, parseParallel
+from .ParsedCache import ParsedSidecar
+from .FileHash import currentHash
 
 # Read PDB file and get information about the molecule
 class PDBReader():
-    def __init__(self, path):
+    def __init__(self, path, readBonds=False, frame=0, selection=None, assembly=None, sidecar=None):
         splitPath = re.split(r"/|\\", path)
         self.path = "/".join(splitPath[:-1])
         self.name = splitPath[-1]
-        self.atoms = []
-        self.bonds = []
-        self.text = ""
+        self.table = None
+        self.openedTrajectory = None # see `trajectory`
+        self.fileTable = None # atoms of the file model, before the selection
+        self.parsed = None # `ParsedSidecar` holding the file atoms, assemblies and CONECT records
+        self.frame = frame # model read into `self.table`, starting at 0
+        if sidecar is None:
+            # readers also run outside django, in scripts and benchmarks
+            sidecar = settings.PDBVIS_PARSED_SIDECARS if settings.configured else False
+        self.sidecar = sidecar # keep the atoms parsed (first model) in a `ParsedSidecar`
+        self.readBonds = readBonds # find bonds from CONECT records and atom distances
+        self.selection = selection # `Selection` of the atoms kept, all of them when `None`
+        self.selected = None # indices of the kept atoms in the file model, `None` if all
+        self.assemblyName = assembly # biological assembly (or crystal symmetry) built from the atoms
+        self.assembly = None # its `Assembly`, read with the atoms
+        self.bonds = np.empty((0, 2), dtype=np.int64) # (M, 2) atom indices of bonded atoms
         self.readFile()
         self.getAtoms()
 
+
+    @property
+    def atoms(self):
+        """
+        Atoms as a list of dictionaries, created on access from `self.table`
+        """
+        return AtomDictView(self.table)
+
+
+    @property
+    def trajectory(self):
+        """
+        Models (frames) of the file, see `Trajectory`. Opened on first use, atoms loaded from
+        a sidecar don't need it.
+        """
+        if self.openedTrajectory is None:
+            self.openedTrajectory = openStructure(os.path.join(self.path, self.name))
+            if self.fileTable is not None and self.frame == 0:
+                self.openedTrajectory.topology = self.fileTable # not parsed again for other frames
+        return self.openedTrajectory
+
+
     def readFile(self):
         """
-        Read lines from files if file has a valid PDB extension
+        Check file has the extension of a supported format (PDB, mmCIF or BinaryCIF, plain
+        or gzip compressed)
         """
-        splitName = self.name.split('.')
-        if splitName[-1] != 'pdb':
-            raise ValueError(f"{self.name} is not a valid PDB file.")
-        with open(os.path.join(self.path, self.name), 'r') as f:
-            self.text = f.read()
-        self.text = self.text.split('\n')
-        print(f"{self.name} succesfully loaded!")
+        if not isStructureFile(self.name):
+            raise ValueError(f"{self.name} is not a valid PDB, mmCIF or BinaryCIF file.")
 
 
     def getAtoms(self):
         """
-        Get all atoms from PDB file and read all their properties
-        """
-        for s in self.text:
-            if s[0:5].replace(" ", "") == "ATOM":
-                atom = {"atom": s[0:5], "serial": s[6:10], "name": s[12:15], "altLoc": s[16],
-                    "resName": s[17:19], "chainID": s[21], "resSeq": s[22:25],
-                    "iCode": s[26], "x": s[30:37], "y": s[38:45], "z": s[46:53],
-                    "occupancy": s[54:59], "tempFactor": s[60:65], "element": s[66:78],
-                    "charge": s[79:80]}
-                for info in ["atom", "serial", "name", "altLoc", "resName", "chainID",
-                            "resSeq", "iCode", "x", "y", "z", "occupancy", "tempFactor",
-                            "element", "charge"]:
-                    atom[info] = atom[info].strip()
-                try:
-                    atom["serial"] = int(atom["serial"]) if atom["serial"] != "" else None
-                    atom["x"] = float(atom["x"]); atom["y"] = float(atom["y"])
-                    atom["z"] = float(atom["z"]);
-                except ValueError:
-                    print(atom)
-                    print(f"Atom {atom['serial']} serial or 3D position can't be decoded")
-                    continue
-                try:
-                    atom["occupancy"] = float(atom["occupancy"])
-                    atom["tempFactor"] = float(atom["tempFactor"])
-                    atom["resSeq"] = int(atom["resSeq"])
-                except ValueError:
-                    pass
-                self.atoms.append(atom)
+        Get atoms of model `self.frame` from PDB file into a columnar `AtomTable`, reading it
+        by chunks. Other models are indexed but only read on demand through `self.trajectory`.
+        Atoms of the first model are memory mapped from the file sidecar when it's up to date.
+        """
+        path = os.path.join(self.path, self.name)
+        sidecar = ParsedSidecar(path) if self.sidecar and self.frame == 0 else None
+        with stage("parse") as info:
+            parsed = sidecar.load() if sidecar else None
+            if parsed:
+                self.fileTable, errors = parsed
+                self.parsed = sidecar
+            else:
+                self.fileTable = self.trajectory.frame(self.frame)
+                errors = self.trajectory.errors
+                if sidecar and len(self.fileTable) and sidecar.save(self.fileTable, errors, self.trajectory.assemblies(),
+                                                                    self.trajectory.conectRows()):
+                    self.parsed = sidecar
+            self.table = self.fileTable
+            if not len(self.table):
+                raise ValueError(f"No atoms found in {self.name}")
+            if self.selection is not None:
+                self.selected = self.selection.indices(self.table)
+                self.table = self.table.take(self.selected)
+            if self.assemblyName is not None:
+                assemblies = (self.parsed or self.trajectory).assemblies()
+                if self.assemblyName not in assemblies:
+                    raise AssemblyError(f"Assembly {self.assemblyName} not found in {self.name}"
+                                        + (f", available: {', '.join(assemblies)}" if assemblies else ""))
+                self.assembly = assemblies[self.assemblyName]
+            info["atoms"], info["bytes"] = len(self.table), os.path.getsize(path)
+        for error in errors:
+            print(f"{self.name}: {error}")
+        if self.readBonds:
+            with stage("bonds") as info:
+                self.bonds = self.getBonds(sidecar)
+                info["atoms"] = len(self.table)
+        print(f"{self.name} succesfully loaded!")
+
+
+    def getBonds(self, sidecar=None):
+        """
+        Bonds of the atoms read. With a `sidecar` they're found once for every atom of the
+        file model and stored in it, selections take theirs.
+        """
+        if sidecar is None or self.parsed is None:
+            return findBonds(self.table, loadElementTable().atoms, self.conectRows())
+        elements = currentHash(DEFAULT_ELEMENTS_PATH)
+        bonds = sidecar.bonds(elements)
+        if bonds is None:
+            if self.selected is not None:
+                # finding them for the selection only is cheaper, they aren't stored
+                return findBonds(self.table, loadElementTable().atoms, self.conectRows())
+            bonds = findBonds(self.fileTable, loadElementTable().atoms, self.conectRows())
+            sidecar.saveBonds(bonds, elements)
+        return bonds if self.selected is None else takeBonds(bonds, self.selected, len(self.fileTable))
+
+
+    def conectRows(self):
+        """
+        Record matrix of the CONECT records of the file, stored in its sidecar when the atoms
+        came from one so the file isn't scanned again
+        """
+        return (self.parsed or self.trajectory).conectRows()
 
 
+    def frameCoords(self):
+        """
+        Coordinates (F, N, 3) of the atoms read in every model of the file
+        """
+        coords = self.trajectory.loadCoords()
+        return coords if self.selected is None else coords[:, self.selected]
+
+
+@registerParser("pdb", (".pdb", ".ent"))
+class Trajectory():
+    """
+    Models of a PDB file (NMR models or MD frames between MODEL and ENDMDL records). A single
+    scan indexes the byte range of every frame so each one is read on demand. Frames share the
+    atoms (topology) of the first one and only differ in their coordinates. Large plain
+    files are parsed by a pool of `processes` (see `ParallelParse`).
+    """
+    VERSION = 2 # part of parsed sidecars (see `ParsedCache`), increase when the atoms read change
+
+    def __init__(self, path, chunkSize=1 << 22, records=ATOM_RECORDS, processes=None):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.records = records
+        if processes is None:
+            # parsers also run outside django, in scripts and benchmarks
+            processes = settings.PDBVIS_PARSE_PROCESSES if settings.configured else 1
+        self.processes = processes
+        self.offsets, self.size = indexFrames(path, chunkSize) # (F, 2) start and end byte of each frame
+        # a single frame spanning the whole file means there are no MODEL records
+        self.hasModels = len(self.offsets) > 1 or self.offsets[0, 0] > 0 or self.offsets[0, 1] < self.size
+        self.topology = None # `AtomTable` of the first frame, read on first use
+        self.coords = None # (F, N, 3) float32 coordinates of every frame, see `loadCoords`
+        self.errors = [] # `ChunkError` of the chunks of the topology with records skipped
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def readTopology(self):
+        """
+        Read atoms of the first frame, shared by every frame. Records skipped are reported
+        in `self.errors` by chunk, with the line of the first one.
+        """
+        if self.topology is None:
+            start, end = (int(offset) for offset in self.offsets[0])
+            if self.processes > 1 and end - start >= PARALLEL_MIN_BYTES and not self.path.endswith(".gz"):
+                tables = parseParallel(self.path, self.records, start, end, self.processes, self.chunkSize, self.errors)
+            else:
+                tables = iterAtoms(self.path, self.chunkSize, self.records, start, end, self.errors)
+            self.topology = AtomTable.concatenate(tables)
+            for error in self.errors:
+                error.line = lineNumber(self.path, error.offset, self.chunkSize)
+        return self.topology
+
+
+    def frame(self, index):
+        """
+        Return `AtomTable` of frame `index` (negative counts from the end)
+        """
+        index = range(len(self))[index] # raise IndexError when out of range
+        topology = self.readTopology()
+        if index == 0:
+            return topology
+        coords = self.coords[index] if self.coords is not None else self.readCoords([index])[0]
+        return topology.withCoords(coords)
+
+
+    def loadCoords(self):
+        """
+        Read coordinates of every frame in one pass into `self.coords` (F, N, 3) and return them
+        """
+        if self.coords is None:
+            self.coords = self.readCoords(range(len(self)))
+        return self.coords
+
+
+    def readCoords(self, frames):
+        """
+        Return (len(frames), N, 3) coordinates of `frames`, read sequentially in one pass over
+        their byte range so compressed files aren't decompressed again for each frame
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        nAtoms = len(self.readTopology())
+        coords = np.empty((len(frames), nAtoms, 3), dtype=np.float32)
+        if not len(frames):
+            return coords
+        order = np.argsort(frames, kind="stable")
+        starts, ends = self.offsets[frames[order]].T
+        parts = [[] for _ in frames]
+        position = int(starts[0])
+        for chunk in iterChunks(self.path, self.chunkSize, position, int(ends.max())):
+            chunkEnd = position + len(chunk)
+            # frames overlapping this chunk, frame limits are always at line boundaries
+            for k in np.flatnonzero((starts < chunkEnd) & (ends > position)):
+                data = chunk[max(starts[k] - position, 0):min(ends[k], chunkEnd) - position]
+                frameCoords, valid = parseCoords(recordMatrix(data, self.records))
+                parts[k].append(frameCoords[valid])
+            position = chunkEnd
+        for k, frame in enumerate(frames[order]):
+            frameCoords = np.concatenate(parts[k]) if parts[k] else np.empty((0, 3), dtype=np.float32)
+            if len(frameCoords) != nAtoms:
+                raise ValueError(f"Frame {frame} has {len(frameCoords)} atoms but the first one has {nAtoms}")
+            coords[order[k]] = frameCoords
+        return coords
+
+
+    def assemblies(self):
+        """
+        Biological assemblies (REMARK 350) and crystal symmetry (REMARK 290) of the file by
+        name, see `parseAssemblies`. Remarks come before the atoms, reading stops there.
+        """
+        rows = []
+        for chunk in iterChunks(self.path, self.chunkSize):
+            rows.append(recordMatrix(chunk, (b"REMARK 350", b"REMARK 290")))
+            if any(findLines(chunk, record) for record in self.records):
+                break
+        lines = [row.tobytes().decode("ascii", "replace") for matrix in rows for row in matrix]
+        return parseAssemblies(lines)
+
+
+    def conectRows(self):
+        """
+        Record matrix of CONECT records, which are outside models (or anywhere in single model files)
+        """
+        if self.hasModels:
+            # header before the first model and trailer after the last one
+            ranges = [(0, int(self.offsets[0, 0])), (int(self.offsets[-1, 1]), self.size)]
+        else:
+            ranges = [(0, self.size)]
+        rows = [recordMatrix(chunk, (b"CONECT",)) for start, end in ranges if end > start
+                for chunk in iterChunks(self.path, self.chunkSize, start, end)]
+        return np.concatenate(rows) if rows else None
+
+
+def iterChunks(path, chunkSize=1 << 22, start=0, end=None):
+    """
+    Yield `path` contents as byte chunks of about `chunkSize` ending at a line boundary.
+    Plain files are memory mapped, `.gz` files are decompressed on the fly. With `start`
+    and `end` only that byte range (of the uncompressed contents) is read.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            f.seek(start) # gzip seeks decompressing up to `start`
+            left = -1 if end is None else end - start
+            rest = b""
+            while left:
+                block = f.read(chunkSize if left < 0 else min(chunkSize, left))
+                if not block:
+                    break
+                left -= len(block) if left > 0 else 0
+                block = rest + block
+                cut = block.rfind(b'\n') + 1
+                if cut == 0:
+                    rest = block
+                    continue
+                rest = block[cut:]
+                yield block[:cut]
+            if rest:
+                yield rest
+        return
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            stop = len(mm) if end is None else min(end, len(mm))
+            while pos < stop:
+                end = min(pos + chunkSize, stop)
+                if end < stop:
+                    cut = mm.rfind(b'\n', pos, end)
+                    # a line longer than the chunk, extend up to its end
+                    end = cut + 1 if cut != -1 else (mm.find(b'\n', end, stop) + 1 or stop)
+                yield mm[pos:end]
+                pos = end
+
+
+def indexFrames(path, chunkSize=1 << 22):
+    """
+    Scan `path` once returning ((F, 2) array with start and end byte of each MODEL ... ENDMDL
+    block, file size). Files without MODEL records are a single frame spanning the whole file.
+    """
+    frames = []
+    start = None
+    offset = 0
+    for chunk in iterChunks(path, chunkSize):
+        records = sorted([(p, b"MODEL") for p in findLines(chunk, b"MODEL")] +
+                         [(p, b"ENDMDL") for p in findLines(chunk, b"ENDMDL")])
+        for lineStart, record in records:
+            position = offset + lineStart
+            if record == b"MODEL":
+                if start is not None:
+                    frames.append((start, position)) # previous model without ENDMDL
+                start = position
+            elif start is not None:
+                lineEnd = chunk.find(b"\n", lineStart)
+                frames.append((start, offset + (lineEnd + 1 if lineEnd != -1 else len(chunk))))
+                start = None
+        offset += len(chunk)
+    if start is not None:
+        frames.append((start, offset))
+    if not frames:
+        frames.append((0, offset))
+    return np.array(frames, dtype=np.int64).reshape(-1, 2), offset
+
+
+def lineNumber(path, offset, chunkSize=1 << 22):
+    """
+    Line number (starting at 1) of byte `offset` of `path`, counted reading the file up to it
+    """
+    return 1 + sum(chunk.count(b"\n") for chunk in iterChunks(path, chunkSize, 0, offset))
+
+
+def findLines(chunk, record):
+    """
+    Return start offsets of the lines of `chunk` beginning with `record`
+    """
+    found = [0] if chunk.startswith(record) else []
+    # bytes.find is much faster than a multiline regular expression
+    pattern = b"\n" + record
+    position = chunk.find(pattern)
+    while position != -1:
+        found.append(position + 1)
+        position = chunk.find(pattern, position + 1)
+    return found
+
+
+def iterAtoms(path, chunkSize=1 << 22, records=ATOM_RECORDS, start=0, end=None, errors=None):
+    """
+    Stream atoms of a PDB file as `AtomTable` batches, one per chunk of about `chunkSize`
+    bytes, so memory use doesn't depend on file size. `start` and `end` limit the byte range.
+    `ChunkError`s of the chunks with records skipped are appended to `errors`.
+    """
+    offset = start
+    for chunk in iterChunks(path, chunkSize, start, end):
+        table, error = parseChunk(chunk, records, offset)
+        offset += len(chunk)
+        if error is not None and errors is not None:
+            errors.append(error)
+        if len(table):
+            yield table
+
+
+
+# modes whose mesh topology doesn't depend on coordinates, so frames can be shape keys
+ANIMATED_MODES = ("spheres", "ballstick", "beads")
+
 
 # Convert from PDB to FBX using blender API
 class PDBConverter():
-    def __init__(self, input, output):
+    VERSION = 1 # part of cached models build manifest, increase when the output changes
+
+    def __init__(self, input, output, batched=True, subdivisions=None, mode="spheres", frame=0, animate=False, selection=None,
+                 session=None, assembly=None):
         splitInput = re.split(r"/|\\", input)
         self.inputPath = "/".join(splitInput[:-1]) # input file path
         self.inputName = splitInput[-1] # input file name
         splitOutput = re.split(r"/|\\", output)
         self.outputPath = "/".join(splitOutput[:-1]) # output file path
         self.outputName = splitOutput[-1] # output file name
-        self.atomProperties = BlenderPDBInit() # init atom properties with default path
+        self.batched = batched # build one merged mesh per element instead of one object per atom
+        self.subdivisions = subdivisions # level of detail, `None` chooses it from the number of primitives
+        self.mode = mode # one of `MODES`, coarse-grained modes are always batched
+        self.frame = frame # model of multi-model files exported, starting at 0
+        self.animate = animate # add every model as a shape key animated one per scene frame
+        self.selection = selection # `Selection` of the atoms converted, all of them when `None`
+        self.assembly = assembly # name of the assembly built, the asymmetric unit when `None`
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode {mode}, must be one of: {', '.join(MODES)}")
+        if animate and not batched:
+            raise ValueError("Animation needs batched meshes")
+        if animate and assembly is not None:
+            raise ValueError("Assemblies can't be animated")
+        if assembly is not None and not batched:
+            raise ValueError("Assemblies need batched meshes")
+        if animate and mode not in ANIMATED_MODES:
+            raise ValueError(f"Animation needs the same mesh topology on every frame, {mode} mode doesn't keep it")
+        if bpy is None:
+            raise ImportError("Blender python module (bpy) is needed to convert models")
+        self.session = session or defaultSession() # warm blender state shared with other conversions
+        with stage("elements"):
+            self.atomProperties = BlenderPDBInit() # init atom properties with default path
         self.main() # call main method
 
 
@@ -81,10 +433,13 @@ class PDBConverter():
         self.checkPaths() # check if given paths exist
         print("Initializing blender scene...")
         self.initScene() # start blender scene
-        print("Creating model...")
-        self.createModel() # Create mesh for each atom
-        print("Exporting model...")
-        self.exportModel() # export model into FBX file
+        try:
+            print("Creating model...")
+            self.createModel() # Create mesh for each atom
+            print("Exporting model...")
+            self.exportModel() # export model into FBX file
+        finally:
+            self.session.finish()
         print("Everything with PDB generator done!")
 
 
@@ -93,16 +448,18 @@ class PDBConverter():
 
 
     def exportModel(self):
-        bpy.ops.export_scene.fbx(filepath=os.path.join(self.outputPath, self.outputName))
+        path = os.path.join(self.outputPath, self.outputName)
+        with stage("export") as info:
+            bpy.ops.export_scene.fbx(filepath=path)
+            info["bytes"] = os.path.getsize(path)
 
 
     def checkPaths(self):
         """
-        Check if given path (input and output) are valid ones (.pdb and .fbx)
+        Check if given path (input and output) are valid ones (structure file and .fbx)
         """
-        splitName = self.inputName.split('.')
-        if splitName[-1] != 'pdb' or len(splitName) != 2:
-            raise ValueError("Invalid input file given. File must be a valid PDB file")
+        if not isStructureFile(self.inputName):
+            raise ValueError("Invalid input file given. File must be a valid PDB, mmCIF or BinaryCIF file")
         splitName = self.outputName.split('.')
         if splitName[-1] != 'fbx' or len(splitName) != 2:
             raise ValueError("Invalid output file given. File must have a FBX extension or delete dots inside it")
@@ -110,20 +467,105 @@ class PDBConverter():
 
     def initScene(self):
         """
-        Start blender scene and remove initial setup (cube, camera, light and all objects)
+        Start blender scene, removing initial setup (cube, camera, light) or what previous
+        conversions left (see `BlenderSession.reset`)
         """
-        allObj = bpy.data.objects
-        for obj in allObj:
-            bpy.data.objects.remove(obj)
+        self.session.reset()
 
 
     def readFile(self):
         """
         Read PDB file using `PDBReader` and convert into mesh
         """
-        reader = PDBReader(os.path.join(self.inputPath, self.inputName))
-        for atom in reader.atoms:
-            self.addAtom(atom)
+        reader = PDBReader(os.path.join(self.inputPath, self.inputName), readBonds=self.mode == "ballstick", frame=self.frame,
+                           selection=self.selection, assembly=self.assembly)
+        self.reader = reader
+        if self.batched or self.mode != "spheres":
+            objects = self.addAtoms(reader.table, reader.bonds)
+            if self.animate:
+                self.addFrames(objects, reader.table, reader.bonds, reader.frameCoords())
+            return
+        if self.subdivisions is None:
+            self.subdivisions = autoSubdivisions(len(reader.table))
+        with stage("mesh") as info:
+            for atom in reader.atoms:
+                self.addAtom(atom)
+            info["atoms"] = len(reader.table)
+
+
+    def buildParts(self, table, bonds):
+        """
+        Mesh parts of `table` atoms (and `bonds` in ball-and-stick mode) in the converter mode,
+        placed at every copy of the assembly read if any
+        """
+        if self.reader.assembly is not None:
+            return buildAssemblyParts(self.mode, table, bonds, self.atomProperties.atoms, self.reader.assembly,
+                                      self.subdivisions, normals=False)
+        return buildModelParts(self.mode, table, bonds, self.atomProperties.atoms, self.subdivisions, normals=False)
+
+
+    def addAtoms(self, table, bonds=None):
+        """
+        Add one mesh per part of `table` atoms: per element with a sphere for each atom (and
+        its half bonds in ball-and-stick mode), per chain color in trace and beads modes or
+        a single surface. Return the objects created, the first copy of assembly parts.
+        """
+        with stage("mesh") as info:
+            parts = self.buildParts(table, bonds)
+            info["atoms"], info["triangles"] = len(table), sum(len(part.indices) for part in parts)
+            return [self.addMeshPart(part) for part in parts]
+
+
+    def addFrames(self, objects, table, bonds, coords):
+        """
+        Add a shape key per frame of `coords` (F, N, 3) to the meshes built from `table`, each
+        one fully applied on its own scene frame. Geometry is rebuilt from the coordinates
+        already in memory, the file isn't read again.
+        """
+        scene = bpy.context.scene
+        scene.frame_start, scene.frame_end = 1, len(coords)
+        for ob in objects:
+            ob.shape_key_add(name="Basis", from_mix=False)
+        for frame, frameCoords in enumerate(coords):
+            parts = self.buildParts(table.withCoords(frameCoords), bonds)
+            for ob, part in zip(objects, parts):
+                key = ob.shape_key_add(name=f"Frame_{frame}", from_mix=False)
+                key.data.foreach_set("co", part.positions.ravel())
+                # only on at its own frame
+                for sceneFrame, value in ((frame, 0.0), (frame + 1, 1.0), (frame + 2, 0.0)):
+                    key.value = value
+                    key.keyframe_insert("value", frame=sceneFrame)
+
+
+    def addMeshPart(self, part):
+        """
+        Create an object from a `MeshPart`, the geometry is written directly into the mesh
+        buffers instead of adding a primitive per atom. Assembly copies are linked duplicates
+        sharing the mesh, return the first one.
+        """
+        verts, faces = part.positions, part.indices
+        mesh = bpy.data.meshes.new(part.name)
+        mesh.vertices.add(len(verts))
+        mesh.vertices.foreach_set("co", verts.ravel())
+        mesh.loops.add(faces.size)
+        mesh.loops.foreach_set("vertex_index", faces.ravel().astype(np.int32))
+        mesh.polygons.add(len(faces))
+        mesh.polygons.foreach_set("loop_start", np.arange(0, faces.size, 3, dtype=np.int32))
+        mesh.polygons.foreach_set("loop_total", np.full(len(faces), 3, dtype=np.int32))
+        mesh.update(calc_edges=True)
+
+        mesh.materials.append(self.elementMaterial(part.material, part.color))
+        if part.transforms is None:
+            ob = bpy.data.objects.new(part.name, mesh)
+            bpy.context.collection.objects.link(ob)
+            return ob
+        copies = []
+        for k, transform in enumerate(part.transforms):
+            ob = bpy.data.objects.new(f"{part.name}_copy{k}", mesh)
+            ob.matrix_world = transform.T.tolist() # mathutils matrices are given by columns
+            bpy.context.collection.objects.link(ob)
+            copies.append(ob)
+        return copies[0]
 
 
     def addAtom(self, atom):
@@ -133,7 +575,7 @@ class PDBConverter():
         element = atom["element"]
         radius = self.atomProperties.atoms[element]["RadiusUsed"]
         # Create mesh and locate it
-        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=6, radius=radius, location=(atom["x"], atom["y"], atom["z"]))
+        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=self.subdivisions, radius=radius, location=(atom["x"], atom["y"], atom["z"]))
 
         # Select `ob` and make it active
         ob = bpy.context.view_layer.objects.active
@@ -150,136 +592,32 @@ class PDBConverter():
             ob.data.materials.append(material)
 
 
-    def elementMaterial(self, element):
+    def elementMaterial(self, element, color=None):
         """
-        Check if `element` material was already done, if not create it.
+        Material of `element`, kept by the session between conversions. `color` defaults to
+        the element color, materials not named after an element (chains, surface) give it.
         """
-        mat = bpy.data.materials.get(element)
-        if not mat:
-            # create material
-            mat = bpy.data.materials.new(name=element)
-            mat.diffuse_color = self.atomProperties.atoms[element]["Color"]
-        return mat
+        return self.session.material(element, color if color is not None else self.atomProperties.atoms[element]["Color"])
 
 
 
 
 class BlenderPDBInit():
     def __init__(self, elementsPropertiesPath=None):
-        self.infoPath = "pdbvis/Atom_info.dat" if not elementsPropertiesPath else elementsPropertiesPath
-        # Data from each atom to be retrieved, each tuple has the property name
-        # (as in file), and the regex way to read the property
-        self.data = [
-            ("Number", r"\d+"),
-            ("Name", r"\w+"),
-            ("Short name", r"\w+"),
-            ("Color", ",".join([r"\d+[.]\d+"]*4)),
-            ("Diffuse intensity", r'\d+[.]\d+'),
-            ("Specular intensity", r'\d+[.]\d+'),
-            ("Specular hard", r'\d+'),
-            ("Traceable", r'\d+'),
-            ("Shadow receive", r'\d+'),
-            ("Shadow cast", r"\d+"),
-            ("Radius used", r"\d+[.]\d+"),
-            ("Radius covalent", r"\d+[.]\d+"),
-            ("Radius atomic", r"\d+[.]\d+"),
-            ("Charge state", r"(-)?\d+([.]\d+)?"),
-            ("Radius ionic", r"\d+[.]\d+"),
-        ]
+        self.infoPath = DEFAULT_ELEMENTS_PATH if not elementsPropertiesPath else elementsPropertiesPath
+        self.table = None
         self.atoms = {}
         self.readElementsProperties()
 
 
     def readElementsProperties(self):
         """
-        Read dat file with all atoms information, split by new line and/or 'Atom' phrase
-        """
-        info = [] # raw elements info
-        with open(self.infoPath) as f:
-            info = [item.replace('\n', '') for item in f.read().split('Atom')]
-
-        allMatch = []
-        # read all lines and extract data from each element
-        for s in info:
-            # if line is empty, skip it
-            if s.replace(' ', '') == "":
-                continue
-            matches = self.getMatches(self.data, s)
-            # if pattern wasnt succesful, try removing last two items
-            if len(matches) == 0:
-                matches = self.getMatches(self.data[:-2], s) # skip 'charge' and 'ioinc radius'
-                matches[0]["ChargeState"] = None
-                matches[0]["RadiusIonic"] = None
-
-            matches = self.transformMatches(matches[0]) # get dictionary from first list item
-            allMatch.append(matches) # add this atom results into main matches
-
-        # Create dictionary with all atoms info, keys are atoms symbols (e.g. 'Na')
-        self.atoms = {atom["ShortName"]: {key: atom[key] for key in atom.keys() if key != "ShortName"} for atom in allMatch}
-
-
-    def transformMatches(self, matches, asString=["Name", "ShortName"], asInt=["Number", "ChargeState"]):
-        """
-        Transform data types for each variable inside matches
-        """
-        # transform string into numeric data
-        for key in matches.keys():
-            if key in asString:
-                continue
-            # colors have four values separated by commas
-            if key == "Color":
-                nVal = [self.toNumeric(val) for val in matches[key].split(",")]
-            # atomic number and charge must be integers
-            elif key in asInt:
-                nVal = int(matches[key]) if matches[key] else matches[key]
-            else:
-                pastVal = matches[key]
-                nVal = self.toNumeric(matches[key]) if pastVal else pastVal
-            matches[key] = nVal # assign new value to dictionary position
-        return matches
-
-
-    def getMatches(self, fields, s):
-        """
-        Get matches from given fields and string
-        """
-        pattern = self.createPattern(fields) # create pattern to find
-        matches = self.getPatternInString(pattern, s) # get info with pattern
-        return matches
-
-
-    def createPattern(self, fields):
-        """
-        Create pattern based on all the properties to be readed by given regex
+        Get atoms information from the process wide element table, the dat file is only
+        parsed again when it changes
         """
-        toCamelCase = lambda name: "".join([word.capitalize() for word in name.replace(',', '').split(" ")])
-        patterns = ["\s*:\s*".join([dat[0], "(?P<" + toCamelCase(dat[0]) + ">" + dat[1] + ")"]) for dat in fields]
-        pattern = r'{}.*'.format("[\s\S]*" + "\s*".join(patterns))
-        return pattern
-
-
-    def getPatternInString(self, pattern, s):
-        """
-        Get given dictionary with pattern matches from given string
-        """
-        compiledPattern = re.compile(pattern)
-        matches = [m.groupdict() for m in compiledPattern.finditer(s)]
-        return matches
-
-
-    def toNumeric(self, value):
-        """
-        Convert string into float value if possible, otherwise return None or raise error
-        """
-        newVal = None
-        try:
-            newVal = float(value)
-        except ValueError:
-            newVal = None
-        except:
-            print("Unexpected error:", sys.exc_info()[0])
-            raise
-        return newVal
+        self.table = loadElementTable(self.infoPath)
+        # keys are atoms symbols (e.g. 'Na'), values are read-only dictionaries
+        self.atoms = self.table.atoms
 
 
 """
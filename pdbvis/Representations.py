@@ -0,0 +1,175 @@
+import numpy as np
+
+from .BuildMesh import (MeshPart, icoSphere, sphereBatch, sphereInstances, cylinderBatch, autoSubdivisions,
+                        buildAtomParts, buildBallAndStickParts, vertexNormals)
+from .Surface import molecularSurface
+from .Bonds import takeBonds
+
+TRACE_NAMES = (b"CA", b"P") # C-alpha of amino acids and phosphorus of nucleotides
+TRACE_RADIUS = 0.4 # Å, radius of the trace tube
+TRACE_MAX_GAP = 7.5 # Å, longer steps between consecutive trace atoms are chain breaks
+BEAD_MIN_RADIUS = 1.5 # Å
+SURFACE_SPACING = 3.0 # Å, surface grid spacing at level of detail 1, divided by the level
+SURFACE_COLOR = (0.8, 0.8, 0.8, 1.0)
+WATER = ("HOH", "WAT", "DOD")
+# coarse-grained models are colored by chain, chains share these colors cyclically
+PALETTE = [(0.12, 0.47, 0.71, 1.0), (1.0, 0.5, 0.05, 1.0), (0.17, 0.63, 0.17, 1.0), (0.84, 0.15, 0.16, 1.0),
+           (0.58, 0.4, 0.74, 1.0), (0.55, 0.34, 0.29, 1.0), (0.89, 0.47, 0.76, 1.0), (0.5, 0.5, 0.5, 1.0),
+           (0.74, 0.74, 0.13, 1.0), (0.09, 0.75, 0.81, 1.0)]
+
+
+def buildModelParts(mode, table, bonds, properties, subdivisions=None, normals=True, instanced=False, copies=1):
+    """
+    Return mesh parts of `table` atoms in representation `mode` (see `BuildMesh.MODES`).
+    `subdivisions` is the level of detail, `None` chooses it from the number of primitives
+    (times the `copies` of the parts shown). With `instanced`, spheres are returned as
+    instanced parts sharing one template.
+    """
+    if mode == "spheres":
+        return buildAtomParts(table, properties, subdivisions or autoSubdivisions(int(len(table) * copies)), normals,
+                              instanced=instanced)
+    if mode == "ballstick":
+        return buildBallAndStickParts(table, bonds, properties, subdivisions or autoSubdivisions(int(len(table) * copies)),
+                                      normals, instanced=instanced)
+    if mode == "trace":
+        return buildTraceParts(table, subdivisions, normals, copies)
+    if mode == "beads":
+        return buildBeadParts(table, subdivisions, normals, instanced, copies)
+    if mode == "surface":
+        return buildSurfaceParts(table, subdivisions, normals)
+    raise ValueError(f"Invalid mode {mode}")
+
+
+def buildAssemblyParts(mode, table, bonds, properties, assembly, subdivisions=None, normals=True, instanced=False):
+    """
+    Return mesh parts of the `assembly` built from `table` atoms: parts are built once per
+    group of chains and placed at each copy by their `transforms`, atoms aren't copied.
+    Automatic level of detail counts the primitives of every copy.
+    """
+    groups = assembly.atomGroups(table)
+    total = sum(len(indices) * len(transforms) for indices, transforms in groups) # atoms shown
+    parts = []
+    for k, (indices, transforms) in enumerate(groups):
+        groupParts = buildModelParts(mode, table.take(indices), takeBonds(bonds, indices, len(table)), properties,
+                                     subdivisions, normals, instanced, copies=total / len(indices))
+        for part in groupParts:
+            if len(groups) > 1:
+                part.name = f"{part.name}_{k}"
+            part.transforms = transforms
+        parts += groupParts
+    return parts
+
+
+def withoutWater(table):
+    """
+    Return `table` without water molecules
+    """
+    water = [code for code, name in enumerate(table.resName.categories) if name in WATER]
+    return table.take(~np.isin(table.resName.codes, water)) if water else table
+
+
+def traceAtoms(table):
+    """
+    Return indices of the backbone trace atoms (C-alpha and phosphorus) of polymer residues
+    """
+    return np.flatnonzero(np.isin(table.name, TRACE_NAMES) & ~table.hetero)
+
+
+def residueBeads(table):
+    """
+    One bead per residue, atoms of a residue are consecutive in the table. Return (centers,
+    radii, chain code of each bead), radius is the residue radius of gyration.
+    """
+    if not len(table):
+        return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.uint16)
+    chain = table.chainID.codes
+    change = (chain[1:] != chain[:-1]) | (table.resSeq[1:] != table.resSeq[:-1]) | (table.iCode[1:] != table.iCode[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    counts = np.diff(np.append(starts, len(table)))[:, None]
+    coords = table.coords.astype(np.float64)
+    centers = np.add.reduceat(coords, starts) / counts
+    spread = np.add.reduceat((coords ** 2).sum(axis=1), starts) / counts[:, 0] - (centers ** 2).sum(axis=1)
+    radii = np.maximum(np.sqrt(np.maximum(spread, 0)), BEAD_MIN_RADIUS)
+    return centers.astype(np.float32), radii.astype(np.float32), chain[starts]
+
+
+def mergeMeshes(meshes):
+    """
+    Join (vertices, faces, normals) meshes into one
+    """
+    meshes = [mesh for mesh in meshes if len(mesh[0])]
+    if not meshes:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32), np.empty((0, 3), dtype=np.float32)
+    offsets = np.cumsum([0] + [len(verts) for verts, _, _ in meshes[:-1]])
+    return (np.concatenate([verts for verts, _, _ in meshes]),
+            np.concatenate([faces + np.uint32(offset) for (_, faces, _), offset in zip(meshes, offsets)]),
+            np.concatenate([normals for _, _, normals in meshes]))
+
+
+def chainParts(name, chains, build, normals=True):
+    """
+    One `MeshPart` per palette color, `build(mask)` returns (vertices, faces, normals) of the
+    primitives whose `chains` code has that color
+    """
+    parts = []
+    for k, color in enumerate(PALETTE):
+        selected = chains % len(PALETTE) == k
+        if not selected.any():
+            continue
+        verts, faces, partNormals = build(selected)
+        if len(verts):
+            parts.append(MeshPart(f"{name}_{k}", f"Chain_{k}", color, verts, faces, partNormals if normals else None))
+    return parts
+
+
+def sphereMesh(centers, radius, subdivisions):
+    """
+    Spheres as (vertices, faces, normals)
+    """
+    verts, faces = sphereBatch(centers, radius, subdivisions)
+    return verts, faces, np.tile(icoSphere(subdivisions)[0], (len(centers), 1))
+
+
+def buildTraceParts(table, subdivisions=None, normals=True, copies=1):
+    """
+    Backbone trace: a tube through consecutive C-alpha (or phosphorus) atoms of each chain
+    """
+    index = traceAtoms(table)
+    coords = table.coords[index]
+    chains = table.chainID.codes[index]
+    subdivisions = subdivisions or autoSubdivisions(int(len(index) * copies))
+    segments = 4 + 2 * subdivisions
+    # link consecutive trace atoms of the same chain, unless there's a gap between them
+    steps = np.linalg.norm(np.diff(coords, axis=0), axis=1)
+    links = np.flatnonzero((chains[1:] == chains[:-1]) & (steps <= TRACE_MAX_GAP))
+
+    def build(selected):
+        tubes = links[selected[links]]
+        return mergeMeshes([sphereMesh(coords[selected], TRACE_RADIUS, subdivisions),
+                            cylinderBatch(coords[tubes], coords[tubes + 1], TRACE_RADIUS, segments)])
+    return chainParts("Trace", chains, build, normals)
+
+
+def buildBeadParts(table, subdivisions=None, normals=True, instanced=False, copies=1):
+    """
+    One sphere per residue at its center, water left out
+    """
+    centers, radii, chains = residueBeads(withoutWater(table))
+    subdivisions = subdivisions or autoSubdivisions(int(len(centers) * copies))
+    if instanced:
+        return [sphereInstances(f"Beads_{k}", f"Chain_{k}", color, centers[selected], radii[selected], subdivisions)
+                for k, color in enumerate(PALETTE) for selected in [chains % len(PALETTE) == k] if selected.any()]
+    build = lambda selected: sphereMesh(centers[selected], radii[selected], subdivisions)
+    return chainParts("Beads", chains, build, normals)
+
+
+def buildSurfaceParts(table, subdivisions=None, normals=True):
+    """
+    Molecular surface of every atom but water, `subdivisions` sets the grid spacing
+    (`SURFACE_SPACING` / subdivisions), automatic spacing is the finest one in budget
+    """
+    spacing = SURFACE_SPACING / subdivisions if subdivisions else None
+    verts, faces = molecularSurface(withoutWater(table).coords, spacing)
+    if not len(faces):
+        return []
+    return [MeshPart("Surface", "Surface", SURFACE_COLOR, verts, faces, vertexNormals(verts, faces) if normals else None)]
@@ -0,0 +1,141 @@
+import re
+import numpy as np
+
+from .Bonds import SpatialGrid
+
+MIN_CELL_SIZE = 1.0 # Å, grid cells of radius selections are never smaller
+RESSEQ_RANGE = re.compile(r"^(-?\d+)(?:-(-?\d+))?$")
+RESIDUE = re.compile(r"^(?:(\w+):)?(-?\d+)$")
+
+
+class EmptySelection(ValueError):
+    pass
+
+
+class Selection():
+    """
+    Atoms kept from a structure before converting it. Filters are combined with AND, each
+    one matches any of its values:
+    `chains` chain IDs, `resNames` residue names, `resSeq` (first, last) residue number
+    ranges, `elements` element symbols, `within` radius (Å) around a `point` (x, y, z) or
+    around the atoms of a `residue` (chain ID or `None`, residue number), `box` (lowest,
+    highest corner) with atoms from the lowest corner up to the highest one excluded.
+    """
+    def __init__(self, chains=(), resNames=(), resSeq=(), elements=(), within=None, point=None, residue=None, box=None):
+        self.chains = sorted(set(chains))
+        self.resNames = sorted(set(name.upper() for name in resNames))
+        self.resSeq = sorted(set(tuple(span) for span in resSeq))
+        self.elements = sorted(set(element.capitalize() for element in elements))
+        self.within = within
+        self.point = tuple(point) if point is not None else None
+        self.residue = tuple(residue) if residue is not None else None
+        self.box = tuple(tuple(float(v) for v in corner) for corner in box) if box is not None else None
+        if box is not None and (len(self.box) != 2 or any(len(corner) != 3 for corner in self.box)
+                                or not all(low < high for low, high in zip(*self.box))):
+            raise ValueError("Box must be given by its lowest and highest corners")
+        if within is not None and not (0 < within < np.inf):
+            raise ValueError("Selection radius must be a positive number")
+        if (point is None) == (residue is None) and (within is not None or point is not None):
+            raise ValueError("A selection radius needs either a point or a residue around it")
+        if within is None and (point is not None or residue is not None):
+            raise ValueError("A point or residue selection needs a radius (within)")
+
+
+    @classmethod
+    def fromQuery(cls, query):
+        """
+        Selection given by query parameters `chain`, `resname`, `resseq` (numbers and ranges
+        like `10-50`), `element` (comma separated lists), `within` radius with `point=x,y,z`
+        or `residue=[chain:]number` and `box=x0,y0,z0,x1,y1,z1`. Return `None` when there's no selection parameter, raise
+        `ValueError` on invalid values.
+        """
+        values = lambda name: [value.strip() for value in query.get(name, "").split(",") if value.strip()]
+        kwargs = {"chains": values("chain"), "resNames": values("resname"), "elements": values("element")}
+        for span in values("resseq"):
+            match = RESSEQ_RANGE.match(span)
+            if not match:
+                raise ValueError(f"Invalid residue range {span}")
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else first
+            kwargs.setdefault("resSeq", []).append((min(first, last), max(first, last)))
+        if query.get("within"):
+            kwargs["within"] = float(query["within"])
+        if query.get("point"):
+            point = [float(value) for value in query["point"].split(",")]
+            if len(point) != 3:
+                raise ValueError("Point must be given as x,y,z")
+            kwargs["point"] = point
+        if query.get("residue"):
+            match = RESIDUE.match(query["residue"].strip())
+            if not match:
+                raise ValueError(f"Invalid residue {query['residue']}, must be [chain:]number")
+            kwargs["residue"] = (match.group(1), int(match.group(2)))
+        if query.get("box"):
+            corners = [float(value) for value in query["box"].split(",")]
+            if len(corners) != 6:
+                raise ValueError("Box must be given as x0,y0,z0,x1,y1,z1")
+            kwargs["box"] = (corners[:3], corners[3:])
+        selection = cls(**kwargs)
+        return selection if selection.params() else None
+
+
+    def params(self):
+        """
+        Selection as a JSON-able dictionary in canonical order, part of the cache key of
+        converted models. `Selection(**params)` builds it again.
+        """
+        params = {"chains": self.chains, "resNames": self.resNames, "resSeq": [list(span) for span in self.resSeq],
+                  "elements": self.elements, "within": self.within, "point": self.point and list(self.point),
+                  "residue": self.residue and list(self.residue), "box": self.box and [list(corner) for corner in self.box]}
+        return {key: value for key, value in params.items() if value}
+
+
+    def mask(self, table):
+        """
+        Boolean mask of the `table` atoms selected. Chain, residue name and element filters
+        compare the categorical codes, radius selections look around the centers in a
+        `SpatialGrid` of the atoms passing the other filters only.
+        """
+        mask = np.ones(len(table), dtype=bool)
+        for column, values in ((table.chainID, self.chains), (table.resName, self.resNames), (table.element, self.elements)):
+            if values:
+                mask &= np.isin(column.codes, [column.codeOf(value) for value in values])
+        if self.resSeq:
+            inside = np.zeros(len(table), dtype=bool)
+            for first, last in self.resSeq:
+                inside |= (table.resSeq >= first) & (table.resSeq <= last)
+            mask &= inside
+        if self.box is not None:
+            low, high = np.array(self.box)
+            mask &= ((table.coords >= low) & (table.coords < high)).all(axis=1)
+        if self.within is not None and mask.any():
+            candidates = np.flatnonzero(mask)
+            grid = SpatialGrid(table.coords[candidates], max(self.within, MIN_CELL_SIZE))
+            mask[:] = False
+            mask[candidates[grid.within(self.centers(table), self.within)]] = True
+        return mask
+
+
+    def centers(self, table):
+        """
+        Points the radius selection is measured from
+        """
+        if self.point is not None:
+            return np.array([self.point], dtype=np.float32)
+        chain, number = self.residue
+        atoms = table.resSeq == number
+        if chain is not None:
+            atoms &= table.chainID.codes == table.chainID.codeOf(chain)
+        if not atoms.any():
+            raise EmptySelection(f"Residue {chain + ':' if chain else ''}{number} not found")
+        return table.coords[atoms]
+
+
+    def indices(self, table):
+        """
+        Indices of the `table` atoms selected, raise `EmptySelection` if there's none
+        """
+        selected = np.flatnonzero(self.mask(table))
+        if not len(selected):
+            raise EmptySelection("Selection matches no atoms")
+        return selected
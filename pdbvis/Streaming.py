@@ -0,0 +1,196 @@
+import os
+import re
+import zlib
+import hashlib
+import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_SIZE = 1 << 18 # bytes read and sent at once
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # on the fly compression, higher levels are too slow for large models
+# precompressed variants are written once per artifact, so they use higher levels
+PRECOMPRESS_LEVELS = {"gzip": 9, "br": 9}
+VARIANT_EXTENSIONS = {"br": ".br", "gzip": ".gz"} # in preference order
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+QVALUE = re.compile(r"^q=(0(?:\.\d{0,3})?|1(?:\.0{0,3})?)$", re.IGNORECASE) # RFC 7231 weight
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def fileETag(path):
+    """
+    Strong ETag of the file at `path`. Cached artifacts are named after their content hash so
+    it's read from the name, other files are hashed.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    if not re.fullmatch(r"[0-9a-f]{64}", name):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        name = digest.hexdigest()
+    return f'"{name}"'
+
+
+def tagValue(tag):
+    """
+    Content hash of an ETag, weak and compressed variant tags ("<hash>-gzip") give the hash
+    of their source so they're compared weakly
+    """
+    return tag.strip().replace("W/", "", 1).strip('"').split("-")[0]
+
+
+def lastModified(path):
+    return formatdate(os.path.getmtime(path), usegmt=True)
+
+
+def notModified(headers, etag, mtime):
+    """
+    Return if a conditional GET with request `headers` can be answered with 304 Not Modified.
+    If-None-Match takes precedence over If-Modified-Since as in RFC 7232.
+    """
+    match = headers.get("If-None-Match")
+    if match is not None:
+        tags = [tag.strip() for tag in match.split(",")]
+        return "*" in tags or any(tagValue(tag) == tagValue(etag) for tag in tags)
+    since = headers.get("If-Modified-Since")
+    if since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parseRange(header, size):
+    """
+    Return (start, end) byte range (end included) asked by a `Range` header for a file of
+    `size` bytes, `None` to send the whole file (no header, several ranges or another unit).
+    Raise `RangeNotSatisfiable` when the range is outside the file.
+    """
+    if not header:
+        return None
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range, the last `last` bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(f"bytes */{size}")
+    return start, end
+
+
+def acceptedEncodings(header):
+    """
+    Return compressions accepted by an `Accept-Encoding` header in preference order, among
+    "br" and "gzip"
+    """
+    accepted = {}
+    for item in (header or "").split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            param = param.strip()
+            if param[:2].lower() == "q=":
+                match = QVALUE.match(param)
+                # a malformed weight isn't trusted, the coding isn't used
+                quality = float(match.group(1)) if match else 0.0
+        accepted[name.strip().lower()] = quality
+    return [encoding for encoding in VARIANT_EXTENSIONS if accepted.get(encoding, accepted.get("*", 0)) > 0]
+
+
+def availableEncodings():
+    """
+    Compressions that can be applied here, brotli needs its optional module
+    """
+    return [encoding for encoding in VARIANT_EXTENSIONS if encoding != "br" or brotli]
+
+
+def chooseEncoding(header, variants=()):
+    """
+    Return (encoding, precompressed) to send for an `Accept-Encoding` header: an accepted
+    precompressed variant among `variants` first, else one compressed on the fly, else
+    (`None`, False) for the identity
+    """
+    accepted = acceptedEncodings(header)
+    for encoding in accepted:
+        if encoding in variants:
+            return encoding, True
+    for encoding in accepted:
+        if encoding in availableEncodings():
+            return encoding, False
+    return None, False
+
+
+def fileChunks(path, start=0, end=None, chunkSize=CHUNK_SIZE):
+    """
+    Yield bytes `start` to `end` (included, whole file by default) of the file at `path`
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = (end + 1 - start) if end is not None else None
+        while remaining is None or remaining > 0:
+            block = f.read(chunkSize if remaining is None else min(chunkSize, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+
+
+def compressChunks(chunks, encoding, level=None):
+    """
+    Compress a stream of `chunks` with `encoding` ("gzip" or "br") as they're sent
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level or BROTLI_QUALITY)
+        compress, flush = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level or GZIP_LEVEL, zlib.DEFLATED, 31) # 31: gzip header and trailer
+        compress, flush = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield flush()
+
+
+def variantPath(path, encoding):
+    """
+    Path of the precompressed variant of file `path`
+    """
+    return path + VARIANT_EXTENSIONS[encoding]
+
+
+def writeVariants(path):
+    """
+    Write every available precompressed variant of file `path` next to it, unless it's already
+    there. Return their paths by encoding.
+    """
+    variants = {}
+    for encoding in availableEncodings():
+        variant = variantPath(path, encoding)
+        if not os.path.exists(variant):
+            # own temporary file, builds of the same content can write its variants at once
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(variant) + ".", suffix=".tmp", dir=os.path.dirname(variant))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in compressChunks(fileChunks(path), encoding, PRECOMPRESS_LEVELS[encoding]):
+                        f.write(chunk)
+                os.replace(tmp, variant)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        variants[encoding] = variant
+    return variants
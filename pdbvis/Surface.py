@@ -0,0 +1,145 @@
+import itertools
+import numpy as np
+
+ATOM_RADIUS = 1.7 # Å, same for every atom, about the van der Waals radius of carbon
+BLOBBINESS = 2.0 # how much atoms melt together in the density, higher is closer to spheres
+CUTOFF = 0.01 # density contributions below it are left out
+MIN_SPACING = 0.5 # Å
+VOXEL_BUDGET = 1 << 24 # grid points at most, spacing grows for larger structures
+SPLAT_BLOCK = 1 << 23 # atom and grid point pairs added at once
+# corners of a cube as (dx, dy, dz), corner index is dx + 2 dy + 4 dz
+CUBE_CORNERS = np.array([(i & 1, (i >> 1) & 1, (i >> 2) & 1) for i in range(8)])
+# six tetrahedra around the 0-7 diagonal, neighbour cubes split shared faces the same way
+TETRAHEDRA = [(0, 1, 3, 7), (0, 3, 2, 7), (0, 2, 6, 7), (0, 6, 4, 7), (0, 4, 5, 7), (0, 5, 1, 7)]
+
+
+def tetrahedronCases():
+    """
+    Triangles cutting a tetrahedron for each of the 16 inside/outside cases (bit i set when
+    vertex i is inside), each triangle given by the three edges (vertex pairs) it crosses
+    """
+    cases = []
+    for case in range(16):
+        inside = [v for v in range(4) if case >> v & 1]
+        outside = [v for v in range(4) if not case >> v & 1]
+        if len(inside) in (0, 4):
+            cases.append([])
+        elif len(inside) in (1, 3):
+            # a single vertex on one side, one triangle around it
+            single, others = (inside[0], outside) if len(inside) == 1 else (outside[0], inside)
+            cases.append([[(single, other) for other in others]])
+        else:
+            # a quad between both pairs of vertices, as two triangles
+            (v, w), (a, b) = inside, outside
+            cases.append([[(v, a), (v, b), (w, b)], [(v, a), (w, b), (w, a)]])
+    return cases
+
+
+TETRAHEDRON_CASES = tetrahedronCases()
+
+
+def gaussianDensity(coords, spacing, radius=ATOM_RADIUS, blobbiness=BLOBBINESS):
+    """
+    Sum of one gaussian per atom sampled on a grid of `spacing`, equal to 1 at `radius` from an
+    isolated atom. Return (density grid, grid origin).
+    """
+    coords = np.asarray(coords, dtype=np.float32)
+    # contributions are cut where exp(-blobbiness (d²/r² - 1)) < CUTOFF
+    reach = radius * np.sqrt(1 - np.log(CUTOFF) / blobbiness)
+    origin = coords.min(axis=0) - reach - spacing
+    shape = np.ceil((coords.max(axis=0) + reach + spacing - origin) / spacing).astype(np.int64) + 1
+    density = np.zeros(int(np.prod(shape)), dtype=np.float32)
+    # grid points around an atom, relative to its nearest grid point
+    steps = int(np.ceil(reach / spacing))
+    stencil = np.array(list(itertools.product(range(-steps, steps + 1), repeat=3)))
+    stencil = stencil[np.linalg.norm(stencil, axis=1) * spacing <= reach + spacing]
+    strides = np.array([shape[1] * shape[2], shape[2], 1])
+    block = max(1, SPLAT_BLOCK // len(stencil))
+    for start in range(0, len(coords), block):
+        atoms = coords[start:start + block]
+        nearest = np.rint((atoms - origin) / spacing).astype(np.int64)
+        points = nearest[:, None, :] + stencil
+        distance2 = (((points * spacing + origin) - atoms[:, None, :]) ** 2).sum(axis=2)
+        weights = np.exp(-blobbiness * (distance2 / radius**2 - 1))
+        weights[distance2 > reach**2] = 0
+        density += np.bincount((points @ strides).ravel(), weights.ravel(), minlength=len(density)).astype(np.float32)
+    return density.reshape(shape), origin
+
+
+def surfaceSpacing(coords, spacing=None, radius=ATOM_RADIUS):
+    """
+    Grid spacing for `coords`, the requested one (or `MIN_SPACING`) grown until the grid fits
+    in `VOXEL_BUDGET` points
+    """
+    spacing = spacing or MIN_SPACING
+    if not len(coords):
+        return spacing
+    size = np.ptp(coords, axis=0) + 4 * radius
+    return max(spacing, float(np.cbrt(np.prod(size) / VOXEL_BUDGET)))
+
+
+def marchingTetrahedra(field, level, origin=(0, 0, 0), spacing=1.0):
+    """
+    Triangulate the `level` isosurface of a 3D `field`, splitting each grid cube in six
+    tetrahedra. Vertices on shared edges are merged so the mesh is closed. Triangles face
+    away from the region where the field is above `level`. Return (vertices, faces).
+    """
+    inside = field > level
+    nx, ny, nz = field.shape
+    # cubes with corners on both sides of the surface
+    corners = [inside[dx:nx - 1 + dx, dy:ny - 1 + dy, dz:nz - 1 + dz] for dx, dy, dz in CUBE_CORNERS]
+    anyInside = np.logical_or.reduce(corners)
+    allInside = np.logical_and.reduce(corners)
+    cubes = np.argwhere(anyInside & ~allInside)
+    if not len(cubes):
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32)
+    strides = np.array([ny * nz, nz, 1])
+    flatField = field.ravel()
+    # flat grid index of the 8 corners of each active cube
+    cornerIndex = (cubes[:, None, :] + CUBE_CORNERS) @ strides
+    edgeKeys, edgeEnds = [], []
+    for tetra in TETRAHEDRA:
+        index = cornerIndex[:, tetra]
+        case = (flatField[index] > level) @ (1 << np.arange(4))
+        for code in range(1, 15):
+            selected = index[case == code]
+            if not len(selected):
+                continue
+            insideVertex = selected[:, int(np.log2(code & -code))] # any inside vertex of the case
+            for triangle in TETRAHEDRON_CASES[code]:
+                edges = np.stack([np.sort(selected[:, list(edge)], axis=1) for edge in triangle], axis=1)
+                edgeKeys.append(edges)
+                edgeEnds.append(insideVertex)
+    edges = np.concatenate(edgeKeys) # (T, 3, 2) grid points of the edge under each triangle corner
+    insideVertex = np.concatenate(edgeEnds)
+
+    # one vertex per crossed grid edge
+    keys = edges[..., 0] * flatField.size + edges[..., 1]
+    unique, inverse = np.unique(keys.ravel(), return_inverse=True)
+    a, b = unique // flatField.size, unique % flatField.size
+    t = ((level - flatField[a]) / (flatField[b] - flatField[a]))[:, None]
+    pointA = np.column_stack(np.unravel_index(a, field.shape)).astype(np.float32)
+    pointB = np.column_stack(np.unravel_index(b, field.shape)).astype(np.float32)
+    verts = (pointA + t * (pointB - pointA)) * np.float32(spacing) + np.asarray(origin, dtype=np.float32)
+    faces = inverse.reshape(-1, 3).astype(np.uint32)
+
+    # orient triangles away from the inside vertex of their tetrahedron
+    tri = verts[faces]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    insidePoint = np.column_stack(np.unravel_index(insideVertex, field.shape)) * np.float32(spacing) + origin
+    flip = np.einsum("ij,ij->i", normal, tri.mean(axis=1) - insidePoint) < 0
+    faces[flip] = faces[flip][:, ::-1]
+    # drop triangles collapsed on a grid point (field exactly at `level`)
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return verts.astype(np.float32), faces[keep]
+
+
+def molecularSurface(coords, spacing=None, radius=ATOM_RADIUS):
+    """
+    Gaussian molecular surface of atoms at `coords`. Return (vertices, faces).
+    """
+    spacing = surfaceSpacing(coords, spacing, radius)
+    if not len(coords):
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32)
+    density, origin = gaussianDensity(coords, spacing, radius)
+    return marchingTetrahedra(density, 1.0, origin, spacing)
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import numpy as np
+
+from .ReadPDB import PDBReader
+from .Parsers import isStructureFile
+from .BuildMesh import MIN_SUBDIVISIONS, MODES, autoSubdivisions
+from .Selection import Selection
+from .Metrics import stage
+
+SPLITS = ("octree", "chains") # ways of splitting atoms into tiles
+TILE_ATOMS = 20000 # default atoms of an octree tile at most, outside django (see `PDBVIS_TILE_ATOMS`)
+MAX_DEPTH = 8 # octree levels, deeper cells are tiles whatever their atoms
+BOX_MARGIN = 0.01 # Å added to the root box, cells exclude their highest corner
+PADDING = 2.0 # Å around atom centers in tile bounds, about the largest atom shown
+# coarse model of every atom clients load first, before refining with tiles
+OVERVIEW = {"id": "overview", "mode": "beads", "lod": MIN_SUBDIVISIONS}
+TILE_ID = re.compile(r"^(overview|t[0-7]{0,8}|c\d{1,5})$")
+
+
+def octreeTiles(coords, maxAtoms=TILE_ATOMS, maxDepth=MAX_DEPTH):
+    """
+    Split atoms at `coords` into octree cells of `maxAtoms` atoms at most. Return (key,
+    lowest corner, highest corner, atom indices) of the non-empty leaves in key order, keys
+    are `t` followed by the octant (0-7) taken at each level.
+    """
+    low = coords.min(axis=0).astype(np.float64)
+    high = coords.max(axis=0).astype(np.float64) + BOX_MARGIN
+    leaves = []
+    cells = [("t", low, high, np.arange(len(coords)))]
+    while cells:
+        key, low, high, indices = cells.pop()
+        if len(indices) <= maxAtoms or len(key) > maxDepth:
+            leaves.append((key, low, high, indices))
+            continue
+        center = (low + high) / 2
+        octants = (coords[indices] >= center) @ np.array([1, 2, 4])
+        for octant in range(8):
+            upper = np.array([octant & 1, octant & 2, octant & 4], dtype=bool)
+            inside = indices[octants == octant]
+            if len(inside):
+                cells.append((f"{key}{octant}", np.where(upper, center, low), np.where(upper, high, center), inside))
+    return sorted(leaves, key=lambda leaf: leaf[0])
+
+
+def tileBounds(coords):
+    """
+    Bounding box of atoms at `coords` as [lowest corner, highest corner] lists
+    """
+    return [[round(float(v), 3) for v in coords.min(axis=0) - PADDING],
+            [round(float(v), 3) for v in coords.max(axis=0) + PADDING]]
+
+
+def findTile(manifest, tileID):
+    """
+    Entry of tile `tileID` in a tile `manifest`, `None` if there's no such tile
+    """
+    if tileID == OVERVIEW["id"]:
+        return manifest["overview"]
+    return next((tile for tile in manifest["tiles"] if tile["id"] == tileID), None)
+
+
+# Split a structure into tiles loaded one by one, written as a JSON tile manifest
+class TileConverter():
+    VERSION = 1 # part of cached models build manifest, increase when the output changes
+
+    def __init__(self, input, output, subdivisions=None, mode="spheres", split="octree", tileAtoms=None):
+        splitInput = re.split(r"/|\\", input)
+        self.inputPath = "/".join(splitInput[:-1]) # input file path
+        self.inputName = splitInput[-1] # input file name
+        self.output = output
+        self.subdivisions = subdivisions # level of detail of every tile loaded together
+        self.mode = mode # one of `MODES`, tiles are converted with it
+        self.split = split # one of `SPLITS`
+        self.tileAtoms = tileAtoms or TILE_ATOMS # atoms of an octree tile at most
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode {mode}, must be one of: {', '.join(MODES)}")
+        if split not in SPLITS:
+            raise ValueError(f"Invalid split {split}, must be one of: {', '.join(SPLITS)}")
+        if not isStructureFile(self.inputName):
+            raise ValueError("Invalid input file given. File must be a valid PDB, mmCIF or BinaryCIF file")
+        self.main()
+
+
+    def main(self):
+        """
+        Read the atoms, split them into tiles and write the manifest
+        """
+        table = PDBReader(os.path.join(self.inputPath, self.inputName)).table
+        with stage("tiles") as info:
+            manifest = self.createManifest(table)
+            info["atoms"] = len(table)
+        with stage("export") as info:
+            with open(self.output, "w") as f:
+                json.dump(manifest, f)
+            info["bytes"] = os.path.getsize(self.output)
+
+
+    def createManifest(self, table):
+        """
+        Tile manifest of `table` atoms: bounds, atoms and levels of detail of the overview
+        and of every tile, with the `Selection` (as parameters) giving its atoms. `lod` is
+        the level showing every tile together within the triangle budget, `lods` of a tile
+        go up to the level it can be shown at on its own.
+        """
+        tiles = []
+        if self.split == "octree":
+            for key, low, high, indices in octreeTiles(table.coords, self.tileAtoms):
+                tiles.append(self.tile(key, table.coords[indices], Selection(box=(low, high))))
+        else:
+            for code, chain in enumerate(table.chainID.categories):
+                indices = np.flatnonzero(table.chainID.codes == code)
+                if len(indices):
+                    tiles.append({**self.tile(f"c{code}", table.coords[indices], Selection(chains=[chain])), "chain": chain})
+        bounds = tileBounds(table.coords)
+        return {"name": self.inputName, "mode": self.mode, "split": self.split, "atoms": len(table), "bounds": bounds,
+                "lod": self.subdivisions or autoSubdivisions(len(table)),
+                "overview": {**OVERVIEW, "atoms": len(table), "bounds": bounds}, "tiles": tiles}
+
+
+    def tile(self, key, coords, selection):
+        return {"id": key, "atoms": len(coords), "bounds": tileBounds(coords),
+                "lods": list(range(MIN_SUBDIVISIONS, autoSubdivisions(len(coords)) + 1)), "selection": selection.params()}
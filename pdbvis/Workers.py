@@ -0,0 +1,13 @@
+import sys
+
+import django
+
+
+def initWorker(blenderPaths=()):
+    """
+    Set up a spawned pool process: drop `blenderPaths` (see `BlenderSession.BLENDER_PATHS`) from
+    the sys.path copied from the parent so `bpy` imports again, then set up django. This
+    module doesn't import blender since it's imported before the initializer runs.
+    """
+    sys.path[:] = [path for path in sys.path if path not in blenderPaths]
+    django.setup()
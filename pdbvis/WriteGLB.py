@@ -0,0 +1,302 @@
+import re
+import os
+import json
+import struct
+import numpy as np
+
+from .ReadPDB import PDBReader, BlenderPDBInit
+from .Parsers import isStructureFile
+from .BuildMesh import MODES, vertexNormals
+from .Representations import buildModelParts, buildAssemblyParts
+from .Metrics import stage
+
+GLB_MAGIC = 0x46546C67 # 'glTF'
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+FLOAT = 5126
+BYTE = 5120
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}
+QUANTIZATION = "KHR_mesh_quantization"
+INSTANCING = "EXT_mesh_gpu_instancing"
+# glTF is Y up, PDB coordinates are treated as Z up like blender does (-90° around X)
+Z_UP_ROTATION = [-np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)]
+
+
+# Convert from PDB to binary glTF without blender
+class GLBConverter():
+    VERSION = 1 # part of cached models build manifest, increase when the output changes
+
+    def __init__(self, input, output, subdivisions=None, mode="spheres", frame=0, quantized=False, selection=None,
+                 assembly=None):
+        splitInput = re.split(r"/|\\", input)
+        self.inputPath = "/".join(splitInput[:-1]) # input file path
+        self.inputName = splitInput[-1] # input file name
+        splitOutput = re.split(r"/|\\", output)
+        self.outputPath = "/".join(splitOutput[:-1]) # output file path
+        self.outputName = splitOutput[-1] # output file name
+        self.subdivisions = subdivisions # level of detail, `None` chooses it from the number of primitives
+        self.mode = mode # one of `MODES`
+        self.frame = frame # model of multi-model files exported, starting at 0
+        self.quantized = quantized # 16 bit positions, 8 bit normals and instanced spheres
+        self.selection = selection # `Selection` of the atoms converted, all of them when `None`
+        self.assembly = assembly # name of the assembly built, the asymmetric unit when `None`
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode {mode}, must be one of: {', '.join(MODES)}")
+        with stage("elements"):
+            self.atomProperties = BlenderPDBInit() # init atom properties with default path
+        self.parts = []
+        self.main() # call main method
+
+
+    def main(self):
+        """
+        Check paths, build sphere geometry from PDB file and write it as GLB
+        """
+        self.checkPaths()
+        self.createModel()
+        self.exportModel()
+
+
+    def checkPaths(self):
+        """
+        Check if given path (input and output) are valid ones (structure file and .glb)
+        """
+        if not isStructureFile(self.inputName):
+            raise ValueError("Invalid input file given. File must be a valid PDB, mmCIF or BinaryCIF file")
+        splitName = self.outputName.split('.')
+        if splitName[-1] != 'glb' or len(splitName) != 2:
+            raise ValueError("Invalid output file given. File must have a GLB extension or delete dots inside it")
+
+
+    def createModel(self):
+        """
+        Read PDB file using `PDBReader` and build the mesh parts of the converter mode
+        """
+        reader = PDBReader(os.path.join(self.inputPath, self.inputName), readBonds=self.mode == "ballstick", frame=self.frame,
+                           selection=self.selection, assembly=self.assembly)
+        with stage("mesh") as info:
+            if reader.assembly is not None:
+                self.parts = buildAssemblyParts(self.mode, reader.table, reader.bonds, self.atomProperties.atoms,
+                                                reader.assembly, self.subdivisions, instanced=self.quantized)
+            else:
+                self.parts = buildModelParts(self.mode, reader.table, reader.bonds, self.atomProperties.atoms,
+                                             self.subdivisions, instanced=self.quantized)
+            info["atoms"], info["triangles"] = len(reader.table), sum(len(part.indices) for part in self.parts)
+
+
+    def exportModel(self):
+        path = os.path.join(self.outputPath, self.outputName)
+        with stage("export") as info:
+            writeGLB(path, self.parts, quantized=self.quantized)
+            info["bytes"] = os.path.getsize(path)
+
+
+class GLBBuilder():
+    """
+    Collect glTF JSON entries and the binary buffer they point to
+    """
+    def __init__(self):
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": "PDBVis"},
+            "scene": 0, "scenes": [{"nodes": []}], "nodes": [], "meshes": [],
+            "materials": [], "accessors": [], "bufferViews": [], "buffers": [],
+        }
+        self.chunks = []
+        self.length = 0
+        self.materials = {}
+        self.extensions = set() # extensions used, all of them are required
+
+
+    def addBufferView(self, data, target=None, byteStride=None):
+        """
+        Append raw bytes of `data` to the binary buffer (4 bytes aligned), return view index
+        """
+        data = np.ascontiguousarray(data)
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": data.nbytes}
+        if target:
+            view["target"] = target
+        if byteStride:
+            view["byteStride"] = byteStride
+        self.chunks.append(data.tobytes())
+        self.length += data.nbytes
+        padding = -self.length % 4
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.length += padding
+        self.gltf["bufferViews"].append(view)
+        return len(self.gltf["bufferViews"]) - 1
+
+
+    def addAccessor(self, data, componentType, type, target=None, bounds=False, normalized=False):
+        """
+        Store `data` in a new buffer view and return index of an accessor describing it. Rows
+        longer than `type` are padding keeping vertex attributes 4 bytes aligned.
+        """
+        data = np.asarray(data)
+        padded = data.ndim == 2 and data.shape[1] > COMPONENTS[type]
+        accessor = {"bufferView": self.addBufferView(data, target, data.strides[0] if padded else None),
+                    "componentType": componentType, "count": len(data), "type": type}
+        if bounds:
+            # raw component values, also for normalized accessors
+            values = data[:, :COMPONENTS[type]]
+            accessor["min"] = [float(v) for v in values.min(axis=0)]
+            accessor["max"] = [float(v) for v in values.max(axis=0)]
+        if normalized:
+            accessor["normalized"] = True
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+
+    def addMaterial(self, name, color):
+        """
+        Return index of material `name`, created once from its RGBA `color`
+        """
+        if name not in self.materials:
+            self.gltf["materials"].append({
+                "name": name,
+                "pbrMetallicRoughness": {"baseColorFactor": [float(c) for c in color],
+                                         "metallicFactor": 0.0, "roughnessFactor": 0.5},
+            })
+            self.materials[name] = len(self.gltf["materials"]) - 1
+        return self.materials[name]
+
+
+    def addMesh(self, part, quantized=False):
+        """
+        Add a `MeshPart` as glTF mesh and return (mesh index, translation, scale) where the
+        transform maps quantized positions back to the original ones
+        """
+        normals = part.normals if part.normals is not None else vertexNormals(part.positions, part.indices)
+        translation, scale = np.zeros(3), 1.0
+        if quantized:
+            self.extensions.add(QUANTIZATION)
+            positions, translation, scale = quantizePositions(part.positions)
+            attributes = {
+                "POSITION": self.addAccessor(positions, SHORT, "VEC3", ARRAY_BUFFER, bounds=True, normalized=True),
+                "NORMAL": self.addAccessor(quantizeNormals(normals), BYTE, "VEC3", ARRAY_BUFFER, normalized=True),
+            }
+        else:
+            attributes = {
+                "POSITION": self.addAccessor(part.positions.astype(np.float32), FLOAT, "VEC3", ARRAY_BUFFER, bounds=True),
+                "NORMAL": self.addAccessor(normals.astype(np.float32), FLOAT, "VEC3", ARRAY_BUFFER),
+            }
+        # small meshes use 16 bit indices
+        if len(part.positions) <= 0xFFFF:
+            indices = self.addAccessor(part.indices.ravel().astype(np.uint16), UNSIGNED_SHORT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+        else:
+            indices = self.addAccessor(part.indices.ravel().astype(np.uint32), UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+        self.gltf["meshes"].append({
+            "name": part.name,
+            "primitives": [{"attributes": attributes, "indices": indices,
+                            "material": self.addMaterial(part.material, part.color)}],
+        })
+        return len(self.gltf["meshes"]) - 1, translation, scale
+
+
+    def addPartNode(self, part, parent, quantized=False):
+        """
+        Add a node showing `part` under `parent`, or one per transform of assembly copies.
+        Quantized positions are mapped back by the node transform, or by each copy transform
+        of instanced parts (instances are placed in node space, so the node can't scale them).
+        """
+        mesh, translation, scale = self.addMesh(part, quantized)
+        node = {"name": part.name, "mesh": mesh}
+        local = np.eye(4) # node transform
+        if part.instances is None:
+            if quantized:
+                local[:3, 3], local[[0, 1, 2], [0, 1, 2]] = translation, scale
+        else:
+            self.extensions.add(INSTANCING)
+            instanceScale = part.instances[:, 3:4]
+            translations = (part.instances[:, :3] + instanceScale * translation).astype(np.float32)
+            scales = np.repeat(instanceScale * scale, 3, axis=1).astype(np.float32)
+            node["extensions"] = {INSTANCING: {"attributes": {
+                "TRANSLATION": self.addAccessor(translations, FLOAT, "VEC3"),
+                "SCALE": self.addAccessor(scales, FLOAT, "VEC3"),
+            }}}
+        if part.transforms is None:
+            if not np.array_equal(local, np.eye(4)):
+                node["translation"] = [float(v) for v in local[:3, 3]]
+                node["scale"] = [float(scale)] * 3
+            return self.addNode(node, parent)
+        # assembly copies, nodes sharing the mesh (and instance accessors) at each transform
+        for k, transform in enumerate(part.transforms):
+            # glTF matrices are column-major
+            matrix = (transform @ local).T.ravel()
+            self.addNode({**node, "name": f"{part.name}_copy{k}", "matrix": [float(v) for v in matrix]}, parent)
+
+
+    def addNode(self, node, parent=None):
+        """
+        Add a node (dictionary as in glTF) under `parent` or as a scene root, return its index
+        """
+        self.gltf["nodes"].append(node)
+        index = len(self.gltf["nodes"]) - 1
+        if parent is None:
+            self.gltf["scenes"][0]["nodes"].append(index)
+        else:
+            self.gltf["nodes"][parent].setdefault("children", []).append(index)
+        return index
+
+
+    def write(self, path):
+        """
+        Write GLB container: header, JSON chunk and binary chunk
+        """
+        self.gltf["buffers"] = [{"byteLength": self.length}]
+        if self.extensions:
+            self.gltf["extensionsUsed"] = self.gltf["extensionsRequired"] = sorted(self.extensions)
+        # drop empty lists, glTF doesn't allow them
+        gltf = {key: value for key, value in self.gltf.items() if value != []}
+        content = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+        content += b" " * (-len(content) % 4)
+        total = 12 + 8 + len(content) + 8 + self.length
+        with open(path, "wb") as f:
+            f.write(struct.pack("<III", GLB_MAGIC, GLB_VERSION, total))
+            f.write(struct.pack("<II", len(content), CHUNK_JSON))
+            f.write(content)
+            f.write(struct.pack("<II", self.length, CHUNK_BIN))
+            for chunk in self.chunks:
+                f.write(chunk)
+
+
+def writeGLB(path, parts, quantized=False):
+    """
+    Write `parts` (list of `MeshPart`) into a binary glTF file, one node per part. Quantized
+    files store 16 bit positions and 8 bit normals (KHR_mesh_quantization), instanced parts
+    use EXT_mesh_gpu_instancing.
+    """
+    builder = GLBBuilder()
+    root = builder.addNode({"name": "PDBVis", "rotation": Z_UP_ROTATION})
+    for part in parts:
+        builder.addPartNode(part, root, quantized)
+    builder.write(path)
+    return path
+
+
+def quantizePositions(positions):
+    """
+    Return positions as normalized 16 bit integers (padded to 4 components, vertex attributes
+    must be 4 bytes aligned) and the (translation, scale) mapping them back
+    """
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    translation = (low + high) / 2
+    scale = max(float((high - low).max()) / 2, 1e-6)
+    quantized = np.zeros((len(positions), 4), dtype=np.int16)
+    quantized[:, :3] = np.round((positions - translation) / scale * 32767)
+    return quantized, translation, scale
+
+
+def quantizeNormals(normals):
+    """
+    Unit normals as normalized 8 bit integers, padded to 4 components
+    """
+    quantized = np.zeros((len(normals), 4), dtype=np.int8)
+    quantized[:, :3] = np.round(np.clip(normals, -1, 1) * 127)
+    return quantized
@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdbvis.BatchConvert import BatchConverter, folderModels
+from pdbvis.BuildMesh import MODES
+from pdbvis.ModelCache import CONVERTERS, defaultCache, modelParams
+from pdbvis.views import parseLOD
+
+
+class Command(BaseCommand):
+    help = ("Download and convert models into the cache in a pool of processes. Cached models are skipped, "
+            "so an interrupted run continues where it stopped when started again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", help="PDB IDs")
+        parser.add_argument("--ids-file", help="File with PDB IDs, separated by spaces, commas or lines")
+        parser.add_argument("--dir", help="Folder with structure files named <ID>.pdb, .cif or .bcif")
+        parser.add_argument("--format", default="fbx", help=f"Output formats, comma separated ({', '.join(CONVERTERS)})")
+        parser.add_argument("--lod", default="auto", help="'auto' or comma separated subdivision levels")
+        parser.add_argument("--mode", default="spheres", help=f"Modes, comma separated ({', '.join(MODES)})")
+        parser.add_argument("--quantized", action="store_true", help="Quantized GLB models")
+        parser.add_argument("--processes", type=int, default=None, help="Conversion processes, default one per core")
+        parser.add_argument("--concurrency", type=int, default=8, help="Simultaneous downloads")
+        parser.add_argument("--retry-failed", action="store_true", help="Convert again models that failed in previous runs")
+        parser.add_argument("--stale", action="store_true",
+                            help="Rebuild cached models whose source, element table or converter changed since they were built")
+
+
+    def handle(self, *args, **options):
+        cache = defaultCache()
+        if options["stale"]:
+            tasks = cache.stale()
+            self.stdout.write(f"{len(tasks)} stale models")
+            self.convert(BatchConverter([], [], options["processes"], options["concurrency"], options["retry_failed"],
+                                    cache, log=self.stdout.write, tasks=tasks))
+            return
+        IDs = list(options["ids"])
+        if options["ids_file"]:
+            with open(options["ids_file"]) as f:
+                IDs += f.read().replace(",", " ").split()
+        if options["dir"]:
+            if not os.path.isdir(options["dir"]):
+                raise CommandError(f"{options['dir']} isn't a folder")
+            IDs += folderModels(options["dir"], cache)
+        if not IDs:
+            raise CommandError("No models given, pass PDB IDs, --ids-file or --dir")
+
+        formats = options["format"].split(",")
+        modes = options["mode"].split(",")
+        for values, valid, name in ((formats, CONVERTERS, "format"), (modes, MODES, "mode")):
+            invalid = [value for value in values if value not in valid]
+            if invalid:
+                raise CommandError(f"Invalid {name} {', '.join(invalid)}, must be one of: {', '.join(valid)}")
+        try:
+            levels = parseLOD(options["lod"])
+        except ValueError as e:
+            raise CommandError(f"Invalid LOD: {e}")
+        paramSets = [modelParams(format, lod, mode, options["quantized"] and format == "glb")
+                     for format in formats for lod in levels for mode in modes]
+
+        self.convert(BatchConverter(IDs, paramSets, options["processes"], options["concurrency"],
+                                options["retry_failed"], cache, log=self.stdout.write))
+
+
+    def convert(self, converter):
+        try:
+            converter.run()
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted, run the same command again to continue")
+            raise SystemExit(1)
+        self.stdout.write(converter.summary())
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from pdbvis.ConvertJobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = "Run queued model conversions in a pool of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=None, help="Conversion processes, default one per core")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between queue checks when idle")
+        parser.add_argument("--once", action="store_true", help="Stop when the queue is empty")
+
+
+    def handle(self, *args, **options):
+        worker = JobWorker(options["processes"], options["poll"])
+        requeued = worker.requeueStale()
+        if requeued:
+            self.stdout.write(f"{requeued} interrupted jobs queued again")
+        self.stdout.write(f"Worker running with {worker.processes} processes")
+        worker.run(once=options["once"])
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdbvis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversionjob',
+            name='mode',
+            field=models.CharField(default='spheres', max_length=16),
+        ),
+    ]
@@ -1,3 +1,40 @@
 from django.db import models
 
 # Create your models here.
+class ConversionJob(models.Model):
+    """
+    Model conversion queued by the API and run by `manage.py runworker`
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+    IN_FLIGHT = [QUEUED, RUNNING]
+
+    key = models.CharField(max_length=64, db_index=True) # model ID and conversion parameters
+    modelID = models.CharField(max_length=16)
+    format = models.CharField(max_length=8, default="fbx")
+    lod = models.PositiveSmallIntegerField(null=True, blank=True) # `None` for automatic LOD
+    mode = models.CharField(max_length=16, default="spheres") # representation, one of `BuildMesh.MODES`
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # only one queued or running job per model and parameters
+            models.UniqueConstraint(fields=["key"], condition=models.Q(status__in=["queued", "running"]),
+                                    name="unique_in_flight_job"),
+        ]
+
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+    def asDict(self):
+        return {"id": self.id, "modelID": self.modelID, "format": self.format, "lod": self.lod or "auto", "mode": self.mode,
+                "status": self.status, "error": self.error or None,
+                "created": self.created.isoformat(), "updated": self.updated.isoformat()}
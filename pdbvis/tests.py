@@ -1,3 +1,483 @@
-from django.test import TestCase
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from pdbvis.Streaming import RangeNotSatisfiable, parseRange, notModified, acceptedEncodings, fileETag, lastModified
+from pdbvis.AtomTable import AtomTable, MISSING_INT
+from pdbvis.Selection import Selection, EmptySelection
+from pdbvis.ReadCIF import (CIFTrajectory, BinaryCIFTrajectory, BYTE_TYPES, DECODERS, msgpack, readAtomSite,
+                            decodeData, decodeIntegerPacking)
+
+
+class RangeTests(SimpleTestCase):
+    def test_closed(self):
+        self.assertEqual(parseRange("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parseRange("bytes=900-1999", 1000), (900, 999)) # end clipped to the file
+
+    def test_open_ended(self):
+        self.assertEqual(parseRange("bytes=900-", 1000), (900, 999))
+
+    def test_suffix(self):
+        self.assertEqual(parseRange("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parseRange("bytes=-5000", 1000), (0, 999)) # longer than the file
+
+    def test_not_satisfiable(self):
+        for header in ("bytes=500-100", "bytes=1000-", "bytes=1000-1100"):
+            with self.assertRaises(RangeNotSatisfiable):
+                parseRange(header, 1000)
+
+    def test_ignored(self):
+        # whole file for no range, several ranges, another unit or garbage
+        for header in (None, "", "bytes=0-1,5-6", "items=0-1", "bytes=-", "bytes=a-b"):
+            self.assertIsNone(parseRange(header, 1000))
+
+
+class ConditionalTests(SimpleTestCase):
+    etag = '"%s"' % ("ab" * 32)
+
+    def test_if_none_match(self):
+        self.assertTrue(notModified({"If-None-Match": self.etag}, self.etag, 0))
+        self.assertTrue(notModified({"If-None-Match": f'"other", {self.etag}'}, self.etag, 0))
+        self.assertTrue(notModified({"If-None-Match": "*"}, self.etag, 0))
+        # weak and compressed variant tags compare weakly
+        self.assertTrue(notModified({"If-None-Match": f'W/{self.etag[:-1]}-gzip"'}, self.etag, 0))
+        self.assertFalse(notModified({"If-None-Match": '"stale"'}, self.etag, 0))
+
+    def test_if_none_match_over_if_modified_since(self):
+        headers = {"If-None-Match": '"stale"', "If-Modified-Since": "Sun, 01 Jan 2040 00:00:00 GMT"}
+        self.assertFalse(notModified(headers, self.etag, 0))
+
+    def test_if_modified_since(self):
+        self.assertTrue(notModified({"If-Modified-Since": "Thu, 01 Jan 1970 00:16:40 GMT"}, self.etag, 1000))
+        self.assertFalse(notModified({"If-Modified-Since": "Thu, 01 Jan 1970 00:16:39 GMT"}, self.etag, 1000))
+        self.assertFalse(notModified({"If-Modified-Since": "yesterday"}, self.etag, 1000))
+
+
+class EncodingTests(SimpleTestCase):
+    def test_order_and_weights(self):
+        self.assertEqual(acceptedEncodings("gzip, br"), ["br", "gzip"])
+        self.assertEqual(acceptedEncodings("gzip;q=0.5, br;q=0"), ["gzip"])
+        self.assertEqual(acceptedEncodings("identity"), [])
+        self.assertEqual(acceptedEncodings(None), [])
+
+    def test_wildcard(self):
+        self.assertEqual(acceptedEncodings("*"), ["br", "gzip"])
+        self.assertEqual(acceptedEncodings("*;q=0.5, gzip;q=0"), ["br"])
+        self.assertEqual(acceptedEncodings("gzip, *;q=0"), ["gzip"])
+
+    def test_malformed_weight(self):
+        self.assertEqual(acceptedEncodings("gzip;q=1.0.0"), [])
+        self.assertEqual(acceptedEncodings("br;q=1.5, gzip;q=0.001"), ["gzip"])
+
+
+class StreamModelTests(SimpleTestCase):
+    """
+    HTTP semantics of `streamModel` on a cached model, conversion left out
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.folder = tempfile.mkdtemp()
+        cls.data = bytes(range(256)) * 40
+        cls.path = os.path.join(cls.folder, "cd" * 32 + ".glb") # named by content hash as cached models
+        with open(cls.path, "wb") as f:
+            f.write(cls.data)
+        cls.etag = fileETag(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+        super().tearDownClass()
+
+    def get(self, **headers):
+        cache = mock.Mock()
+        cache.variants.return_value = {}
+        with mock.patch("pdbvis.views.prepareModel", return_value=self.path), \
+             mock.patch("pdbvis.views.defaultCache", return_value=cache):
+            response = self.client.get(reverse("streamModel", kwargs={"modelID": "1ABC"}), {"format": "glb"}, **headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_whole(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+
+    def test_range(self):
+        response, body = self.get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[100:200])
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(response["ETag"], self.etag)
+
+    def test_suffix_range(self):
+        response, body = self.get(HTTP_RANGE="bytes=-10")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[-10:])
+
+    def test_not_satisfiable(self):
+        response, _ = self.get(HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_not_modified(self):
+        response, body = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_stale_if_none_match(self):
+        response, body = self.get(HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_if_range(self):
+        # the range is sent while the client copy is current, by ETag or date
+        response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+        response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=lastModified(self.path))
+        self.assertEqual(response.status_code, 206)
+
+    def test_stale_if_range(self):
+        # the file changed since the client got its first part, all of it is sent
+        response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertNotIn("Content-Range", response)
+
+    def test_compressed(self):
+        response, body = self.get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], f'{self.etag[:-1]}-gzip"')
+        self.assertNotIn("Content-Length", response)
+        self.assertEqual(gzip.decompress(body), self.data)
+
+
+ATOM_SITE_HEADER = """data_TEST
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.pdbx_formal_charge
+_atom_site.pdbx_PDB_model_num
+"""
+
+
+class StructureFileTest(SimpleTestCase):
+    """
+    Writes structure files into a temporary folder and opens them with their parser
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def open(self, parser, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, "wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+        return parser(path)
+
+
+class CIFTests(StructureFileTest):
+    def read(self, rows, header=ATOM_SITE_HEADER):
+        return self.open(CIFTrajectory, "test.cif", header + rows + "#\n")
+
+    def test_values(self):
+        trajectory = self.read("""ATOM   1 O "O5'" . DA A 1 ? 1.000 2.000 3.000 1.00 10.00 ? 1
+ATOM   2 C "C5'" B DA A 1 ? 4.000 5.000 6.000 0.50 11.00 ? 1
+HETATM 3 N 'N"1' . LIG B . ? 7.000 8.000 9.000 ? 12.00 1 1
+HETATM 4 O O . HOH C -3 A -1.5 -2.5 -3.5 1.00 13.00 -2 1
+""")
+        table = trajectory.readTopology()
+        self.assertEqual(len(trajectory), 1)
+        self.assertEqual(table.name.tolist(), [b"O5'", b"C5'", b'N"1', b"O"])
+        self.assertEqual(table.altLoc.tolist(), [b"", b"B", b"", b""])
+        self.assertEqual(table.iCode.tolist(), [b"", b"", b"", b"A"])
+        self.assertEqual(table.serial.tolist(), [1, 2, 3, 4])
+        self.assertEqual(table.resSeq.tolist(), [1, 1, MISSING_INT, -3])
+        self.assertTrue(np.isnan(table.occupancy[2]))
+        self.assertEqual(table.charge.tolist(), [b"", b"", b"1+", b"2-"])
+        self.assertEqual(table.hetero.tolist(), [False, False, True, True])
+        self.assertEqual(list(table.element.decode()), ["O", "C", "N", "O"])
+        self.assertEqual(list(table.chainID.decode()), ["A", "A", "B", "C"])
+        np.testing.assert_allclose(table.coords[3], [-1.5, -2.5, -3.5])
+        record = table.record(2)
+        self.assertIsNone(record["resSeq"])
+        self.assertIsNone(record["occupancy"])
+
+    def test_quoted_spaces(self):
+        # values with whitespace inside quotes take the regular expression tokenizer
+        table = self.read("""ATOM 1 C 'C1 X' . DA A 1 ? 1 2 3 1 10 ? 1
+ATOM 2 O "O5'" . DA A 1 ? 4 5 6 1 10 ? 1
+ATOM 3 N "it's N" . DA A 1 ? 7 8 9 1 10 ? 1
+""").readTopology()
+        self.assertEqual(table.name.tolist(), [b"C1 X", b"O5'", b"it's N"])
+        self.assertEqual(table.serial.tolist(), [1, 2, 3])
+
+    def test_single_row(self):
+        table = self.open(CIFTrajectory, "single.cif", """data_TEST
+#
+_atom_site.group_PDB ATOM
+_atom_site.id 7
+_atom_site.type_symbol C
+_atom_site.label_atom_id "C1'"
+_atom_site.label_comp_id DA
+_atom_site.label_asym_id A
+_atom_site.label_seq_id ?
+_atom_site.Cartn_x 1.25
+_atom_site.Cartn_y -2.5
+_atom_site.Cartn_z 3.75
+_atom_site.occupancy .
+#
+""").readTopology()
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.serial.tolist(), [7])
+        self.assertEqual(table.name.tolist(), [b"C1'"])
+        self.assertEqual(table.resSeq.tolist(), [MISSING_INT])
+        self.assertTrue(np.isnan(table.occupancy[0]))
+        np.testing.assert_allclose(table.coords[0], [1.25, -2.5, 3.75])
+
+    def test_models(self):
+        trajectory = self.read("""ATOM 1 C CA . ALA A 1 ? 1 2 3 1 10 ? 1
+ATOM 2 N N . ALA A 1 ? 4 5 6 1 10 ? 1
+ATOM 1 C CA . ALA A 1 ? 11 12 13 1 10 ? 2
+ATOM 2 N N . ALA A 1 ? 14 15 16 1 10 ? 2
+ATOM 1 C CA . ALA A 1 ? 21 22 23 1 10 ? 3
+ATOM 2 N N . ALA A 1 ? 24 25 26 1 10 ? 3
+""")
+        self.assertEqual(len(trajectory), 3)
+        self.assertEqual(len(trajectory.readTopology()), 2)
+        np.testing.assert_allclose(trajectory.frame(1).coords, [[11, 12, 13], [14, 15, 16]])
+        np.testing.assert_allclose(trajectory.loadCoords()[:, 0, 0], [1, 11, 21])
+
+    def test_uneven_loop(self):
+        with self.assertRaises(ValueError):
+            readAtomSite((ATOM_SITE_HEADER + "ATOM 1 C CA\n#\n").encode())
+
+
+def byteArray(values, type):
+    """
+    BinaryCIF `ByteArray` of `values` stored as `type` (see `ReadCIF.BYTE_TYPES`)
+    """
+    return np.asarray(values, dtype=BYTE_TYPES[type]).tobytes(), {"kind": "ByteArray", "type": type}
+
+
+def integerPacking(values, byteCount, unsigned):
+    """
+    Pack integer `values` into `byteCount` items, splitting larger ones at the type limit
+    """
+    upper = (1 << (8 * byteCount - (0 if unsigned else 1))) - 1
+    lower = 0 if unsigned else -upper - 1
+    packed = []
+    for value in values:
+        while value >= upper or value <= lower and not unsigned:
+            limit = upper if value >= upper else lower
+            packed.append(limit)
+            value -= limit
+        packed.append(value)
+    type = {(1, False): 1, (2, False): 2, (1, True): 4, (2, True): 5}[byteCount, unsigned]
+    return packed, {"kind": "IntegerPacking", "byteCount": byteCount, "isUnsigned": unsigned, "srcSize": len(values)}, type
+
+
+def packedIntegers(values, byteCount=1, unsigned=False, before=()):
+    """
+    BinaryCIF data of integer `values` run through the `before` encodings (already applied,
+    given as (values, encoding)), then integer packing and a byte array
+    """
+    packed, packing, type = integerPacking(values, byteCount, unsigned)
+    data, byteEncoding = byteArray(packed, type)
+    return {"data": data, "encoding": list(before) + [packing, byteEncoding]}
+
+
+def stringArray(values):
+    """
+    BinaryCIF `StringArray` of `values`, `None` for missing ones
+    """
+    uniques = sorted({value for value in values if value is not None})
+    offsets = np.cumsum([0] + [len(value) for value in uniques])
+    indices = [uniques.index(value) if value is not None else -1 for value in values]
+    data, encoding = byteArray(indices, 3)
+    offsetData, offsetEncoding = byteArray(offsets, 3)
+    return {"data": data, "encoding": [{"kind": "StringArray", "dataEncoding": [encoding], "stringData": "".join(uniques),
+                                        "offsets": offsetData, "offsetEncoding": [offsetEncoding]}]}
+
+
+class BinaryCIFTests(StructureFileTest):
+    def test_integer_packing_limits(self):
+        signed = {"byteCount": 1, "isUnsigned": False}
+        # 127 and -128 continue into the next item, a value at the limit is followed by 0
+        data = np.array([127, 127, 46, -128, -72, 127, 0, -128, 0, 5], dtype=np.int8)
+        self.assertEqual(decodeIntegerPacking(data, signed).tolist(), [300, -200, 127, -128, 5])
+        unsigned = {"byteCount": 1, "isUnsigned": True}
+        data = np.array([255, 255, 90, 0, 255, 0], dtype=np.uint8)
+        self.assertEqual(decodeIntegerPacking(data, unsigned).tolist(), [600, 0, 255])
+        values = [0, 32767, -32768, 100000, -100000, 12]
+        self.assertEqual(decodeData(packedIntegers(values, 2)).tolist(), values)
+        self.assertEqual(decodeData(packedIntegers([0, 65535, 70000], 2, True)).tolist(), [0, 65535, 70000])
+
+    def test_encodings(self):
+        # every kind of `DECODERS` appears in these columns
+        x = [1.5, -2.25, 300.125]
+        fixed = [int(round(value * 1000)) for value in x]
+        deltas = [0] + np.diff(fixed).tolist()
+        coords = packedIntegers(deltas, 2, before=[{"kind": "FixedPoint", "factor": 1000, "srcType": 33},
+                                                   {"kind": "Delta", "origin": fixed[0], "srcType": 3}])
+        np.testing.assert_allclose(decodeData(coords), x)
+        steps = {"kind": "IntervalQuantization", "min": 0.0, "max": 1.0, "numSteps": 101, "srcType": 32}
+        data, encoding = byteArray([0, 50, 100], 4)
+        np.testing.assert_allclose(decodeData({"data": data, "encoding": [steps, encoding]}), [0, 0.5, 1])
+        data, encoding = byteArray([1, 3, 2, 2], 3)
+        runs = {"kind": "RunLength", "srcType": 3, "srcSize": 5}
+        self.assertEqual(decodeData({"data": data, "encoding": [runs, encoding]}).tolist(), [1, 1, 1, 2, 2])
+        self.assertEqual(decodeData(stringArray(["CA", None, "N", "CA"])).tolist(), [b"CA", b"", b"N", b"CA"])
+        kinds = {encoding["kind"] for column in (coords, stringArray(["A"])) for encoding in column["encoding"]}
+        self.assertEqual(kinds | {"IntervalQuantization", "RunLength"}, set(DECODERS))
+
+    @skipUnless(msgpack, "msgpack is needed to write BinaryCIF")
+    def test_file(self):
+        def column(name, data, mask=None):
+            return {"name": name, "data": data, "mask": mask}
+        x, y, z = [1.5, -2.25, 300.125, 4], [0, 1, 2, 3], [-1, -2, -3, -4]
+        def coordinates(values):
+            fixed = [int(round(value * 1000)) for value in values]
+            return packedIntegers([0] + np.diff(fixed).tolist(), 2, before=[
+                {"kind": "FixedPoint", "factor": 1000, "srcType": 33}, {"kind": "Delta", "origin": fixed[0], "srcType": 3}])
+        maskData, maskEncoding = byteArray([0, 0, 1, 2], 4)
+        occupancy, occupancyEncoding = byteArray([100, 50, 0, 100], 4)
+        bFactor, bEncoding = byteArray([10, 11, 12, 13], 32)
+        models, modelEncoding = byteArray([1, 4], 3)
+        columns = [
+            column("group_PDB", stringArray(["ATOM", "ATOM", "HETATM", "HETATM"])),
+            column("id", packedIntegers([0, 1, 1, 300], 1, before=[{"kind": "Delta", "origin": 1, "srcType": 3}])),
+            column("type_symbol", stringArray(["O", "C", "N", "O"])),
+            column("label_atom_id", stringArray(["O5'", "C5'", "N1", "O"])),
+            column("label_comp_id", stringArray(["DA", "DA", "LIG", "HOH"])),
+            column("label_asym_id", stringArray(["A", "A", "B", "C"])),
+            column("label_seq_id", packedIntegers([1, 1, 0, -3]), {"data": maskData, "encoding": [maskEncoding]}),
+            column("Cartn_x", coordinates(x)), column("Cartn_y", coordinates(y)), column("Cartn_z", coordinates(z)),
+            column("occupancy", {"data": occupancy, "encoding": [
+                {"kind": "IntervalQuantization", "min": 0.0, "max": 1.0, "numSteps": 101, "srcType": 32}, occupancyEncoding]}),
+            column("B_iso_or_equiv", {"data": bFactor, "encoding": [bEncoding]}),
+            column("pdbx_PDB_model_num", {"data": models, "encoding": [
+                {"kind": "RunLength", "srcType": 3, "srcSize": 4}, modelEncoding]}),
+        ]
+        content = {"version": "0.3.0", "encoder": "tests", "dataBlocks": [{"header": "TEST", "categories": [
+            {"name": "_atom_site", "rowCount": 4, "columns": columns}]}]}
+        table = self.open(BinaryCIFTrajectory, "test.bcif", msgpack.packb(content, use_bin_type=True)).readTopology()
+        self.assertEqual(table.serial.tolist(), [1, 2, 3, 303])
+        self.assertEqual(table.name.tolist(), [b"O5'", b"C5'", b"N1", b"O"])
+        self.assertEqual(table.resSeq.tolist(), [1, 1, MISSING_INT, MISSING_INT]) # masked '.' and '?'
+        self.assertEqual(table.hetero.tolist(), [False, False, True, True])
+        self.assertEqual(list(table.resName.decode()), ["DA", "DA", "LIG", "HOH"])
+        np.testing.assert_allclose(table.coords, np.stack([x, y, z], axis=1))
+        np.testing.assert_allclose(table.occupancy, [1, 0.5, 0, 1])
+        np.testing.assert_allclose(table.tempFactor, [10, 11, 12, 13])
+
+
+def pdbAtom(serial, name, resName, chainID, resSeq, x, y, z, element):
+    """
+    Fixed-width ATOM record
+    """
+    return (f"ATOM  {serial:5d} {name:<4} {resName:>3} {chainID}{resSeq:4d}    "
+            f"{x:8.3f}{y:8.3f}{z:8.3f}{1:6.2f}{10:6.2f}          {element:>2}  ").encode()
+
+
+SELECTION_TABLE = AtomTable.fromBytes(b"\n".join([
+    pdbAtom(1, "N", "ALA", "A", 1, 0, 0, 0, "N"),
+    pdbAtom(2, "CA", "ALA", "A", 1, 1.5, 0, 0, "C"),
+    pdbAtom(3, "FE", "HEM", "B", 10, 10, 10, 10, "FE"),
+    pdbAtom(4, "O", "HOH", "B", -5, 20, 20, 20, "O"),
+]))
+
+
+class SelectionTests(SimpleTestCase):
+    def test_no_selection(self):
+        self.assertIsNone(Selection.fromQuery({}))
+        self.assertIsNone(Selection.fromQuery({"chain": " , ", "resname": "", "format": "glb"}))
+
+    def test_query(self):
+        selection = Selection.fromQuery({"chain": "B, A,A", "resname": "ala,hem", "resseq": "50-10,3,-5--1",
+                                         "element": "fe,C", "within": "4.5", "point": "1,2,3",
+                                         "box": "0,0,0,10,10,10"})
+        self.assertEqual(selection.params(), {
+            "chains": ["A", "B"], "resNames": ["ALA", "HEM"], "resSeq": [[-5, -1], [3, 3], [10, 50]],
+            "elements": ["C", "Fe"], "within": 4.5, "point": [1.0, 2.0, 3.0],
+            "box": [[0.0, 0.0, 0.0], [10.0, 10.0, 10.0]]})
+        # parameters rebuild the same selection, as conversions from the cache key do
+        self.assertEqual(Selection(**selection.params()).params(), selection.params())
+        self.assertEqual(Selection.fromQuery({"within": "2", "residue": "B:-5"}).residue, ("B", -5))
+        self.assertEqual(Selection.fromQuery({"within": "2", "residue": " 12 "}).residue, (None, 12))
+
+    def test_invalid_query(self):
+        for query in ({"resseq": "1-x"}, {"resseq": "1,,2-"}, {"within": "abc", "point": "0,0,0"},
+                      {"within": "0", "point": "0,0,0"}, {"within": "inf", "point": "0,0,0"},
+                      {"within": "-1", "residue": "1"}, {"within": "2", "point": "1,2"},
+                      {"within": "2", "residue": "A:B"}, {"within": "2", "residue": "A:1:2"},
+                      {"within": "2"}, {"point": "1,2,3"}, {"residue": "A:1"},
+                      {"within": "2", "point": "1,2,3", "residue": "A:1"},
+                      {"box": "1,2,3"}, {"box": "1,1,1,0,2,2"}, {"box": "0,0,0,1,1,x"}):
+            with self.subTest(query=query), self.assertRaises(ValueError):
+                Selection.fromQuery(query)
+
+    def test_indices(self):
+        select = lambda **query: Selection.fromQuery(query).indices(SELECTION_TABLE).tolist()
+        self.assertEqual(select(chain="A"), [0, 1])
+        self.assertEqual(select(element="fe"), [2])
+        self.assertEqual(select(resseq="-10-1"), [0, 1, 3])
+        self.assertEqual(select(within="2", residue="A:1", element="C,N"), [0, 1])
+        self.assertEqual(select(box="0,0,0,10,10,10"), [0, 1]) # highest corner excluded
+        with self.assertRaises(EmptySelection):
+            select(chain="C")
+        with self.assertRaises(EmptySelection):
+            select(within="2", residue="C:1")
+
+
+class GetModelSelectionTests(SimpleTestCase):
+    def get(self, **query):
+        def prepare(modelID, params):
+            # conversions fail like the converter does when nothing is selected
+            Selection(**params["selection"]).indices(SELECTION_TABLE)
+            return None
+        with mock.patch("pdbvis.views.prepareModel", side_effect=prepare) as prepareModel:
+            response = self.client.get(reverse("getModel", kwargs={"modelID": "1ABC"}), {"format": "glb", **query})
+        return response, prepareModel
+
+    def test_empty_selection(self):
+        response, _ = self.get(chain="C")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"Error": "Selection matches no atoms."})
+        response, _ = self.get(within="3", residue="Z:9")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"Error": "Residue Z:9 not found."})
+
+    def test_invalid_selection(self):
+        response, prepareModel = self.get(resseq="a-b")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()["Error"].startswith("Invalid selection: "))
+        prepareModel.assert_not_called()
@@ -1,6 +1,13 @@
 from django.urls import path, re_path
-from .views import getModel
+from .views import getModel, streamModel, tileManifest, streamTile, submitConversion, jobStatus, jobResult, metrics
 
 urlpatterns = [
     re_path(r'download/(?P<modelID>[0-9A-z]{4,})', getModel, name='getModel'),
+    re_path(r'stream/(?P<modelID>[0-9A-z]{4,})', streamModel, name='streamModel'),
+    re_path(r'tiles/(?P<modelID>[0-9A-z]{4,})/(?P<tileID>\w+)$', streamTile, name='streamTile'),
+    re_path(r'tiles/(?P<modelID>[0-9A-z]{4,})$', tileManifest, name='tileManifest'),
+    re_path(r'jobs/submit/(?P<modelID>[0-9A-z]{4,})', submitConversion, name='submitConversion'),
+    re_path(r'jobs/(?P<jobID>[0-9]+)/result', jobResult, name='jobResult'),
+    re_path(r'jobs/(?P<jobID>[0-9]+)$', jobStatus, name='jobStatus'),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -1,47 +1,406 @@
 from django.shortcuts import render
-from django.http import HttpResponse, FileResponse, JsonResponse
+from django.http import HttpResponse, FileResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from asgiref.sync import sync_to_async
 import os
 import io
+import time
+import json
+import asyncio
+import zipfile
+import mimetypes
+from functools import wraps
 
-from .ReadPDB import PDBConverter
-from .GetPDB import downloadModelFromDB
+from .BuildMesh import MIN_SUBDIVISIONS, MAX_SUBDIVISIONS, MODES
+from .ModelCache import CONVERTERS, modelFileName, modelParams, tileParams, prepareModel, defaultCache
+from .ConvertJobs import submitJob
+from .GetPDB import DownloadError
+from .Selection import Selection, EmptySelection
+from .Assemblies import ASSEMBLY_NAME, AssemblyError
+from .Tiles import SPLITS, TILE_ID, findTile
+from .models import ConversionJob
+from .Metrics import METRICS, traced, timedChunks, profiled, profiledCall
+from .Streaming import (RangeNotSatisfiable, fileETag, lastModified, notModified, parseRange, chooseEncoding,
+                        fileChunks, compressChunks)
 
-os.chdir('PDBVis/')
+mimetypes.add_type('model/gltf-binary', '.glb')
 
-def modelAvailable(modelID, modelsPath="models/"):
+
+def profilePath(request, name):
+    """
+    Path of the cProfile dump of `request` if it asks for one (`profile=1`) and profiling is
+    enabled in settings, `None` otherwise
+    """
+    folder = settings.PDBVIS_PROFILE_DIR
+    if not folder or request.GET.get('profile') not in ('1', 'true'):
+        return None
+    return os.path.join(folder, f'{name}_{time.strftime("%Y%m%d-%H%M%S")}_{time.perf_counter_ns()}.prof')
+
+
+def instrumented(view):
+    """
+    Time the pipeline stages run by `view` into a `Server-Timing` header and the process
+    metrics, profiling the request when it asks for it. Works on sync and async views.
+    """
+    def finish(request, response, trace, path):
+        response['Server-Timing'] = trace.serverTiming()
+        if path:
+            response['X-Profile'] = os.path.basename(path)
+        METRICS.countRequest(view.__name__, response.status_code)
+        return response
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def asyncWrapper(request, *args, **kwargs):
+            path = profilePath(request, view.__name__)
+            # conversions run in worker threads, only they are profiled (see `profiledCall`)
+            with traced() as trace, profiled(path, here=False):
+                response = await view(request, *args, **kwargs)
+            return finish(request, response, trace, path)
+        return asyncWrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        path = profilePath(request, view.__name__)
+        with traced() as trace, profiled(path):
+            response = view(request, *args, **kwargs)
+        return finish(request, response, trace, path)
+    return wrapper
+
+
+def parseLOD(value):
+    """
+    Read `lod` query parameter: 'auto' or comma separated subdivision levels. Return a list
+    of levels where `None` means automatic level of detail.
+    """
+    if value in (None, "", "auto"):
+        return [None]
+    levels = []
+    for item in value.split(","):
+        level = int(item) # raise ValueError for invalid values
+        if not MIN_SUBDIVISIONS <= level <= MAX_SUBDIVISIONS:
+            raise ValueError(f"LOD must be between {MIN_SUBDIVISIONS} and {MAX_SUBDIVISIONS}")
+        if level not in levels:
+            levels.append(level)
+    return levels
+
+
+def conversionParams(request, modelID, multipleLOD=True):
+    """
+    Validate model ID and conversion query parameters. Return (format, levels, mode, error response).
+    """
+    if len(modelID) != 4:
+        return None, None, None, JsonResponse({'Error': 'Invalid model ID, must be 4 characters long.'}, status=404)
+    format = request.GET.get('format', 'fbx')
+    if format not in CONVERTERS:
+        return None, None, None, JsonResponse({'Error': f'Invalid format, must be one of: {", ".join(CONVERTERS)}.'}, status=400)
+    mode = request.GET.get('mode', 'spheres')
+    if mode not in MODES:
+        return None, None, None, JsonResponse({'Error': f'Invalid mode, must be one of: {", ".join(MODES)}.'}, status=400)
+    try:
+        levels = parseLOD(request.GET.get('lod'))
+    except ValueError:
+        levels = []
+    if not levels or (len(levels) > 1 and not multipleLOD):
+        return None, None, None, JsonResponse({'Error': f'Invalid LOD, must be "auto" or levels between {MIN_SUBDIVISIONS} and {MAX_SUBDIVISIONS}{" separated by commas" if multipleLOD else ""}.'}, status=400)
+    return format, levels, mode, None
+
+
+def selectionParams(request):
     """
-    Return if model with `modelID` is available as `fbx` or `pdb`.
+    Atom `Selection` of the query parameters (see `Selection.fromQuery`), `None` to convert
+    every atom. Return (selection, error response).
     """
-    print(os.listdir())
-    for type in ["fbx", "pdb"]:
-        files = os.listdir(os.path.join(modelsPath, type))
-        for fl in files:
-            fSplit = fl.split('.')
-            if modelID == fSplit[0] and fSplit[-1] == type:
-                return type
-    return None
+    try:
+        return Selection.fromQuery(request.GET), None
+    except ValueError as e:
+        return None, JsonResponse({'Error': f'Invalid selection: {e}.'}, status=400)
 
 
+def assemblyParam(request):
+    """
+    Name of the assembly asked with `assembly` (biomolecule number or `crystal`), `None` for
+    the asymmetric unit. Return (name, error response).
+    """
+    name = request.GET.get('assembly')
+    if name is None:
+        return None, None
+    if not ASSEMBLY_NAME.match(name):
+        return None, JsonResponse({'Error': 'Invalid assembly, must be a biomolecule number or "crystal".'}, status=400)
+    return name, None
+
+
+@instrumented
 def getModel(request, modelID=None):
     if request.method == "GET":
-        if len(modelID) != 4:
-            return JsonResponse({'Error': 'Invalid model ID, must be 4 characters long.'}, status=404)
-
-        # get if model is available as fbx, pdb or None
-        availableType = modelAvailable(modelID)
+        format, levels, mode, error = conversionParams(request, modelID)
+        if error:
+            return error
+        selection, error = selectionParams(request)
+        if error:
+            return error
+        assembly, error = assemblyParam(request)
+        if error:
+            return error
 
-        # if not available, download from DB
-        if not availableType:
-            if not downloadModelFromDB(modelID, 'models/pdb'):
+        paths = []
+        for lod in levels:
+            # download and convert model (only the selected atoms) if needed
+            try:
+                path = prepareModel(modelID, modelParams(format, lod, mode, selection=selection, assembly=assembly))
+            except (EmptySelection, AssemblyError) as e:
+                return JsonResponse({'Error': f'{e}.'}, status=404)
+            except DownloadError:
+                return JsonResponse({'Error': f'Molecule with ID {modelID} could not be downloaded from RCSB database, try again later.'}, status=502)
+            if not path:
                 return JsonResponse({"Error": f"Molecule with ID {modelID} not found . Please check RCSB database for available models in: https://www.rcsb.org/"}, status=401)
-            availableType = 'pdb'
-        if availableType == "pdb":
-            # convert from PDB into FBX
-            PDBConverter(input=os.path.join('models', 'pdb', f'{modelID}.pdb'), output=os.path.join('models', 'fbx', f'{modelID}.fbx'))
-
-        buffer = io.open(os.path.join("models", "fbx", f'{modelID}.fbx'), 'rb')
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename=f'{modelID}.fbx')
+            paths.append(path)
+
+        if len(levels) > 1:
+            # several levels of detail are sent together in a zip file
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as archive:
+                for lod, path in zip(levels, paths):
+                    archive.write(path, f'{modelFileName(modelID, lod, mode, selection, assembly)}.{format}')
+            buffer.seek(0)
+            response = FileResponse(buffer, as_attachment=True, filename=f'{modelFileName(modelID, mode=mode, selection=selection, assembly=assembly)}_lod.zip')
+        else:
+            response = FileResponse(io.open(paths[0], 'rb'), as_attachment=True, filename=f'{modelFileName(modelID, levels[0], mode, selection, assembly)}.{format}')
+        # bytes are sent after the view returns, timed while the server reads them
+        response.streaming_content = timedChunks(response.streaming_content)
+        return response
         #return JsonResponse({'Message': f'Valid ID {modelID}'}, status=201)
     else:
         return JsonResponse({'Error': 'Invalid method'}, status=404)
+
+
+def wantsQuantized(request):
+    """
+    Return if the client asks for a quantized GLB, with `quantized=1` or an Accept header
+    listing `model/gltf-binary; quantized=1`
+    """
+    if request.GET.get('quantized') in ('1', 'true'):
+        return True
+    for item in request.headers.get('Accept', '').split(','):
+        mediaType, *params = [param.strip() for param in item.split(';')]
+        if mediaType == 'model/gltf-binary' and any(param.replace(' ', '') in ('quantized=1', 'quantized=true') for param in params):
+            return True
+    return False
+
+
+def streamFile(request, path, filename, variants=None):
+    """
+    Response sending file at `path` in chunks, with ETag and Last-Modified validators for
+    conditional GET, a single byte range when asked (Range, If-Range) or else compressed
+    with gzip or brotli when the client accepts it. Precompressed `variants` (paths by
+    encoding) are sent as they are.
+    """
+    etag, modified, size = fileETag(path), lastModified(path), os.path.getsize(path)
+    headers = {'ETag': etag, 'Last-Modified': modified, 'Accept-Ranges': 'bytes', 'Vary': 'Accept, Accept-Encoding',
+               'Content-Disposition': f'attachment; filename="{filename}"'}
+    contentType = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def respond(response):
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    if notModified(request.headers, etag, os.path.getmtime(path)):
+        return respond(HttpResponse(status=304))
+    byteRange = None
+    ifRange = request.headers.get('If-Range')
+    # a range of a file that changed since the client got its first part is useless, send it all
+    if ifRange is None or ifRange in (etag, modified):
+        try:
+            byteRange = parseRange(request.headers.get('Range'), size)
+        except RangeNotSatisfiable as error:
+            headers['Content-Range'] = str(error)
+            return respond(HttpResponse(status=416))
+    head = request.method == 'HEAD'
+    if byteRange:
+        start, end = byteRange
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+        chunks = timedChunks(fileChunks(path, start, end)) if not head else iter(())
+        return respond(StreamingHttpResponse(chunks, status=206, content_type=contentType))
+    encoding, precompressed = chooseEncoding(request.headers.get('Accept-Encoding'), variants or {})
+    if encoding:
+        # compressed variants get their own tag, their bytes differ from the file ones
+        headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+        headers['Content-Encoding'] = encoding
+        if precompressed:
+            headers['Content-Length'] = str(os.path.getsize(variants[encoding]))
+            chunks = fileChunks(variants[encoding])
+        else:
+            chunks = compressChunks(fileChunks(path), encoding)
+    else:
+        headers['Content-Length'] = str(size)
+        chunks = fileChunks(path)
+    # bytes are sent after the view returns, timed while the server reads them
+    return respond(StreamingHttpResponse(timedChunks(chunks) if not head else iter(()), content_type=contentType))
+
+
+@instrumented
+async def streamModel(request, modelID=None):
+    """
+    Async download of a converted model (single level of detail). The conversion runs off the
+    event loop and the file is streamed with HTTP caching and range support (see `streamFile`).
+    GLB clients can ask for the quantized variant (see `wantsQuantized`).
+    """
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    format, levels, mode, error = conversionParams(request, modelID, multipleLOD=False)
+    if error:
+        return error
+    selection, error = selectionParams(request)
+    if error:
+        return error
+    assembly, error = assemblyParam(request)
+    if error:
+        return error
+    # blender isn't thread safe, FBX conversions stay on the single sync thread
+    prepare = sync_to_async(profiledCall(prepareModel), thread_sensitive=format == 'fbx')
+    quantized = format == 'glb' and wantsQuantized(request)
+    try:
+        path = await prepare(modelID, modelParams(format, levels[0], mode, quantized, selection, assembly))
+    except (EmptySelection, AssemblyError) as e:
+        return JsonResponse({'Error': f'{e}.'}, status=404)
+    except DownloadError:
+        return JsonResponse({'Error': f'Molecule with ID {modelID} could not be downloaded from RCSB database, try again later.'}, status=502)
+    if not path:
+        return JsonResponse({"Error": f"Molecule with ID {modelID} not found . Please check RCSB database for available models in: https://www.rcsb.org/"}, status=401)
+    return streamFile(request, path, f'{modelFileName(modelID, levels[0], mode, selection, assembly)}.{format}',
+                      defaultCache().variants(path))
+
+
+def splitParam(request):
+    """
+    How tiles split the atoms (`split`, octree by default). Return (split, error response).
+    """
+    split = request.GET.get('split', 'octree')
+    if split not in SPLITS:
+        return None, JsonResponse({'Error': f'Invalid split, must be one of: {", ".join(SPLITS)}.'}, status=400)
+    return split, None
+
+
+@instrumented
+async def tileManifest(request, modelID=None):
+    """
+    JSON manifest of the tiles of `modelID` (see `Tiles.TileConverter`): the overview and
+    every tile with its bounds, atoms and levels of detail, to load them with `streamTile`
+    """
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    format, levels, mode, error = conversionParams(request, modelID, multipleLOD=False)
+    if error:
+        return error
+    split, error = splitParam(request)
+    if error:
+        return error
+    try:
+        path = await sync_to_async(profiledCall(prepareModel), thread_sensitive=False)(modelID, tileParams(levels[0], mode, split))
+    except DownloadError:
+        return JsonResponse({'Error': f'Molecule with ID {modelID} could not be downloaded from RCSB database, try again later.'}, status=502)
+    if not path:
+        return JsonResponse({"Error": f"Molecule with ID {modelID} not found . Please check RCSB database for available models in: https://www.rcsb.org/"}, status=401)
+    return streamFile(request, path, f'{modelFileName(modelID, levels[0], mode)}_{split}_tiles.json',
+                      defaultCache().variants(path))
+
+
+@instrumented
+async def streamTile(request, modelID=None, tileID=None):
+    """
+    Download tile `tileID` of the manifest of `modelID` (same `mode` and `split`), converted
+    like `streamModel` and cached as a model of the tile atoms. Automatic LOD is the manifest
+    one, the overview has its own mode and LOD.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    format, levels, mode, error = conversionParams(request, modelID, multipleLOD=False)
+    if error:
+        return error
+    split, error = splitParam(request)
+    if error:
+        return error
+    if not TILE_ID.match(tileID):
+        return JsonResponse({'Error': f'Tile {tileID} not found.'}, status=404)
+    try:
+        path = await sync_to_async(profiledCall(prepareModel), thread_sensitive=False)(modelID, tileParams(None, mode, split))
+    except DownloadError:
+        return JsonResponse({'Error': f'Molecule with ID {modelID} could not be downloaded from RCSB database, try again later.'}, status=502)
+    if not path:
+        return JsonResponse({"Error": f"Molecule with ID {modelID} not found . Please check RCSB database for available models in: https://www.rcsb.org/"}, status=401)
+    with open(path) as f:
+        manifest = json.load(f)
+    tile = findTile(manifest, tileID)
+    if tile is None:
+        return JsonResponse({'Error': f'Tile {tileID} not found.'}, status=404)
+    tileMode = tile.get('mode', mode)
+    lod = levels[0] if levels[0] is not None else tile.get('lod', manifest['lod'])
+    selection = Selection(**tile['selection']) if 'selection' in tile else None
+    # blender isn't thread safe, FBX conversions stay on the single sync thread
+    prepare = sync_to_async(profiledCall(prepareModel), thread_sensitive=format == 'fbx')
+    quantized = format == 'glb' and wantsQuantized(request)
+    try:
+        path = await prepare(modelID, modelParams(format, lod, tileMode, quantized, selection))
+    except EmptySelection as e:
+        return JsonResponse({'Error': f'{e}.'}, status=404)
+    return streamFile(request, path, f'{modelFileName(modelID, lod, tileMode)}_{tileID}.{format}',
+                      defaultCache().variants(path))
+
+
+@csrf_exempt
+@instrumented
+def submitConversion(request, modelID=None):
+    """
+    Queue conversion of `modelID` for the worker, return the job to poll its status
+    """
+    if request.method != "POST":
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    format, levels, mode, error = conversionParams(request, modelID, multipleLOD=False)
+    if error:
+        return error
+    job, created = submitJob(modelID, format, levels[0], mode)
+    return JsonResponse(job.asDict(), status=201 if created else 200)
+
+
+@instrumented
+def jobStatus(request, jobID=None):
+    """
+    Return status of conversion job `jobID`
+    """
+    if request.method != "GET":
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    job = ConversionJob.objects.filter(id=jobID).first()
+    if not job:
+        return JsonResponse({'Error': f'Job {jobID} not found.'}, status=404)
+    return JsonResponse(job.asDict())
+
+
+@instrumented
+def jobResult(request, jobID=None):
+    """
+    Send converted model of job `jobID` once it's done
+    """
+    if request.method != "GET":
+        return JsonResponse({'Error': 'Invalid method'}, status=404)
+    job = ConversionJob.objects.filter(id=jobID).first()
+    if not job:
+        return JsonResponse({'Error': f'Job {jobID} not found.'}, status=404)
+    if job.status == ConversionJob.FAILED:
+        return JsonResponse(job.asDict(), status=500)
+    if job.status != ConversionJob.DONE:
+        return JsonResponse(job.asDict(), status=202)
+    path = defaultCache().get(job.modelID, modelParams(job.format, job.lod, job.mode))
+    if not path:
+        return JsonResponse({'Error': f'Result of job {jobID} was removed from cache, submit it again.'}, status=410)
+    buffer = io.open(path, 'rb')
+    return FileResponse(buffer, as_attachment=True, filename=f'{modelFileName(job.modelID, job.lod, job.mode)}.{job.format}')
+
+
+def metrics(request):
+    """
+    Pipeline stage timings, sizes and request counts in Prometheus text format
+    """
+    return HttpResponse(METRICS.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')